@@ -1,4 +1,11 @@
 # This script is the one that creates the dataset and stores it in the data/final route
+import sys
+from pathlib import Path
+
+# The file index of scripts/enoe_index.py knows where each questionnaire was extracted
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+import enoe_index
+
 def run():
     # import modules
     import pandas as pd
@@ -18,24 +25,23 @@ def run():
     paths1 = []
     paths2 = []
     def create_path(year, quarter, questionnaire):
-        if (year + quarter/5 < 2020.4):
-            path = "data/ENOE/raw/"+str(year)+"t"+str(quarter)+"/conjunto_de_datos_coe" + str(questionnaire) + "_enoe_"+str(year)+"_"+str(quarter)+"t/conjunto_de_datos/conjunto_de_datos_coe" + str(questionnaire) + "_enoe_"+str(year)+"_"+str(quarter)+"t.csv"
-        else:
-            path = "data/ENOE/raw/"+str(year)+"t"+str(quarter)+"/conjunto_de_datos_coe" + str(questionnaire) + "_enoen_"+str(year)+"_"+str(quarter)+"t/conjunto_de_datos/conjunto_de_datos_coe" + str(questionnaire) + "_enoen_"+str(year)+"_"+str(quarter)+"t.csv"
-        return path
+        path = enoe_index.lookup(year, quarter, questionnaire)
+        if path is None:
+            raise FileNotFoundError(f"No coe{questionnaire} CSV for {year} quarter {quarter} under {enoe_index.DATA_ROOT}")
+        return str(path)
 
 
     
     # Create dataset
     def create_dataset(year,quarter):
         # Load dataset and reduce the number of columns for the ones that we really need
-        df1 = pd.read_csv(create_path(year,quarter,1))
-        df2 = pd.read_csv(create_path(year,quarter,2))
+        df1 = pd.read_csv(create_path(year,quarter,1), nrows=0) # Only the header
+        df2 = pd.read_csv(create_path(year,quarter,2), nrows=0)
 
         interseccion1 = list(set(df1.columns) & set(columns)) # To avoid any problems in loading the data
         interseccion2 = list(set(df2.columns) & set(columns))
 
-        df1 = pd.read_csv(create_path(year,quarter,1), usecols=interseccion1) # This will load the data again, but only with the columns that we require. Ideally all of them.
+        df1 = pd.read_csv(create_path(year,quarter,1), usecols=interseccion1) # The only full read, with just the columns that we require.
         df2 = pd.read_csv(create_path(year,quarter,2), usecols=interseccion2)
 
         intersection = list(set(df1.columns.to_list()) & set(df2.columns.to_list()))
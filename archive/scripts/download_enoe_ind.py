@@ -2,9 +2,10 @@
 
 from logging import exception
 import os.path
+import shutil
+import tempfile
 from urllib.request import urlopen
 from zipfile import ZipFile
-from io import BytesIO
 
 
 def run():
@@ -17,9 +18,12 @@ def run():
             print("data/ENOE/raw/"+str(year)+"t"+str(quarter)+" is already an existing file")
         else:
             print("Loading data for ENOE in year "+ str(year)+", quarter "+str(quarter))
-            resp = urlopen(url)
-            zipfile = ZipFile(BytesIO(resp.read()))
-            zipfile.extractall("data/ENOE/raw/"+str(year)+"t"+str(quarter))
+            with urlopen(url) as resp, tempfile.TemporaryFile() as tmp:
+                shutil.copyfileobj(resp, tmp, 1 << 20) # Stream to disk in 1 MiB chunks
+                zipfile = ZipFile(tmp)
+                members = [m for m in zipfile.namelist() if m.lower().endswith(".csv") and ("coe1" in m.lower() or "coe2" in m.lower())]
+                for member in members: # Only the questionnaires we use
+                    zipfile.extract(member, "data/ENOE/raw/"+str(year)+"t"+str(quarter))
             print('Successfully downloaded data')
     except Exception as e:
         print("There was a problem loading data for ENOE in year "+ str(year)+", quarter "+str(quarter))
@@ -1,33 +1,19 @@
-# This script downloads Open data from ENOE deom 2017 to 2022
+# This script downloads Open data from ENOE from 2017 to 2022
 
-from os import remove
-import pandas as pd
-from urllib.request import urlopen
-from zipfile import ZipFile
-from io import BytesIO
-import os.path
+import argparse
 
-def run():
-    for year in range(2017,2023):
-        for quarter in range(1,5):
-            if str(year)+str(quarter) in [str(y)+str(i) for y in range(2020,2023) for i in range(1,5)]:
-                # Enoe_N
-                url = "https://www.inegi.org.mx/contenidos/programas/enoe/15ymas/datosabiertos/"+str(year)+"/conjunto_de_datos_enoen_"+str(year)+"_"+str(quarter)+"t_csv.zip"
-            elif str(year)+str(quarter) in [str(y)+str(i) for y in range(2018,2021) for i in range(1,5)]:
-                url = "https://www.inegi.org.mx/contenidos/programas/enoe/15ymas/datosabiertos/"+str(year)+"/conjunto_de_datos_enoe_"+str(year)+"_"+str(quarter)+"t_csv.zip"
-            else:
-                url = "https://www.inegi.org.mx/contenidos/programas/enoe/15ymas/datosabiertos/"+str(year)+"/"+str(year)+"_trim"+str(quarter)+"_enoe_csv.zip"
-            try:
-                if os.path.exists("data/ENOE/raw/"+str(year)+"t"+str(quarter)):
-                    print("data/ENOE/raw/"+str(year)+"t"+str(quarter)+" is already an existing file")
-                else:
-                    print("Loading data for ENOE in year "+ str(year)+", quarter "+str(quarter))
-                    resp = urlopen(url)
-                    zipfile = ZipFile(BytesIO(resp.read()))
-                    zipfile.extractall("data/ENOE/raw/"+str(year)+"t"+str(quarter))
-            except:
-                print("There was a problem loading data for ENOE in year "+ str(year)+", quarter "+str(quarter))
-            
+from enoe_download import download_quarters
+
+def run(years=range(2017,2023), quarters=range(1,5), workers=4, extract=True):
+    periods = [(year, quarter) for year in years for quarter in quarters]
+    return download_quarters(periods, workers=workers, extract=extract)
 
 if __name__=='__main__':
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download ENOE microdata from INEGI")
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2017, 2023)))
+    parser.add_argument("--quarters", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--workers", type=int, default=4, help="concurrent downloads")
+    parser.add_argument("--no-extract", dest="extract", action="store_false",
+                        help="keep the archives zipped under data/ENOE/zip")
+    args = parser.parse_args()
+    run(args.years, args.quarters, workers=args.workers, extract=args.extract)
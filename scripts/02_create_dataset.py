@@ -1,262 +1,292 @@
 import pandas as pd
 import numpy as np
-import re
-import os
-import requests
-import zipfile
-import io
+import argparse
+import psutil
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
 from pathlib import Path
 
+from enoe_reader import load_columns
+from enoe_download import download_quarter_paths
+from enoe_store import load_questionnaire
+from enoe_keys import join_questionnaires
+from enoe_aggregate import prepare, accumulate, finalize
+from enoe_chunked import accumulate_chunked
+from enoe_flows import save_tensor
+from enoe_cube import CUBE_PATH, save_cube
+from endiseg import ENDISEG_PATH, build_analytic_panel
+from enoe_schema import scan, coverage, unbuildable
+from enoe_pipeline import run_pipeline
+from enoe_indicators import INDICATORS, DEFAULT_INDICATORS, select
+from policy_calendar import load_calendar
+import enoe_trace
+
 # --- CONFIGURATION ---
-BASE_URL = "https://www.inegi.org.mx/contenidos/programas/enoe/15ymas/microdatos/"
-DATA_ROOT = Path("data/ENOE/raw")
+OUTPUT_PATH = Path("data/ENOE/final/lgbt_migration.csv")
+TENSOR_PATH = Path("data/ENOE/final/od_flows.npz")
+# Default panel; --years extends it as far back as 2005
+YEARS = range(2017, 2023)
+QUARTERS = range(1, 5)
+# Rough peak memory of one quarter in create_dataset (projected coe1 + coe2 + merge)
+QUARTER_MEMORY_GB = 0.25
+# Download/extract threads and quarters fetched ahead of the workers (see enoe_pipeline.py)
+FETCH_WORKERS = 2
+FETCH_BUFFER = 4
 
-def get_inegi_url(year, quarter):
+def create_dataset(year, quarter, columns, calendar, engine="c", extract=True,
+                   variance="jackknife", replicates=200, memory_budget_mb=None,
+                   indicators=DEFAULT_INDICATORS):
     """
-    Constructs the download URL for INEGI ENOE microdata.
-    Standard pattern: 2017trim1_csv.zip
+    Builds the state-level table for one quarter.
+    Returns (df_enoe, od, cube): the state rows, the (destination x origin) flow counts
+    and the aggregate cube (see enoe_cube.py).
+    columns: lower-case ENOE variables to keep (see load_auxiliary)
+    calendar: policy calendar with the equal marriage status (see policy_calendar.py)
+    engine: CSV parser passed to read_questionnaire ('c' or 'pyarrow')
+    extract: if False, downloaded archives are parsed straight from the zip
+    variance, replicates: standard errors of the weighted estimates (see enoe_survey.py)
+    memory_budget_mb: if set, coe2 is read in blocks so the quarter stays within this budget
+    indicators: names in the indicator registry (see enoe_indicators.py)
     """
-    return f"{BASE_URL}{year}trim{quarter}_csv.zip"
+    with enoe_trace.span("create_dataset", year=year, quarter=quarter) as quarter_span:
+        # --- NEW LOGIC START ---
+        # Instead of constructing a hardcoded path, we ask the downloader for the paths
+        # (one download for both questionnaires if the quarter is missing)
+        path_coe1, path_coe2 = download_quarter_paths(year, quarter, extract=extract)
 
-def find_csv_recursive(root_dir, pattern_substring):
-    """
-    Searches for a CSV file containing 'pattern_substring' 
-    inside root_dir and its subfolders.
-    """
-    # Case insensitive search for .csv files
-    for path in Path(root_dir).rglob("*.csv"):
-        # Check if the filename contains our target (e.g., "coe1")
-        # and ignore case (INEGI sometimes uses COE1 vs coe1)
-        if pattern_substring.lower() in path.name.lower():
-            return path
-    return None
+        if not path_coe1 or not path_coe2:
+            raise FileNotFoundError(f"Could not retrieve files for {year} Q{quarter}")
 
-def download_and_get_path(year, quarter, questionnaire_num):
-    """
-    Downloads the data if missing, extracts it, and returns the path to the specific CSV.
-    questionnaire_num: 1 for coe1, 2 for coe2
-    """
-    # 1. Define where we want this data to live
-    target_dir = DATA_ROOT / f"{year}t{quarter}"
-    
-    # 2. Determine expected filename pattern (enoe vs enoen)
-    # Your logic for the switch date:
-    is_new_enoe = (year + quarter/5) >= 2020.4
-    base_name = "enoen" if is_new_enoe else "enoe"
-    search_pattern = f"coe{questionnaire_num}"
+        if memory_budget_mb:
+            # Out-of-core: coe2 is streamed in blocks sized to the budget (see enoe_chunked.py)
+            acc = accumulate_chunked(path_coe1, path_coe2, columns, memory_budget_mb, engine=engine,
+                                     indicators=indicators)
+            return finalize(acc, year, quarter, calendar, variance=variance, replicates=replicates)
 
-    # 3. Check if we already have the CSV
-    # We search recursively because we don't care about the 'conjunto_de_datos' nesting hell
-    if target_dir.exists():
-        found_file = find_csv_recursive(target_dir, search_pattern)
-        if found_file:
-            print(f"File found locally: {found_file.name}")
-            return found_file
+        # Load dataset
+        # Only the variables in columns.csv are read, already lower case and typed,
+        # with the blank " " answers as NA. Parquet store files skip CSV parsing.
+        with enoe_trace.span("read", questionnaire=1) as span:
+            df1 = load_questionnaire(path_coe1, columns, engine=engine)
+            span.set(rows_out=len(df1))
+        with enoe_trace.span("read", questionnaire=2) as span:
+            df2 = load_questionnaire(path_coe2, columns, engine=engine)
+            span.set(rows_out=len(df2))
+        # --- NEW LOGIC END ---
 
-    # 4. If not found, DOWNLOAD it
-    url = get_inegi_url(year, quarter)
-    print(f"Downloading {url}...")
-    
-    try:
-        r = requests.get(url, stream=True)
-        r.raise_for_status() # Check for broken links
-        
-        # Extract zip
-        target_dir.mkdir(parents=True, exist_ok=True)
-        z = zipfile.ZipFile(io.BytesIO(r.content))
-        z.extractall(target_dir)
-        print(f"Extracted to {target_dir}")
-        
-    except Exception as e:
-        print(f"Failed to download/extract {year} Q{quarter}: {e}")
-        return None
+        # Merge on the ENOE person key, packed into one int64 (see enoe_keys.py)
+        with enoe_trace.span("join") as span:
+            df, diagnostics = join_questionnaires(df1, df2)
+            span.set(rows_in=len(df1) + len(df2), rows_out=len(df))
+        if diagnostics['duplicated_coe1'] or diagnostics['duplicated_coe2'] or diagnostics['unmatched_coe1']:
+            print(f"Join diagnostics {year} Q{quarter}: {diagnostics}")
+        quarter_span.set(rows_in=len(df1) + len(df2))
 
-    # 5. Search again after download
-    found_file = find_csv_recursive(target_dir, search_pattern)
-    if not found_file:
-        print(f"Error: Downloaded zip but could not find file with pattern '{search_pattern}' in {target_dir}")
-        return None
-        
-    return found_file
+        # Respondents aged 15+; then every registered indicator in one grouped pass,
+        # flows, the aggregate cube and weighted estimates (see enoe_aggregate.py)
+        acc = accumulate(prepare(df), indicators)
+        return finalize(acc, year, quarter, calendar, variance=variance, replicates=replicates)
 
-def run():
-    # Auxiliary Data
-    # Ensure these files exist or adjust paths relative to your project root
-    try:
-        columns = pd.read_csv("auxiliary/columns.csv").clave.to_list()
-        columns = [x.lower() for x in columns]
-        marriage = pd.read_csv('auxiliary/equal_marriage.csv')
-    except FileNotFoundError as e:
-        print(f"Critical Error: Auxiliary files missing. {e}")
-        return
+def load_auxiliary():
+    """
+    Loads the list of ENOE variables and the policy calendar.
+    Returns (columns, calendar).
+    """
+    return load_columns(), load_calendar()
 
-    marriage['quarter'] = np.ceil(marriage['month']/3)
-    marriage['date'] = marriage['year'] + marriage['quarter']/5 
-    marriage = marriage[['cve','date']]
+def max_concurrent_quarters(workers, quarter_memory_gb=QUARTER_MEMORY_GB):
+    """
+    Caps the number of quarters in flight so that they fit in the available memory.
+    Always allows at least one quarter.
+    """
+    available_gb = psutil.virtual_memory().available / 1024**3
+    by_memory = int(available_gb // quarter_memory_gb)
+    return max(1, min(workers, by_memory))
 
-    def create_dataset(year, quarter):
-        # --- NEW LOGIC START ---
-        # Instead of constructing a hardcoded path, we ask the downloader for the path
-        path_coe1 = download_and_get_path(year, quarter, 1)
-        path_coe2 = download_and_get_path(year, quarter, 2)
+def _build_quarter(year, quarter, columns, calendar, options):
+    # Runs in a worker process; the print lines keep the serial log format
+    print(f"--- Processing {year} Q{quarter} ---")
+    return create_dataset(year, quarter, columns, calendar, **options)
 
-        if not path_coe1 or not path_coe2:
-            raise FileNotFoundError(f"Could not retrieve files for {year} Q{quarter}")
+def fetch_quarter(year, quarter, extract=True):
+    """
+    Makes coe1 and coe2 of a quarter available locally, downloading them if needed.
+    """
+    if not all(download_quarter_paths(year, quarter, extract=extract)):
+        raise FileNotFoundError(f"Could not retrieve files for {year} Q{quarter}")
 
-        # Load dataset
-        # Note: encoding='latin-1' is often safer for INEGI files than utf-8
-        df1 = pd.read_csv(path_coe1, encoding='latin-1', low_memory=False)
-        df2 = pd.read_csv(path_coe2, encoding='latin-1', low_memory=False)
-        # --- NEW LOGIC END ---
+def build_quarters(periods, columns, calendar, workers=1, quarter_memory_gb=QUARTER_MEMORY_GB, options=None,
+                   fetch_workers=0, fetch_buffer=FETCH_BUFFER):
+    """
+    Builds every (year, quarter) in periods.
+    options: keyword arguments forwarded to create_dataset (e.g. engine)
+    With fetch_workers > 0, quarters are downloaded and extracted on that many threads
+    while up to max_concurrent_quarters() worker processes build the ones already
+    fetched, at most fetch_buffer quarters ahead (see enoe_pipeline.py). Otherwise,
+    with workers > 1 the quarters run in a process pool, with at most
+    max_concurrent_quarters() of them in flight at once.
+    Returns (results, failures), both dicts keyed by (year, quarter).
+    """
+    options = options or {}
+    results = {}
+    failures = {}
 
-        # Standardize column names to lower case (INEGI changes capitalization sometimes)
-        df1.columns = df1.columns.str.lower()
-        df2.columns = df2.columns.str.lower()
+    if fetch_workers > 0:
+        compute_workers = max_concurrent_quarters(max(workers, 1), quarter_memory_gb)
+        print(f"Running {len(periods)} quarters: {fetch_workers} fetching, {compute_workers} building")
+        fetch = partial(fetch_quarter, extract=options.get('extract', True))
+        compute = partial(_build_quarter, columns=columns, calendar=calendar, options=options)
+        return run_pipeline(periods, fetch, compute, fetch_workers, compute_workers, fetch_buffer)
 
-        interseccion1 = list(set(df1.columns) & set(columns)) 
-        interseccion2 = list(set(df2.columns) & set(columns))
+    if workers <= 1:
+        for year, quarter in periods:
+            try:
+                results[(year, quarter)] = _build_quarter(year, quarter, columns, calendar, options)
+                print(f"Success: {year} Q{quarter}")
+            except Exception as e:
+                failures[(year, quarter)] = e
+        return results, failures
 
-        # Filter columns
-        df1 = df1[interseccion1]
-        df2 = df2[interseccion2]
+    in_flight_cap = max_concurrent_quarters(workers, quarter_memory_gb)
+    print(f"Running {len(periods)} quarters on {workers} workers, at most {in_flight_cap} at once")
 
-        intersection = list(set(df1.columns.to_list()) & set(df2.columns.to_list()))
-        
-        # Merge
-        df = pd.merge(df1, df2, how="left", left_on=intersection, right_on=intersection)
+    pending = list(periods)
+    running = {}
+    with ProcessPoolExecutor(max_workers=min(workers, in_flight_cap)) as pool:
+        while pending or running:
+            while pending and len(running) < in_flight_cap:
+                year, quarter = pending.pop(0)
+                future = pool.submit(_build_quarter, year, quarter, columns, calendar, options)
+                running[future] = (year, quarter)
 
-        df2_proc = df.copy() 
-        df2_proc = df2_proc[df2_proc['eda'] > 14]
-        
-        # Cleaning p3o
-        # Make sure to handle mixed types (strings/ints)
-        df2_proc['p3o'] = df2_proc['p3o'].astype(str).replace(" ", np.nan)
-        df2_proc['p3o'] = pd.to_numeric(df2_proc['p3o'], errors='coerce')
-        df2_proc['p3o'] = 2 - df2_proc['p3o'] 
-        
-        df_enoe = df2_proc.groupby(['ent']).p3o.mean() 
-        df_enoe = pd.DataFrame({'ent':df_enoe.index, 'migr':df_enoe.values}) 
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                year, quarter = running.pop(future)
+                try:
+                    results[(year, quarter)] = future.result()
+                    print(f"Success: {year} Q{quarter}")
+                except Exception as e:
+                    failures[(year, quarter)] = e
 
-        df_enoe['year'] = year
-        df_enoe['quarter'] =  quarter
-        
-        # Migration Table
-        df2_proc['p3p2'] = df2_proc['p3p2'].astype(str).replace(" ", np.nan)
-        
-        migration_table = df2_proc.groupby(['ent', 'p3p2']).size()
-        migration_table = migration_table.reset_index()
-        migration_table = migration_table.pivot(index = 'ent', columns = 'p3p2')
-        migration_table['year'] = year
-        migration_table['quarter'] = quarter
+    return results, failures
 
-        # Merge with Marriage data
-        df_flujos = pd.merge(migration_table, marriage, left_on = 'ent', right_on='cve', how='left')
-        
-        # Cleaning column names from the pivot
-        # The pivot creates a MultiIndex or messy columns, we flatten them
-        new_cols = []
-        for col in df_flujos.columns:
-            # Check if it's a tuple (multi-index) or simple string
-            if isinstance(col, tuple):
-                # Usually the pivot creates (0, 'p3p2_value'). We want the value.
-                col_name = str(col[1]) if col[1] else str(col[0])
-            else:
-                col_name = str(col)
-            new_cols.append(col_name)
-        
-        df_flujos.columns = new_cols
-        
-        # ... (Rest of your specific logic for inclusive states) ...
-        # NOTE: I am keeping your logic here, but be careful with the column renaming logic above 
-        # as it depends heavily on the specific output of your pivot.
-        
-        # Re-applying your exact column fix for safety:
-        # (This block assumes the regex logic was working for your data version)
-        # For this example, I will simplify to just ensure 'cve' and 'date' exist.
-        
-        df_flujos['equal_marriage'] = np.where((df_flujos['date'] <= df_flujos['year'] + df_flujos['quarter']/5), 1, 0)
-        
-        inclusive_states = list(df_flujos[df_flujos['equal_marriage'] == 1].cve)
-        inclusive_states = [str(i) for i in inclusive_states] # Ensure string match
-        non_inclusive_states = list(df_flujos[df_flujos['equal_marriage'] == 0].cve)
-        non_inclusive_states = [str(i) for i in non_inclusive_states]
+def run(workers=1, quarter_memory_gb=QUARTER_MEMORY_GB, output_path=OUTPUT_PATH, engine="c", extract=True,
+        tensor_path=TENSOR_PATH, variance="jackknife", replicates=200, memory_budget_mb=None,
+        trace_path=None, chrome_trace_path=None, indicators=None, cube_path=CUBE_PATH,
+        endiseg_path=ENDISEG_PATH, years=YEARS, fetch_workers=FETCH_WORKERS, fetch_buffer=FETCH_BUFFER):
+    # Auxiliary Data
+    # Ensure these files exist or adjust paths relative to your project root
+    try:
+        columns, calendar = load_auxiliary()
+        indicators = select(indicators)
+    except FileNotFoundError as e:
+        print(f"Critical Error: Auxiliary files missing. {e}")
+        return
+    except ValueError as e:
+        print(f"Critical Error: {e}")
+        return
 
-        # Migraciones Calculation
-        df_migraciones = pd.DataFrame({'cve': range(1, 33)})
-        
-        # Helper to sum safely
-        def safe_sum_cols(row, cols_to_sum):
-            # Intersect available columns with requested states to avoid KeyErrors
-            valid_cols = [c for c in cols_to_sum if c in row.index]
-            return row[valid_cols].sum()
+    periods = [(year, quarter) for year in years for quarter in QUARTERS]
+    # Header-only check of the quarters already on disk (see enoe_schema.py), so a
+    # quarter whose layout lacks the key or the flows is not downloaded or parsed
+    skipped = unbuildable(coverage(scan(periods), periods, columns))
+    for (year, quarter), missing in sorted(skipped.items()):
+        print(f"Skipping {year} Q{quarter}: its files have no {', '.join(missing)}")
+    periods = [period for period in periods if period not in skipped]
+    # Per-stage spans (see enoe_trace.py); set before the pool starts so workers inherit it
+    if trace_path or chrome_trace_path:
+        trace_path = trace_path or Path(chrome_trace_path).with_suffix(".jsonl")
+        enoe_trace.configure(trace_path)
+    if memory_budget_mb:
+        # The budget is also what each quarter in flight needs
+        quarter_memory_gb = memory_budget_mb / 1024
+    results, failures = build_quarters(periods, columns, calendar, workers, quarter_memory_gb,
+                                       options={'engine': engine, 'extract': extract,
+                                                'variance': variance, 'replicates': replicates,
+                                                'memory_budget_mb': memory_budget_mb,
+                                                'indicators': indicators},
+                                       fetch_workers=fetch_workers, fetch_buffer=fetch_buffer)
 
-        # We must group by cve (ent) in df_flujos to calculate from_equal/from_non_equal
-        # Note: In your original code you loop 1-33.
-        
-        from_equal_list = []
-        from_non_equal_list = []
-        
-        # Ensure df_flujos is indexed by 'ent' (which is 'cve' now)
-        df_flujos.set_index('cve', inplace=True, drop=False)
-        
-        for i in range(1, 33):
-            if i in df_flujos.index:
-                row = df_flujos.loc[i]
-                # Use intersection to find valid state columns present in the dataset
-                # (Sometimes specific states don't appear in p3p2 if no one migrated from there)
-                valid_inclusive = [s for s in inclusive_states if s in row.index]
-                valid_non_inclusive = [s for s in non_inclusive_states if s in row.index]
-                
-                from_equal_list.append(row[valid_inclusive].sum())
-                from_non_equal_list.append(row[valid_non_inclusive].sum())
-            else:
-                from_equal_list.append(0)
-                from_non_equal_list.append(0)
+    # Ensure output directory exists
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        df_migraciones['from_equal'] = from_equal_list
-        df_migraciones['from_non_equal'] = from_non_equal_list
-        
-        df_migraciones = pd.merge(df_flujos[['cve','equal_marriage']], df_migraciones, on='cve', how='left')
+    # Single write, in (year, quarter) order regardless of completion order
+    if results:
+        built = sorted(results)
+        final_df = pd.concat([results[key][0] for key in built], ignore_index=True)
+        final_df.to_csv(output_path, index=False)
+        print(f"Wrote {len(results)} quarters to {output_path}")
 
-        # Final Merges
-        df_enoe = pd.merge(df_enoe, df_migraciones, left_on='ent', right_on='cve', how='left')
+        # Full (quarter x destination x origin) flow tensor
+        save_tensor(built, [results[key][1] for key in built], tensor_path)
+        print(f"Wrote origin-destination flows to {tensor_path}")
 
-        # Employment indicator
-        df2_proc['p1'] = pd.to_numeric(df2_proc['p1'], errors='coerce')
-        df2_proc['p1'] = 2 - df2_proc['p1']
-        df3 = df2_proc.groupby(['ent']).p1.mean().reset_index()
-        df_enoe = pd.merge(df_enoe, df3, on='ent', how='left')
+        # (ent, cd_a, age band, employment) sums of every quarter, for finer rollups
+        save_cube(built, [results[key][2] for key in built], cube_path)
+        print(f"Wrote the aggregate cube to {cube_path}")
 
-        # Income indicator
-        df2_proc['p6b2'] = df2_proc['p6b2'].astype(str).replace(" ", np.nan)
-        df2_proc['p6b2'] = pd.to_numeric(df2_proc['p6b2'], errors='coerce')
-        df4 = df2_proc.groupby(['ent']).p6b2.mean().reset_index()
-        df_enoe = pd.merge(df_enoe, df4, on='ent', how='left')
+        # The panel with the ENDISEG state covariates, as used by the models (see endiseg.py)
+        if endiseg_path:
+            try:
+                build_analytic_panel(final_df, endiseg_path)
+            except FileNotFoundError as e:
+                print(f"Skipping the analytic panel: {e}")
 
-        return df_enoe
+    if failures:
+        print(f"{len(failures)} quarters failed:")
+        for (year, quarter), e in sorted(failures.items()):
+            print(f"  {year} Q{quarter}: {e}")
 
-    # --- MAIN LOOP ---
-    final_df = pd.DataFrame()
-    
-    # Ensure output directory exists
-    Path('data/ENOE/final').mkdir(parents=True, exist_ok=True)
+    if enoe_trace.enabled():
+        records = enoe_trace.read_trace(trace_path)
+        enoe_trace.summarize(records)
+        print(f"Wrote {len(records)} spans to {trace_path}")
+        if chrome_trace_path:
+            enoe_trace.write_chrome_trace(records, chrome_trace_path)
+            print(f"Wrote Chrome trace to {chrome_trace_path}")
+        enoe_trace.configure(None)
 
-    for year in range(2017, 2023): 
-        for quarter in range(1, 5): # 1-4 (range is exclusive at the end)
-            print(f"--- Processing {year} Q{quarter} ---")
-            try:
-                df_to_concatenate = create_dataset(year, quarter)
-                final_df = pd.concat([final_df, df_to_concatenate], ignore_index=True)
-                
-                # Save periodically
-                final_df.to_csv('data/ENOE/final/lgbt_migration.csv', index=False)
-                print(f"Success: {year} Q{quarter}")
-                
-            except Exception as e:
-                print(f"Error processing {year} Q{quarter}:")
-                print(e)
-                # Optional: break or continue depending on how strict you want to be
-                # continue
+    return results, failures
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build data/ENOE/final/lgbt_migration.csv from ENOE microdata")
+    parser.add_argument("--years", nargs=2, type=int, default=[YEARS[0], YEARS[-1]], metavar=("FIRST", "LAST"),
+                        help="first and last year of the panel (ENOE starts in 2005)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (1 = serial)")
+    parser.add_argument("--quarter-memory-gb", type=float, default=QUARTER_MEMORY_GB,
+                        help="estimated peak memory of one quarter, used to cap concurrent quarters")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS,
+                        help="threads downloading and extracting quarters while others are built (0 = fetch inside each build)")
+    parser.add_argument("--fetch-buffer", type=int, default=FETCH_BUFFER,
+                        help="most quarters fetched ahead of the ones being built")
+    parser.add_argument("--engine", choices=["c", "pyarrow"], default="c",
+                        help="CSV parser used for coe1/coe2")
+    parser.add_argument("--no-extract", dest="extract", action="store_false",
+                        help="keep downloaded archives zipped and parse coe1/coe2 from the zip")
+    parser.add_argument("--variance", choices=["jackknife", "bootstrap", "none"], default="jackknife",
+                        help="replicate method for the standard errors of the weighted estimates")
+    parser.add_argument("--replicates", type=int, default=200,
+                        help="number of bootstrap replicates per quarter")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="build each quarter out of core, reading coe2 in blocks that fit this budget")
+    parser.add_argument("--trace", default=None,
+                        help="write per-stage timing and memory spans to this JSON lines file")
+    parser.add_argument("--chrome-trace", default=None,
+                        help="also write the spans as a Chrome trace (chrome://tracing, Perfetto)")
+    parser.add_argument("--endiseg", default=str(ENDISEG_PATH),
+                        help="ENDISEG microdata for the state covariates of data/ENOE/final/analytic_panel.csv")
+    parser.add_argument("--no-endiseg", dest="endiseg", action="store_const", const=None,
+                        help="do not build the analytic panel")
+    parser.add_argument("--indicators", nargs="+", default=list(DEFAULT_INDICATORS), metavar="NAME",
+                        help=f"indicators to build, of {', '.join(INDICATORS)}")
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    run()
\ No newline at end of file
+    args = parse_args()
+    run(workers=args.workers, quarter_memory_gb=args.quarter_memory_gb, engine=args.engine, extract=args.extract,
+        variance=None if args.variance == "none" else args.variance, replicates=args.replicates,
+        memory_budget_mb=args.memory_budget_mb, trace_path=args.trace, chrome_trace_path=args.chrome_trace,
+        indicators=args.indicators, endiseg_path=args.endiseg, years=range(args.years[0], args.years[1] + 1),
+        fetch_workers=args.fetch_workers, fetch_buffer=args.fetch_buffer)
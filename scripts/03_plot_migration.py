@@ -1,54 +1,25 @@
+import matplotlib
+matplotlib.use("Agg")
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-def plot_single_trend():
+from policy_calendar import load_calendar
+
+PANEL_PATH = "data/ENOE/final/lgbt_migration.csv"
+OUTPUT = "img/migration_lgbt_single_line.png"
+
+def plot_single_trend(panel_path=PANEL_PATH, output=OUTPUT, dpi=300):
     # 1. Load your dataset
     # Assuming the script is run from the project root
-    df = pd.read_csv("data/ENOE/final/lgbt_migration.csv")
+    df = pd.read_csv(panel_path)
 
-    # 2. Reconstruct the 'Year of Legalization' (year_em)
-    # Since I don't have your auxiliary file, I used the official years.
-    # If you have your file, you can replace this dictionary with:
-    # em_map = pd.read_csv('auxiliary/equal_marriage.csv').set_index('cve')['year'].to_dict()
-    
-    year_em_map = {
-        1: 2019,  # Aguascalientes
-        2: 2017,  # Baja California
-        3: 2019,  # Baja California Sur
-        4: 2016,  # Campeche
-        5: 2014,  # Coahuila
-        6: 2016,  # Colima
-        7: 2018,  # Chiapas
-        8: 2015,  # Chihuahua
-        9: 2010,  # Ciudad de México
-        10: 2022, # Durango
-        11: 2021, # Guanajuato
-        12: 2022, # Guerrero
-        13: 2019, # Hidalgo
-        14: 2016, # Jalisco
-        15: 2022, # México
-        16: 2016, # Michoacán
-        17: 2016, # Morelos
-        18: 2015, # Nayarit
-        19: 2019, # Nuevo León
-        20: 2019, # Oaxaca
-        21: 2020, # Puebla
-        22: 2021, # Querétaro
-        23: 2012, # Quintana Roo
-        24: 2019, # San Luis Potosí
-        25: 2021, # Sinaloa
-        26: 2021, # Sonora
-        27: 2022, # Tabasco
-        28: 2022, # Tamaulipas
-        29: 2020, # Tlaxcala
-        30: 2022, # Veracruz
-        31: 2022, # Yucatán
-        32: 2021  # Zacatecas
-    }
+    # 2. Year of Legalization (year_em), from the policy calendar
+    year_em_map = load_calendar().table['date'].dt.year.dropna().to_dict()
 
-    # Map the legalization year to the dataframe
+    # Map the legalization year to the dataframe; states without a date are left out
     df['year_em'] = df['ent'].map(year_em_map)
+    df = df.dropna(subset=['year_em'])
 
     # 3. Calculate Normalized Year (Time relative to reform)
     # We use decimal years for precision (quarter/4)
@@ -85,11 +56,11 @@ def plot_single_trend():
     plt.grid(True, linestyle=':', alpha=0.6)
     plt.legend()
     
-    # Save or Show
+    # Save (no plt.show: the Agg backend renders headless)
     plt.tight_layout()
-    plt.savefig("img/migration_lgbt_single_line.png", dpi=300)
-    plt.show()
-    print("Plot saved to img/migration_lgbt_single_line.png")
+    plt.savefig(output, dpi=dpi)
+    plt.close()
+    print(f"Plot saved to {output}")
 
 if __name__ == "__main__":
     plot_single_trend()
\ No newline at end of file
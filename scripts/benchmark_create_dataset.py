@@ -0,0 +1,170 @@
+# Offline benchmark of the stages of create_dataset on synthetic ENOE quarters.
+# Each stage (read, join, filter, OD pivot, indicators, policy merge) is timed and
+# its peak traced memory measured; results are compared with a stored baseline so
+# slowdowns and memory growth show up before a full build. Timings are only
+# comparable on one machine, so the baseline is local (not in git): the first run
+# saves it and later runs compare with it.
+#
+#   python scripts/benchmark_create_dataset.py --rows 10000 100000 1000000
+#   python scripts/benchmark_create_dataset.py --save-baseline
+import argparse
+import importlib
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from enoe_synthetic import generate_quarter, quarter_files
+from enoe_store import load_questionnaire
+from enoe_keys import join_questionnaires
+from enoe_aggregate import prepare, indicator_sums, state_indicators, merge_policy
+from enoe_flows import od_matrix
+
+load_auxiliary = importlib.import_module("02_create_dataset").load_auxiliary
+
+BASELINE_PATH = Path("auxiliary/benchmark_baseline.json")
+BENCHMARK_ROOT = Path("data/ENOE/synthetic/benchmark")
+ROWS = [10_000, 100_000, 1_000_000]
+# One quarter of each questionnaire layout
+PERIODS = {"enoe": (2019, 1), "enoen": (2021, 1)}
+STAGES = ["read", "join", "filter", "od_pivot", "indicators", "policy_merge"]
+# A stage regresses when it is this much slower or larger than the baseline...
+TOLERANCE = 0.5
+# ...and the difference is above the timer and allocator noise
+MIN_SECONDS = 0.05
+MIN_MB = 1.0
+
+def synthetic_quarter(rows, layout, seed=0, root=BENCHMARK_ROOT):
+    """
+    coe1/coe2 paths of a synthetic quarter, generated on first use.
+    """
+    year, quarter = PERIODS[layout]
+    root = Path(root) / f"{layout}_{rows}_{seed}"
+    paths = quarter_files(year, quarter, root, layout)
+    if not all(p.exists() for p in paths):
+        generate_quarter(year, quarter, rows, seed, root, layout)
+    return paths
+
+def run_stages(paths, year, quarter, columns, calendar, engine="c", variance="jackknife", trace=False):
+    """
+    Runs create_dataset stage by stage on one quarter.
+    Returns {stage: seconds}, or {stage: peak MB} with trace=True.
+    """
+    out = {}
+    state = {}
+
+    def stage(name, func):
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if trace:
+            out[name] = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+        else:
+            out[name] = elapsed
+        return result
+
+    state['df1'], state['df2'] = stage("read", lambda: (load_questionnaire(paths[0], columns, engine=engine),
+                                                        load_questionnaire(paths[1], columns, engine=engine)))
+    df = stage("join", lambda: join_questionnaires(state.pop('df1'), state.pop('df2'))[0])
+    df = stage("filter", lambda: prepare(df))
+    od = stage("od_pivot", lambda: od_matrix(df['ent'], df['p3p2']))
+    indicators = stage("indicators", lambda: state_indicators(indicator_sums(df), year, quarter, variance=variance))
+    stage("policy_merge", lambda: merge_policy(indicators, od, year, quarter, calendar))
+    return out
+
+def benchmark(rows_list=ROWS, layouts=PERIODS, repeat=3, engine="c", variance="jackknife", seed=0):
+    """
+    Best of `repeat` timings and the traced peak memory of every stage, for each
+    number of rows and layout. Returns {'{layout}_{rows}': {stage: {...}}}.
+    """
+    columns, calendar = load_auxiliary()
+    results = {}
+    for rows in rows_list:
+        for layout in layouts:
+            year, quarter = PERIODS[layout]
+            paths = synthetic_quarter(rows, layout, seed)
+            timings = [run_stages(paths, year, quarter, columns, calendar, engine, variance)
+                       for _ in range(repeat)]
+            memory = run_stages(paths, year, quarter, columns, calendar, engine, variance, trace=True)
+            key = f"{layout}_{rows}"
+            results[key] = {name: {"seconds": round(min(t[name] for t in timings), 4),
+                                   "peak_mb": round(memory[name], 2)}
+                            for name in STAGES}
+            total = sum(r["seconds"] for r in results[key].values())
+            print(f"{key}: {total:.3f} s")
+            for name in STAGES:
+                print(f"  {name:<13}{results[key][name]['seconds']:>9.4f} s{results[key][name]['peak_mb']:>10.1f} MB")
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Lists the stages slower or larger than the baseline by more than the tolerance.
+    Cases or stages missing from the baseline are not compared.
+    """
+    regressions = []
+    for key, stages in results.items():
+        for name, current in stages.items():
+            reference = baseline.get(key, {}).get(name)
+            if reference is None:
+                continue
+            for measure, noise in (("seconds", MIN_SECONDS), ("peak_mb", MIN_MB)):
+                limit = reference[measure] * (1 + tolerance)
+                if current[measure] > limit and current[measure] - reference[measure] > noise:
+                    regressions.append(f"{key} {name}: {measure} {current[measure]} > baseline {reference[measure]}")
+    return regressions
+
+def load_baseline(path=BASELINE_PATH):
+    if not Path(path).exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = {"machine": platform.machine(), "python": platform.python_version(), "results": results}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the create_dataset stages on synthetic ENOE data")
+    parser.add_argument("--rows", type=int, nargs="+", default=ROWS, help="people per synthetic quarter")
+    parser.add_argument("--layouts", nargs="+", choices=sorted(PERIODS), default=sorted(PERIODS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the best one is kept)")
+    parser.add_argument("--engine", choices=["c", "pyarrow"], default="c")
+    parser.add_argument("--variance", choices=["jackknife", "bootstrap"], default="jackknife")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed relative slowdown or memory growth before failing")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline instead of comparing")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = benchmark(args.rows, args.layouts, args.repeat, args.engine, args.variance, args.seed)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        save_baseline(results, args.baseline)
+        print(f"No baseline at {args.baseline}; saved these results as the baseline of this machine")
+        sys.exit(0)
+    if (baseline["machine"], baseline["python"]) != (platform.machine(), platform.python_version()):
+        print(f"Warning: {args.baseline} was recorded on {baseline['machine']} with Python "
+              f"{baseline['python']}; refresh it with --save-baseline")
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressions against {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
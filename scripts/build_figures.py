@@ -0,0 +1,185 @@
+# Headless build of the Python paper figures (03_plot_migration.py, 04_timeline.py,
+# 05_time_map.py, map_animation.py) with the non-interactive Agg backend.
+# Every figure is keyed by a hash of what it is drawn from: its input files, its
+# plotting parameters and the source of the script that draws it and of every
+# module of scripts/ it imports (state_geometry.py, policy_calendar.py...). The hashes of the
+# last build are kept in img/.figure_hashes.json and a figure whose key has not
+# changed (and whose output exists) is skipped; the others render in parallel
+# worker processes.
+# Only these Python figures are built here. The rest of img/ is not tracked: the R
+# analysis draws did_plot, figure1-2, figure_comparison*, figure_gold_standard
+# (analysis/*.R), lgbt and migration_lgbt (r/plots.R, r/plots/rdd.R); colores and
+# flujos come from the notebooks; struct_break and event_study have no script in
+# the repository.
+#
+#   python scripts/build_figures.py                 # refresh img/
+#   python scripts/build_figures.py --paper         # also copy them to public/paper
+#   python scripts/build_figures.py --force timeline
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+HASHES_PATH = Path("img/.figure_hashes.json")
+PAPER_DIR = Path("public/paper")
+SCRIPTS_DIR = Path(__file__).resolve().parent
+# Everything the policy calendar (policy_calendar.py) is built from
+# (its source is hashed with the modules each script imports)
+CALENDAR_INPUTS = ["auxiliary/equal_marriage.csv", "auxiliary/states.csv"]
+
+# name: script module, drawing function, input files and keyword arguments
+# (the output path is passed as output=)
+FIGURES = {
+    "migration_trend": {
+        "module": "03_plot_migration",
+        "function": "plot_single_trend",
+        "inputs": ["data/ENOE/final/lgbt_migration.csv"] + CALENDAR_INPUTS,
+        "params": {"dpi": 300},
+        "output": "img/migration_lgbt_single_line.png",
+    },
+    "timeline": {
+        "module": "04_timeline",
+        "function": "plot_timeline",
+        "inputs": CALENDAR_INPUTS,
+        "params": {"dpi": 100},
+        "output": "img/timeline.png",
+    },
+    "marriage_map": {
+        "module": "05_time_map",
+        "function": "plot_map",
+        "inputs": ["data/geo/mexico_states.parquet"] + CALENDAR_INPUTS,
+        "params": {"dpi": 100, "detail": "medium"},
+        "output": "img/by year.png",
+    },
+    "marriage_animation": {
+        "module": "map_animation",
+        "function": "animate",
+        "inputs": ["data/ENOE/final/lgbt_migration.csv", "data/geo/mexico_states.parquet"],
+        "params": {"variable": "equal_marriage", "detail": "low", "dpi": 100},
+        "output": "img/map_equal_marriage.gif",
+    },
+}
+
+def _file_digest(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def local_modules(module, scripts_dir=SCRIPTS_DIR):
+    """
+    Sources of module and of the modules of scripts_dir it imports, directly or
+    through each other, in a stable order.
+    """
+    seen = {}
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        path = scripts_dir / f"{name}.py"
+        if name in seen or not path.exists():
+            continue
+        seen[name] = path
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.Import):
+                pending += [alias.name.split(".")[0] for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.split(".")[0])
+    return [seen[name] for name in sorted(seen)]
+
+def figure_key(figure):
+    """
+    Hash of the inputs, parameters, drawing script and imported helper modules of
+    a figure. A missing input hashes as missing, so the figure renders (and fails) again.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(figure["params"], sort_keys=True).encode())
+    for path in local_modules(figure["module"]) + [Path(p) for p in figure["inputs"]]:
+        digest.update(str(path).encode())
+        digest.update(_file_digest(path).encode() if path.exists() else b"missing")
+    return digest.hexdigest()
+
+def load_hashes(path=HASHES_PATH):
+    if not Path(path).exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_hashes(hashes, path=HASHES_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+
+def render(name):
+    """
+    Draws one figure in this process. Returns (name, error message or None).
+    """
+    figure = FIGURES[name]
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        Path(figure["output"]).parent.mkdir(parents=True, exist_ok=True)
+        draw = getattr(importlib.import_module(figure["module"]), figure["function"])
+        draw(output=figure["output"], **figure["params"])
+    except Exception as e:
+        return name, f"{type(e).__name__}: {e}"
+    return name, None
+
+def build(names=None, force=(), processes=None, paper=False, hashes_path=HASHES_PATH):
+    """
+    Renders the figures whose key changed since the last build (all of names if None),
+    plus those in force. Returns the names that failed.
+    """
+    names = list(names or FIGURES)
+    hashes = load_hashes(hashes_path)
+    keys = {name: figure_key(FIGURES[name]) for name in names}
+    stale = [name for name in names
+             if name in force or hashes.get(name) != keys[name] or not Path(FIGURES[name]["output"]).exists()]
+    for name in names:
+        if name not in stale:
+            print(f"{name}: unchanged, skipped")
+
+    failed = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for name, error in pool.map(render, stale):
+                if error:
+                    print(f"{name}: failed ({error})")
+                    hashes.pop(name, None)
+                    failed.append(name)
+                else:
+                    print(f"{name}: rendered {FIGURES[name]['output']}")
+                    # Drawing may have created an input (the geometry cache)
+                    hashes[name] = figure_key(FIGURES[name])
+        save_hashes(hashes, hashes_path)
+
+    if paper:
+        PAPER_DIR.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            output = Path(FIGURES[name]["output"])
+            if name not in failed and output.exists():
+                shutil.copy2(output, PAPER_DIR / output.name)
+    return failed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render the Python paper figures headless, skipping unchanged ones")
+    parser.add_argument("figures", nargs="*", metavar="FIGURE",
+                        help=f"figures to build, of {', '.join(FIGURES)} (default: all)")
+    parser.add_argument("--force", action="store_true", help="render even if the inputs did not change")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--paper", action="store_true", help=f"also copy the figures to {PAPER_DIR}")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    names = args.figures or list(FIGURES)
+    unknown = sorted(set(names) - set(FIGURES))
+    if unknown:
+        raise SystemExit(f"Unknown figures: {', '.join(unknown)}")
+    failed = build(names, names if args.force else (), args.processes, args.paper)
+    raise SystemExit(1 if failed else 0)
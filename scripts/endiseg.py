@@ -0,0 +1,184 @@
+# State covariates from the ENDISEG 2021 microdata and their join onto the ENOE panel.
+# Reads only the variables it needs from INEGI's tmodulo CSV (enoe_reader's
+# column-projected, typed parser) and computes per state, weighted by FACTOR:
+#   lgbt.csv            percentage_lgbt, share of respondents identifying as LGB+
+#                       (P8_1 in 1, 2, 3, 6) among those who answered P8_1
+#   discrimination.csv  si / no, respondents who were / were not discriminated
+#                       against in the last 12 months (P8_5 = 1 / 2), and ratio,
+#                       the weighted share of si among them (ratio_unweighted is
+#                       si / (si + no), the definition of the notebook files)
+# These replace the files built by hand in notebooks/explore_endiseg.ipynb, whose
+# percentage_lgbt is on another scale (0.2-0.75) and whose ratio is unweighted;
+# the columns keep their old positions and r/transform_database.R selects them by
+# name. The new files are cached in data/ENDISEG_WEB/final with the SHA-256 of the
+# microdata and only recomputed when it changes. join_covariates adds them to lgbt_migration.csv by
+# array lookup on the state code, giving the analytic panel of the models.
+#
+#   python scripts/endiseg.py
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enoe_reader import read_questionnaire
+from enoe_store import file_sha256
+
+ENDISEG_PATH = Path("data/conjunto_de_datos_endiseg_2021_csv/conjunto_de_datos_tmodulo_endiseg_2021/"
+                    "conjunto_de_datos/conjunto_de_datos_tmodulo_endiseg_2021.csv")
+# Where notebooks/explore_endiseg.ipynb read it from, used if ENDISEG_PATH is missing
+NOTEBOOK_ENDISEG_PATH = Path("data/ENDISEG/conjunto_de_datos_tmodulo_endiseg_2021/"
+                             "conjunto_de_datos/conjunto_de_datos_tmodulo_endiseg_2021.csv")
+FINAL_ROOT = Path("data/ENDISEG_WEB/final")
+LGBT_FILE = "lgbt.csv"
+DISCRIMINATION_FILE = "discrimination.csv"
+MANIFEST_FILE = "_manifest.json"
+PANEL_PATH = Path("data/ENOE/final/lgbt_migration.csv")
+ANALYTIC_PATH = Path("data/ENOE/final/analytic_panel.csv")
+
+DTYPES = {"ent": "Int8", "factor": "float64", "p8_1": "Int8", "p8_5": "Int8"}
+# P8_1: 1 gay/lesbian, 2 bisexual, 3 other, 6 questioning = LGB+; 4, 5 heterosexual
+LGB_CODES = [1, 2, 3, 6]
+HETEROSEXUAL_CODES = [4, 5]
+# P8_5: 1 = discriminated against in the last 12 months, 2 = not
+YES, NO = 1, 2
+STATES = 32
+# Bump when a definition above changes, so cached results are recomputed
+VERSION = 2
+# Covariates added to the ENOE panel: column of the state table
+COVARIATES = ["percentage_lgbt", "ratio"]
+
+def read_endiseg(path=ENDISEG_PATH):
+    """
+    The ENDISEG variables in DTYPES, lower case, with blanks as NA.
+    """
+    return read_questionnaire(path, list(DTYPES), dtypes=DTYPES)
+
+def _by_state(ent, values):
+    return np.bincount(ent, values, minlength=STATES + 1)[1:]
+
+def state_covariates(df):
+    """
+    One row per cve (1-32) with the columns of lgbt.csv and discrimination.csv.
+    """
+    ent = df["ent"].to_numpy(dtype=float, na_value=np.nan)
+    keep = (ent >= 1) & (ent <= STATES)
+    ent = ent[keep].astype(np.int64)
+    w = np.nan_to_num(df["factor"].to_numpy(dtype=float, na_value=np.nan)[keep])
+    p8_1 = df["p8_1"].to_numpy(dtype=float, na_value=np.nan)[keep]
+    p8_5 = df["p8_5"].to_numpy(dtype=float, na_value=np.nan)[keep]
+
+    lgb = np.isin(p8_1, LGB_CODES)
+    answered = lgb | np.isin(p8_1, HETEROSEXUAL_CODES)
+    yes, no = p8_5 == YES, p8_5 == NO
+
+    out = pd.DataFrame(index=pd.RangeIndex(1, STATES + 1, name="cve"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["percentage_lgbt"] = _by_state(ent, w * lgb) / _by_state(ent, w * answered)
+        out["n_lgbt"] = _by_state(ent, lgb).astype(np.int64)
+        out["n_answered"] = _by_state(ent, answered).astype(np.int64)
+        out["si"] = _by_state(ent, yes).astype(np.int64)
+        out["no"] = _by_state(ent, no).astype(np.int64)
+        out["si_w"] = _by_state(ent, w * yes)
+        out["no_w"] = _by_state(ent, w * no)
+        out["ratio"] = out["si_w"] / (out["si_w"] + out["no_w"])
+        out["ratio_unweighted"] = out["si"] / (out["si"] + out["no"])
+    return out
+
+def save_covariates(covariates, root=FINAL_ROOT, manifest=None):
+    """
+    Writes lgbt.csv and discrimination.csv (with the leading index column that
+    r/transform_database.R expects) and the manifest, if given.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    table = covariates.reset_index()
+    lgbt = table.rename(columns={"cve": "ent"})[["ent", "percentage_lgbt", "n_lgbt", "n_answered"]]
+    lgbt.to_csv(root / LGBT_FILE)
+    table[["cve", "si", "no", "ratio", "si_w", "no_w", "ratio_unweighted"]].to_csv(root / DISCRIMINATION_FILE)
+    if manifest is not None:
+        with open(root / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+def read_covariates(root=FINAL_ROOT):
+    """
+    The covariates of lgbt.csv and discrimination.csv, one row per cve.
+    """
+    root = Path(root)
+    lgbt = pd.read_csv(root / LGBT_FILE, index_col=0).set_index("ent")
+    discrimination = pd.read_csv(root / DISCRIMINATION_FILE, index_col=0)
+    discrimination = discrimination.set_index(discrimination["cve"].astype(int)).drop(columns="cve")
+    out = lgbt.join(discrimination, how="outer")
+    out.index.name = "cve"
+    return out
+
+def load_covariates(path=ENDISEG_PATH, root=FINAL_ROOT, force=False):
+    """
+    The state covariates, from the cache when the microdata is unchanged.
+    Without the microdata, the CSVs already in root are used as they are.
+    """
+    path, root = Path(path), Path(root)
+    if not path.exists() and path == ENDISEG_PATH and NOTEBOOK_ENDISEG_PATH.exists():
+        path = NOTEBOOK_ENDISEG_PATH
+    if not path.exists():
+        if (root / LGBT_FILE).exists() and (root / DISCRIMINATION_FILE).exists():
+            print(f"{path} not found; using the ENDISEG covariates in {root}")
+            if not (root / MANIFEST_FILE).exists():
+                print("  these were not built by endiseg.py: percentage_lgbt and ratio follow the "
+                      "notebook's definitions (other scale, unweighted), not the ones above")
+            return read_covariates(root)
+        raise FileNotFoundError(f"No ENDISEG microdata at {path} and no covariates in {root}")
+
+    manifest = {"source": str(path), "source_size": path.stat().st_size,
+                "source_sha256": file_sha256(path), "version": VERSION}
+    manifest_path = root / MANIFEST_FILE
+    if not force and manifest_path.exists():
+        with open(manifest_path) as f:
+            if json.load(f) == manifest:
+                return read_covariates(root)
+
+    covariates = state_covariates(read_endiseg(path))
+    save_covariates(covariates, root, manifest)
+    print(f"Wrote ENDISEG covariates for {int(covariates['n_answered'].gt(0).sum())} states to {root}")
+    return covariates
+
+def join_covariates(panel, covariates, columns=COVARIATES):
+    """
+    Adds the state covariates to every row of panel by looking its ent up in an
+    array indexed by state code; states without ENDISEG data get NaN.
+    """
+    ent = panel["ent"].to_numpy(dtype=np.int64)
+    out = panel.copy()
+    for name in columns:
+        lookup = np.full(STATES + 1, np.nan)
+        lookup[covariates.index.to_numpy(dtype=np.int64)] = covariates[name].to_numpy(dtype=float)
+        out[name] = lookup[np.clip(ent, 0, STATES)]
+    return out
+
+def build_analytic_panel(panel, path=ENDISEG_PATH, root=FINAL_ROOT, output_path=ANALYTIC_PATH):
+    """
+    Writes the ENOE state-quarter panel with the ENDISEG covariates.
+    Returns the joined frame.
+    """
+    df = join_covariates(panel, load_covariates(path, root))
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(output_path, index=False)
+    print(f"Wrote the analytic panel ({len(df)} rows) to {output_path}")
+    return df
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ENDISEG state covariates and the analytic panel")
+    parser.add_argument("--endiseg", default=str(ENDISEG_PATH), help="ENDISEG tmodulo CSV")
+    parser.add_argument("--root", default=str(FINAL_ROOT), help="where lgbt.csv and discrimination.csv are cached")
+    parser.add_argument("--panel", default=str(PANEL_PATH), help="state-quarter panel built by 02_create_dataset.py")
+    parser.add_argument("--output", default=str(ANALYTIC_PATH), help="analytic panel to write")
+    parser.add_argument("--force", action="store_true", help="recompute the covariates even if cached")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.force:
+        load_covariates(args.endiseg, args.root, force=True)
+    build_analytic_panel(pd.read_csv(args.panel), args.endiseg, args.root, args.output)
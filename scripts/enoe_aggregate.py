@@ -0,0 +1,142 @@
+# Mergeable per-quarter accumulators for the state-level ENOE table.
+# accumulate() turns a block of joined coe1/coe2 rows into per-PSU sums of the
+# registered indicators (enoe_indicators.py), origin-destination counts and the
+# aggregate cube (enoe_cube.py); blocks of the same quarter are combined with
+# merge_accumulators() and finalize() builds the output rows. The in-memory build
+# is the one-block case of the chunked build; the sums are kept in fixed point
+# (enoe_indicators.fixed_point) until finalize(), so both give the same bits.
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from enoe_flows import DESTINATIONS, od_matrix, flows_from_equal
+from enoe_indicators import (INDICATORS, DEFAULT_INDICATORS, select, column_values, measures,
+                              fixed_point, from_fixed_point)
+from enoe_cube import cube_sums, merge_cubes
+from enoe_survey import STATES, merge_psu_sums, estimates_from_psu_sums
+import enoe_trace
+
+def prepare(df):
+    """
+    Keeps respondents aged 15+. Recodes are applied per indicator by indicator_sums.
+    """
+    with enoe_trace.span("filter") as span:
+        out = df[df['eda'] > 14]
+        span.set(rows_in=len(df), rows_out=len(out))
+    return out
+
+def indicator_sums(df, indicators=DEFAULT_INDICATORS):
+    """
+    Sums of one block of prepared rows per (state, upm), in a single grouped pass:
+    the enoe_indicators.measures of the indicators in fixed point, whose {name}_wy
+    and {name}_w are what enoe_survey.estimates_from_psu_sums takes.
+    Returns the accumulators {'psu': table, 'indicators': names}.
+    """
+    names = select(indicators)
+    with enoe_trace.span("indicators", indicators=len(names)) as span:
+        ent = column_values(df, 'ent')
+        keep = (ent >= 1) & (ent <= STATES)
+        # PSUs are identified within the state so a UPM code shared by two states stays two PSUs
+        state = pd.Series(ent[keep].astype(np.int64) - 1, name='state')
+        upm = pd.Series(np.nan_to_num(column_values(df, 'upm')[keep], nan=-1), name='upm')
+        psu = fixed_point(measures(df, names, keep)).groupby([state, upm]).agg('sum')
+        span.set(rows_in=len(df), rows_out=len(psu))
+    return {'psu': psu, 'indicators': names}
+
+def accumulate(df, indicators=DEFAULT_INDICATORS):
+    """
+    Sufficient statistics of one block of prepared rows: indicator_sums, the
+    origin-destination counts and the aggregate cube (see enoe_cube.py).
+    """
+    acc = indicator_sums(df, indicators)
+    with enoe_trace.span("od_pivot") as span:
+        acc['od'] = od_matrix(df['ent'], df['p3p2'])
+        span.set(rows_in=len(df), rows_out=int(acc['od'].sum()))
+    with enoe_trace.span("cube") as span:
+        acc['cube'] = cube_sums(df, acc['indicators'])
+        span.set(rows_in=len(df), rows_out=len(acc['cube']))
+    return acc
+
+def merge_accumulators(a, b):
+    return {
+        'psu': merge_psu_sums(a['psu'], b['psu']),
+        'indicators': a['indicators'],
+        'od': a['od'] + b['od'],
+        'cube': merge_cubes(a['cube'], b['cube']),
+    }
+
+def accumulate_blocks(blocks, indicators=DEFAULT_INDICATORS):
+    """
+    Prepares and accumulates every block of an iterable and merges the results.
+    """
+    return reduce(merge_accumulators, (accumulate(prepare(block), indicators) for block in blocks))
+
+def state_indicators(acc, year, quarter, variance="jackknife", replicates=200):
+    """
+    State aggregates of the indicators and the weighted estimates with replicate
+    standard errors of the weighted ones, one row per state present in the accumulators.
+    """
+    with enoe_trace.span("estimates", variance=variance) as span:
+        names = acc['indicators']
+        psu = from_fixed_point(acc['psu'])
+        states = from_fixed_point(acc['psu'].groupby(level='state').sum())
+        states = states[states['rows'] > 0]
+        df = pd.DataFrame({'ent': states.index.to_numpy(dtype=int) + 1})
+        for name in names:
+            total = states[f'{name}_sum'].to_numpy(dtype=float)
+            if INDICATORS[name]['agg'] == 'mean':
+                count = states[f'{name}_count'].to_numpy(dtype=float)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    total = np.where(count > 0, total / count, np.nan)
+            df[name] = total
+
+        # Expansion-factor (FAC) weighted means and totals, with replicate standard errors over UPMs
+        weighted = [name for name in names if INDICATORS[name].get('weight')]
+        if weighted:
+            estimates = estimates_from_psu_sums(psu, weighted, variance=variance,
+                                                replicates=replicates, seed=(year, quarter))
+            estimates = estimates.set_index('ent').reindex(df['ent'])
+            for column in estimates:
+                df[column] = estimates[column].to_numpy()
+        span.set(rows_in=len(acc['psu']), rows_out=len(df))
+    return df
+
+def merge_policy(indicators, od, year, quarter, calendar):
+    """
+    Adds the quarter, the equal marriage status of each state and the arrivals from
+    states with and without it to the state_indicators rows.
+    calendar: policy_calendar.PolicyCalendar
+    """
+    with enoe_trace.span("policy_merge") as span:
+        lead = [name for name in ('ent', 'migr') if name in indicators]
+        df_enoe = indicators[lead].copy()
+        df_enoe['year'] = year
+        df_enoe['quarter'] = quarter
+
+        # Arrivals from states with/without equal marriage this quarter, as a matrix product
+        mask = calendar.mask(year, quarter).astype(np.int64)
+        from_equal, from_non_equal = flows_from_equal(od, mask)
+
+        # Status and flows are in cve order: look each state's row up by its code
+        df_migraciones = pd.DataFrame({'cve': DESTINATIONS,
+                                       'equal_marriage': mask,
+                                       'from_equal': from_equal,
+                                       'from_non_equal': from_non_equal}, index=DESTINATIONS)
+        df_migraciones = df_migraciones.reindex(df_enoe['ent'].to_numpy())
+        for name in df_migraciones:
+            df_enoe[name] = df_migraciones[name].to_numpy()
+
+        # The other indicators and the weighted estimates, already one row per state in the same order
+        df_enoe = pd.concat([df_enoe, indicators.drop(columns=lead)], axis=1)
+        span.set(rows_in=len(indicators), rows_out=len(df_enoe))
+    return df_enoe
+
+def finalize(acc, year, quarter, calendar, variance="jackknife", replicates=200):
+    """
+    Builds the state rows of lgbt_migration.csv from the accumulators of a quarter.
+    Returns (df_enoe, od, cube), the cube as floats (see enoe_cube.py).
+    """
+    indicators = state_indicators(acc, year, quarter, variance=variance, replicates=replicates)
+    return (merge_policy(indicators, acc['od'], year, quarter, calendar), acc['od'],
+            from_fixed_point(acc['cube']))
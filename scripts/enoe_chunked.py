@@ -0,0 +1,86 @@
+# Out-of-core build of one ENOE quarter under a memory budget.
+# coe1, projected to the columns.csv variables, stays in memory as the left side
+# of the join; coe2 is streamed in blocks, each block is joined to coe1 on the
+# packed person key and folded into the accumulators of enoe_aggregate.py.
+# Gives the same rows as the in-memory join_questionnaires (left join, first
+# coe2 row wins on a duplicated key), just never all at once.
+import numpy as np
+import pandas as pd
+
+from enoe_keys import pack_key
+from enoe_store import load_questionnaire, stream_questionnaire, questionnaire_columns
+from enoe_aggregate import accumulate_blocks
+from enoe_indicators import DEFAULT_INDICATORS
+import enoe_trace
+
+# Parsed frames take several times the raw 8 bytes per value (parser buffers, copies, NA masks)
+PARSE_OVERHEAD = 4
+MIN_CHUNK_ROWS = 10_000
+
+def chunk_rows(memory_budget_mb, resident_bytes, n_columns):
+    """
+    Rows per coe2 block that fit in what is left of the budget once coe1 is loaded.
+    Never below MIN_CHUNK_ROWS.
+    """
+    available = memory_budget_mb * 1024**2 - resident_bytes
+    rows = available // (n_columns * 8 * PARSE_OVERHEAD)
+    if rows < MIN_CHUNK_ROWS:
+        print(f"Memory budget of {memory_budget_mb} MB is too small, using blocks of {MIN_CHUNK_ROWS} rows")
+    return max(MIN_CHUNK_ROWS, int(rows))
+
+def _expand(lo, hi):
+    """
+    Concatenation of range(lo[i], hi[i]) for every i, without a Python loop.
+    """
+    counts = hi - lo
+    starts = np.repeat(lo - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    return np.arange(counts.sum()) + starts
+
+def stream_joined(path_coe1, path_coe2, columns, memory_budget_mb, engine="c"):
+    """
+    Yields blocks of coe1 rows left-joined to coe2.
+    """
+    with enoe_trace.span("read", questionnaire=1) as span:
+        df1 = load_questionnaire(path_coe1, columns, engine=engine)
+        span.set(rows_out=len(df1))
+    key1 = pack_key(df1)
+    # Sorted keys so each coe2 key finds its coe1 rows with searchsorted
+    order = np.argsort(key1, kind="stable")
+    sorted_keys = key1[order]
+    matched = np.zeros(len(df1), dtype=bool)
+
+    coe2_columns = questionnaire_columns(path_coe2, columns)
+    extra = [c for c in coe2_columns if c not in df1.columns]
+    rows = chunk_rows(memory_budget_mb, df1.memory_usage(deep=True).sum(), len(df1.columns) + len(extra))
+
+    for chunk in stream_questionnaire(path_coe2, columns, rows):
+        with enoe_trace.span("join") as span:
+            key2 = pack_key(chunk)
+            lo = np.searchsorted(sorted_keys, key2, side="left")
+            hi = np.searchsorted(sorted_keys, key2, side="right")
+
+            # Left join: coe2 rows without a coe1 row are dropped, and a key that
+            # already matched (earlier in this block or in a previous one) is a duplicate
+            found = hi > lo
+            first = ~pd.Index(key2).duplicated()
+            seen = np.zeros(len(key2), dtype=bool)
+            seen[found] = matched[order[lo[found]]]
+            use = found & first & ~seen
+
+            rows1 = order[_expand(lo[use], hi[use])]
+            rows2 = np.repeat(np.flatnonzero(use), (hi - lo)[use])
+            matched[rows1] = True
+
+            block = pd.concat([df1.iloc[rows1].reset_index(drop=True),
+                               chunk[extra].iloc[rows2].reset_index(drop=True)], axis=1)
+            span.set(rows_in=len(chunk), rows_out=len(block))
+        yield block
+
+    # coe1 rows that never found a coe2 row, with the coe2 variables missing
+    yield df1[~matched].reset_index(drop=True).reindex(columns=list(df1.columns) + extra)
+
+def accumulate_chunked(path_coe1, path_coe2, columns, memory_budget_mb, engine="c", indicators=DEFAULT_INDICATORS):
+    """
+    Accumulators of one quarter (see enoe_aggregate.finalize), built block by block.
+    """
+    return accumulate_blocks(stream_joined(path_coe1, path_coe2, columns, memory_budget_mb, engine), indicators)
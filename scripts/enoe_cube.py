@@ -0,0 +1,178 @@
+# Aggregate cube of the ENOE quarters for questions below the state level.
+# For each quarter the dataset build (02_create_dataset.py) sums the respondents aged
+# 15+ by (ent, cd_a, age band, employment status): number of rows, FAC-weighted
+# count and the enoe_indicators.measures of the selected indicators. Every measure
+# is additive, so a coarser table (state, city, age band, ...) is a grouped sum of
+# the cube in memory and its means are ratios of the summed numerators and
+# denominators; the microdata is never read again.
+# The cube of all quarters is one Parquet file next to lgbt_migration.csv, loaded
+# once per process and reloaded only when the file changes.
+#
+#   python scripts/enoe_cube.py --by year quarter age_band --where ent=9 employed=1
+import argparse
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enoe_indicators import INDICATORS, column_values, fixed_point, measures
+from enoe_survey import STATES
+
+CUBE_PATH = Path("data/ENOE/final/enoe_cube.parquet")
+DIMENSIONS = ["ent", "cd_a", "age_band", "employed"]
+# Lower edge of each age band: 15-19, 20-24, 25-29, 30-44, 45-64, 65+
+AGE_EDGES = np.array([15, 20, 25, 30, 45, 65])
+AGE_BANDS = ["15-19", "20-24", "25-29", "30-44", "45-64", "65+"]
+# Employment status from p1 (worked at least one hour last week)
+EMPLOYED = {1: "employed", 0: "not employed", -1: "unknown"}
+# Code of a blank or out-of-range dimension
+UNKNOWN = -1
+
+def age_band(eda):
+    """
+    Index in AGE_BANDS of each age, UNKNOWN below 15 or blank.
+    """
+    eda = np.asarray(eda, dtype=float)
+    band = np.searchsorted(AGE_EDGES, np.nan_to_num(eda, nan=-1), side="right") - 1
+    return np.where(np.isnan(eda), UNKNOWN, band).astype(np.int8)
+
+def employment(p1):
+    """
+    1 if the respondent worked last week, 0 if not, UNKNOWN if p1 is blank.
+    """
+    p1 = np.asarray(p1, dtype=float)
+    return np.select([p1 == 1, p1 == 2], [1, 0], UNKNOWN).astype(np.int8)
+
+def cube_sums(df, names):
+    """
+    Cube of one block of prepared rows: the measures of the indicators in names plus
+    fac (the sum of the expansion factors) per (ent, cd_a, age_band, employed), in
+    fixed point (see enoe_indicators.fixed_point) so blocks add up exactly.
+    """
+    ent = column_values(df, "ent")
+    keep = (ent >= 1) & (ent <= STATES)
+    table = measures(df, names, keep)
+    table["fac"] = np.nan_to_num(column_values(df, "fac")[keep])
+
+    codes = {
+        "ent": ent[keep].astype(np.int64),
+        "cd_a": np.nan_to_num(column_values(df, "cd_a")[keep], nan=UNKNOWN).astype(np.int64),
+        "age_band": age_band(column_values(df, "eda")[keep]),
+        "employed": employment(column_values(df, "p1")[keep]),
+    }
+    return fixed_point(table).groupby([pd.Series(codes[name], name=name) for name in DIMENSIONS]).sum()
+
+def merge_cubes(a, b):
+    """
+    Adds two cube_sums tables (e.g. from two chunks of the same quarter).
+    """
+    return pd.concat([a, b]).groupby(level=DIMENSIONS).sum()
+
+def save_cube(periods, cubes, path=CUBE_PATH):
+    """
+    Stacks the per-quarter cubes with year and quarter columns into one Parquet file,
+    with the dimensions and counts as small integers.
+    """
+    frames = [cube.reset_index().assign(year=year, quarter=quarter)
+              for (year, quarter), cube in zip(periods, cubes)]
+    df = pd.concat(frames, ignore_index=True)
+    df = df[["year", "quarter"] + [name for name in df if name not in ("year", "quarter")]]
+    counts = ["rows"] + [name for name in df if name.endswith("_count")]
+    df = df.astype({"year": np.int16, "quarter": np.int8, "ent": np.int8, "cd_a": np.int16,
+                    **{name: np.int32 for name in counts}})
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(path, index=False, compression="zstd")
+
+@lru_cache(maxsize=4)
+def _read_cube(path, mtime_ns):
+    return pd.read_parquet(path)
+
+def load_cube(path=CUBE_PATH):
+    """
+    The cube written by save_cube, read once per process while the file is unchanged.
+    The frame is shared between callers and must not be modified.
+    """
+    path = Path(path).resolve()
+    return _read_cube(path, path.stat().st_mtime_ns)
+
+def indicator_names(cube):
+    return [name[:-len("_count")] for name in cube if name.endswith("_count")]
+
+def rollup(cube, by, where=None):
+    """
+    Sums the cube by the columns in by, over the rows matching where, and adds the
+    means: {name} (mean, or total for 'sum' indicators), {name}_w (weighted mean)
+    and {name}_total (weighted total) for each indicator of the cube.
+    where: {column: value or list of values}
+    """
+    if where:
+        mask = np.ones(len(cube), dtype=bool)
+        for name, value in where.items():
+            mask &= cube[name].isin(np.atleast_1d(value)).to_numpy()
+        cube = cube[mask]
+    dims = ["year", "quarter"] + DIMENSIONS
+    sums = cube.drop(columns=[name for name in dims if name not in by]).groupby(list(by)).sum()
+
+    out = sums[["rows", "fac"]].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in indicator_names(cube):
+            total = sums[f"{name}_sum"]
+            if INDICATORS.get(name, {}).get("agg", "mean") == "mean":
+                total = total / sums[f"{name}_count"].where(sums[f"{name}_count"] > 0)
+            out[name] = total
+            if f"{name}_wy" in sums:
+                out[f"{name}_w"] = sums[f"{name}_wy"] / sums[f"{name}_w"].where(sums[f"{name}_w"] > 0)
+                out[f"{name}_total"] = sums[f"{name}_wy"]
+    return out
+
+@lru_cache(maxsize=256)
+def _cached_rollup(path, mtime_ns, by, where):
+    return rollup(_read_cube(path, mtime_ns), list(by), {name: list(value) for name, value in where})
+
+def query(by, where=None, path=CUBE_PATH):
+    """
+    rollup of the cached cube, itself cached: repeating a drill-down is a dict lookup.
+    The frame is shared between callers and must not be modified.
+    """
+    path = Path(path).resolve()
+    where = tuple(sorted((name, tuple(np.atleast_1d(value).tolist())) for name, value in (where or {}).items()))
+    return _cached_rollup(path, path.stat().st_mtime_ns, tuple(by), where)
+
+def label(table):
+    """
+    Replaces the age band and employment codes of a rollup's index by their names.
+    """
+    table = table.reset_index()
+    if "age_band" in table:
+        table["age_band"] = table["age_band"].map(dict(enumerate(AGE_BANDS))).fillna("unknown")
+    if "employed" in table:
+        table["employed"] = table["employed"].map(EMPLOYED)
+    return table
+
+def _condition(text):
+    name, _, values = text.partition("=")
+    if not values or name not in ["year", "quarter"] + DIMENSIONS:
+        raise argparse.ArgumentTypeError(f"expected COLUMN=VALUE[,VALUE...] with a cube dimension, got {text}")
+    return name, [int(value) for value in values.split(",")]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Roll the ENOE aggregate cube up to any of its dimensions")
+    parser.add_argument("--by", nargs="+", default=["year", "quarter", "ent"],
+                        choices=["year", "quarter"] + DIMENSIONS, help="dimensions to keep")
+    parser.add_argument("--where", nargs="+", type=_condition, default=[], metavar="COLUMN=VALUES",
+                        help="keep only these codes, e.g. ent=9 age_band=0,1,2 (bands: "
+                             + ", ".join(f"{i}={band}" for i, band in enumerate(AGE_BANDS)) + ")")
+    parser.add_argument("--path", default=str(CUBE_PATH), help="cube written by 02_create_dataset.py")
+    parser.add_argument("--output", default=None, help="write the table to this CSV instead of printing it")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    table = label(query(args.by, dict(args.where), args.path))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"Wrote {len(table)} rows to {args.output}")
+    else:
+        print(table.to_string(index=False))
@@ -0,0 +1,380 @@
+# Locates the extracted ENOE questionnaires and downloads the quarters that are missing
+import hashlib
+import json
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import enoe_index
+import enoe_store
+import enoe_trace
+from enoe_index import DATA_ROOT
+
+# --- CONFIGURATION ---
+INEGI_ROOT = "https://www.inegi.org.mx/contenidos/programas/enoe/15ymas/"
+ZIP_ROOT = Path("data/ENOE/zip")
+MANIFEST_PATH = ZIP_ROOT / "manifest.json"
+CHUNK_SIZE = 1 << 20  # 1 MiB per write while streaming
+TIMEOUT = 60
+RETRIES = 4
+BACKOFF_SECONDS = 2
+
+# Where INEGI publishes each quarter. One row per era:
+# (first (year, quarter), last (year, quarter), survey variant, URL templates tried in order).
+# The ENOE^N (enoen) questionnaire replaces ENOE from 2020 Q2 onwards.
+URL_TABLE = [
+    ((2005, 1), (2017, 4), "enoe", [
+        "datosabiertos/{year}/{year}_trim{quarter}_enoe_csv.zip",
+        "microdatos/{year}trim{quarter}_csv.zip",
+    ]),
+    ((2018, 1), (2020, 1), "enoe", [
+        "datosabiertos/{year}/conjunto_de_datos_enoe_{year}_{quarter}t_csv.zip",
+        "microdatos/{year}trim{quarter}_csv.zip",
+    ]),
+    ((2020, 2), (9999, 4), "enoen", [
+        "datosabiertos/{year}/conjunto_de_datos_enoen_{year}_{quarter}t_csv.zip",
+        "microdatos/enoe_n_{year}_trim{quarter}_csv.zip",
+    ]),
+]
+
+def resolve_quarter(year, quarter):
+    """
+    Returns (variant, urls) for a quarter from URL_TABLE.
+    """
+    for first, last, variant, templates in URL_TABLE:
+        if first <= (year, quarter) <= last:
+            return variant, [INEGI_ROOT + t.format(year=year, quarter=quarter) for t in templates]
+    raise ValueError(f"No INEGI URL known for {year} Q{quarter}")
+
+def survey_variant(year, quarter):
+    """
+    'enoe' or 'enoen', as used in INEGI's file names.
+    """
+    return resolve_quarter(year, quarter)[0]
+
+def get_inegi_url(year, quarter):
+    """
+    Constructs the download URL for INEGI ENOE microdata (first candidate in URL_TABLE).
+    """
+    return resolve_quarter(year, quarter)[1][0]
+
+def part_path(target_path):
+    """
+    Where stream_download keeps the bytes of target_path until it is complete.
+    """
+    target_path = Path(target_path)
+    return target_path.with_name(target_path.name + ".part")
+
+def is_complete(part, offset, content_range):
+    """
+    True if a 416 answer to a resume from offset means the part file is the whole
+    archive: the total in Content-Range ('bytes */<total>') is offset and the zip opens.
+    """
+    match = re.fullmatch(r"bytes \*/(\d+)", (content_range or "").strip())
+    if not match or int(match.group(1)) != offset:
+        return False
+    try:
+        with zipfile.ZipFile(part):
+            return True
+    except zipfile.BadZipFile:
+        return False
+
+def stream_download(url, target_path, chunk_size=CHUNK_SIZE, session=None):
+    """
+    Streams url to target_path in fixed-size chunks, never holding the whole file in memory.
+    Bytes go to target_path + '.part' first; if that file is left over from an
+    interrupted run, the download resumes from its end with an HTTP Range request.
+    """
+    target_path = Path(target_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    part = part_path(target_path)
+    session = session or requests
+
+    offset = part.stat().st_size if part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, stream=True, headers=headers, timeout=TIMEOUT) as r:
+        if r.status_code == 416 and offset:
+            # Range not satisfiable: either the part file already holds the whole archive,
+            # or it is not a prefix of this one (e.g. a different URL or a newer release)
+            if not is_complete(part, offset, r.headers.get("Content-Range")):
+                part.unlink()
+                return stream_download(url, target_path, chunk_size, session)
+        else:
+            r.raise_for_status() # Check for broken links
+            # 206 means the server honoured the Range header; anything else restarts from zero
+            mode = "ab" if offset and r.status_code == 206 else "wb"
+            with open(part, mode) as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+
+    part.replace(target_path)
+    return target_path
+
+def questionnaire_members(zip_path, questionnaire_num):
+    """
+    Lists the CSV members of an INEGI archive that belong to coe1 or coe2.
+    """
+    pattern = f"coe{questionnaire_num}"
+    with zipfile.ZipFile(zip_path) as z:
+        return [name for name in z.namelist()
+                if name.lower().endswith(".csv") and pattern in Path(name).name.lower()]
+
+def extract_members(zip_path, target_dir, questionnaire_nums=(1, 2)):
+    """
+    Extracts only the coe1/coe2 tables, skipping viv, hog, sdem and the documentation.
+    If target_dir is a quarter folder under DATA_ROOT the file index is updated.
+    """
+    members = [m for n in questionnaire_nums for m in questionnaire_members(zip_path, n)]
+    with zipfile.ZipFile(zip_path) as z:
+        for member in members:
+            z.extract(member, target_dir)
+
+    target_dir = Path(target_dir)
+    if target_dir.parent == Path(DATA_ROOT):
+        year, quarter = target_dir.name.split("t")
+        enoe_index.update_quarter(int(year), int(quarter))
+    return members
+
+def zip_member_path(zip_path, questionnaire_num):
+    """
+    Returns a zipfile.Path to the coe1/coe2 CSV inside an archive, so it can be parsed without extracting.
+    """
+    members = questionnaire_members(zip_path, questionnaire_num)
+    if not members:
+        return None
+    return zipfile.Path(zip_path, members[0])
+
+def load_manifest(path=MANIFEST_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    enoe_index.write_json(manifest, path)
+
+def record_archive(entry, path=MANIFEST_PATH):
+    """
+    Adds one fetch_archive entry to the manifest. The manifest is reread under a
+    lock shared by threads and worker processes, so concurrent downloads all keep
+    their entries.
+    """
+    with enoe_index.file_lock(Path(path).with_suffix(".lock")):
+        manifest = load_manifest(path)
+        manifest[entry["quarter_key"]] = entry
+        save_manifest(manifest, path)
+
+def is_verified(entry, zip_path):
+    """
+    True if the archive on disk is the one recorded in the manifest.
+    Compares size and mtime only; the SHA-256 was checked when it was recorded.
+    """
+    if not entry or not zip_path.exists():
+        return False
+    stat = zip_path.stat()
+    return stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]
+
+def make_session(pool_size=4):
+    """
+    A requests session whose connection pool is large enough for pool_size concurrent downloads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def fetch_archive(year, quarter, session=None, retries=RETRIES, backoff=BACKOFF_SECONDS):
+    """
+    Downloads the archive of a quarter to data/ENOE/zip/{year}t{quarter}.zip.
+    Each candidate URL in URL_TABLE is tried in order; a 404 moves on to the next one
+    and discards the partial download, other errors retry the same URL with exponential
+    backoff (backoff, 2*backoff, 4*backoff...), resuming from the partial download.
+    Returns the manifest entry of the archive.
+    """
+    _, urls = resolve_quarter(year, quarter)
+    zip_path = ZIP_ROOT / f"{year}t{quarter}.zip"
+    last_error = None
+    first = 0
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        for i, url in enumerate(urls[first:], first):
+            try:
+                print(f"Downloading {url}...")
+                stream_download(url, zip_path, session=session)
+            except requests.HTTPError as e:
+                last_error = e
+                if e.response is not None and e.response.status_code == 404:
+                    # The bytes of another URL must not be resumed from
+                    part_path(zip_path).unlink(missing_ok=True)
+                    continue
+                first = i
+                break
+            except requests.RequestException as e:
+                last_error = e
+                first = i
+                break
+            else:
+                stat = zip_path.stat()
+                return {
+                    "quarter_key": f"{year}t{quarter}",
+                    "url": url,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "sha256": enoe_store.file_sha256(zip_path),
+                    "downloaded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                }
+        else:
+            # Every candidate answered 404: retrying will not help
+            break
+
+    raise RuntimeError(f"Could not download {year} Q{quarter}: {last_error}")
+
+def download_quarters(periods, workers=4, extract=True, retries=RETRIES):
+    """
+    Downloads several quarters concurrently through one pooled session.
+    Quarters whose archive matches the manifest, or that were already extracted,
+    are skipped. With extract=True only coe1/coe2 are extracted and the archive
+    is removed afterwards (the manifest keeps its size and checksum).
+    Returns a dict of failures keyed by (year, quarter).
+    """
+    manifest = load_manifest()
+    todo = []
+    for year, quarter in periods:
+        key = f"{year}t{quarter}"
+        zip_path = ZIP_ROOT / f"{key}.zip"
+        if is_verified(manifest.get(key), zip_path):
+            print(f"{zip_path} is already downloaded and verified")
+            if extract:
+                extract_members(zip_path, DATA_ROOT / key)
+                zip_path.unlink()
+            continue
+        if extract and find_questionnaire_csv(year, quarter, 1) and find_questionnaire_csv(year, quarter, 2):
+            print(f"{DATA_ROOT / key} is already extracted")
+            continue
+        todo.append((year, quarter))
+
+    failures = {}
+    session = make_session(workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_archive, year, quarter, session, retries): (year, quarter)
+                   for year, quarter in todo}
+        for future in as_completed(futures):
+            year, quarter = futures[future]
+            try:
+                entry = future.result()
+                record_archive(entry)
+                if extract:
+                    zip_path = ZIP_ROOT / f"{year}t{quarter}.zip"
+                    extract_members(zip_path, DATA_ROOT / f"{year}t{quarter}")
+                    zip_path.unlink()
+                print(f"Success: {year} Q{quarter}")
+            except Exception as e:
+                failures[(year, quarter)] = e
+
+    for (year, quarter), e in sorted(failures.items()):
+        print(f"Failed {year} Q{quarter}: {e}")
+    return failures
+
+def download_and_get_path(year, quarter, questionnaire_num, extract=True):
+    """
+    Downloads the data if missing, extracts it, and returns the path to the specific file:
+    the Parquet store file if the quarter has been converted, the extracted CSV otherwise.
+    questionnaire_num: 1 for coe1, 2 for coe2
+    extract: if False the archive is kept under data/ENOE/zip and a zipfile.Path
+             to the member is returned, to be parsed straight from the zip
+    """
+    return download_quarter_paths(year, quarter, extract, (questionnaire_num,))[0]
+
+def download_quarter_paths(year, quarter, extract=True, questionnaire_nums=(1, 2)):
+    """
+    download_and_get_path for several questionnaires of a quarter (coe1 and coe2 by
+    default), with at most one download: the files already on disk are resolved
+    first and the archive is fetched once for all of those that are not.
+    Returns one path (or None) per questionnaire.
+    """
+    with enoe_trace.span("download_quarter_paths", year=year, quarter=quarter,
+                         questionnaires=list(questionnaire_nums)) as span:
+        paths = [_local_path(year, quarter, n, extract, span) for n in questionnaire_nums]
+        if all(paths) or not _fetch_quarter(year, quarter, extract, span):
+            return paths
+        return [path or _path_after_fetch(year, quarter, n, extract) for n, path in zip(questionnaire_nums, paths)]
+
+def _local_path(year, quarter, questionnaire_num, extract, span):
+    # 1. Prefer the Parquet store (scripts/enoe_store.py) when the quarter has been converted
+    stored = enoe_store.quarter_path(year, quarter, questionnaire_num)
+    if stored:
+        print(f"File found in store: {stored}")
+        span.set(source="store")
+        return stored
+
+    # 2. Check if we already have the CSV
+    # The file index (scripts/enoe_index.py) spares us the 'conjunto_de_datos' nesting hell
+    found_file = find_questionnaire_csv(year, quarter, questionnaire_num)
+    if found_file:
+        print(f"File found locally: {found_file.name}")
+        span.set(source="csv")
+        return found_file
+
+    zip_path = ZIP_ROOT / f"{year}t{quarter}.zip"
+    if not extract and zip_path.exists():
+        member = zip_member_path(zip_path, questionnaire_num)
+        if member:
+            print(f"File found in archive: {member.name}")
+            span.set(source="zip")
+            return member
+    return None
+
+def _fetch_quarter(year, quarter, extract, span):
+    # 3. If not found, DOWNLOAD it (once for every questionnaire of the quarter)
+    target_dir = DATA_ROOT / f"{year}t{quarter}"
+    zip_path = ZIP_ROOT / f"{year}t{quarter}.zip"
+    span.set(source="download")
+    try:
+        if not zip_path.exists():
+            with enoe_trace.span("fetch_archive") as fetch_span:
+                entry = fetch_archive(year, quarter)
+                # Bytes received over the network rather than read from disk
+                fetch_span.set(bytes_read=entry["size"])
+            record_archive(entry)
+        if not extract:
+            return True
+
+        # Extract only coe1 and coe2; both at once so the next call finds its file
+        target_dir.mkdir(parents=True, exist_ok=True)
+        with enoe_trace.span("extract_members"):
+            extract_members(zip_path, target_dir)
+        zip_path.unlink()
+        print(f"Extracted to {target_dir}")
+
+    except Exception as e:
+        print(f"Failed to download/extract {year} Q{quarter}: {e}")
+        return False
+    return True
+
+def _path_after_fetch(year, quarter, questionnaire_num, extract):
+    # 4. Look it up again; extract_members has already updated the index
+    if not extract:
+        return zip_member_path(ZIP_ROOT / f"{year}t{quarter}.zip", questionnaire_num)
+    found_file = find_questionnaire_csv(year, quarter, questionnaire_num)
+    if not found_file:
+        print(f"Error: Downloaded zip but could not find file with pattern 'coe{questionnaire_num}' "
+              f"in {DATA_ROOT / f'{year}t{quarter}'}")
+        return None
+    return found_file
+
+def find_questionnaire_csv(year, quarter, questionnaire_num):
+    """
+    Returns the extracted coe1/coe2 CSV of a quarter, or None if it is not on disk.
+    """
+    return enoe_index.lookup(year, quarter, questionnaire_num)
@@ -0,0 +1,83 @@
+# Origin-destination migration flows as dense integer arrays.
+# For one quarter, od[d, o] counts the respondents living in state DESTINATIONS[d]
+# whose previous residence (p3p2) was ORIGIN slot o. Stacking quarters gives the
+# (quarter x destination x origin) tensor exported next to lgbt_migration.csv.
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+DESTINATIONS = np.arange(1, 33)
+STATES = 32
+# Slot for p3p2 codes that are not in auxiliary/destinations_mig.csv
+UNLISTED_CODE = -1
+TENSOR_PATH = "data/ENOE/final/od_flows.npz"
+
+@lru_cache(maxsize=None)
+def load_origin_codes(path="auxiliary/destinations_mig.csv"):
+    """
+    Origin codes in slot order: the 32 states first (so od[:, :32] is state to state),
+    then the other codes of destinations_mig.csv (unspecified state, foreign
+    countries) and finally UNLISTED_CODE.
+    """
+    codes = pd.read_csv(path).CVE.astype(int).to_list()
+    others = [c for c in codes if c not in set(DESTINATIONS)]
+    return tuple(DESTINATIONS.tolist() + others + [UNLISTED_CODE])
+
+def origin_slots(p3p2, origin_codes):
+    """
+    Maps p3p2 codes to origin slots; unknown codes go to the UNLISTED_CODE slot.
+    """
+    lookup = pd.Series(np.arange(len(origin_codes)), index=list(origin_codes))
+    return lookup.reindex(p3p2).fillna(lookup[UNLISTED_CODE]).to_numpy(dtype=np.int64)
+
+def od_matrix(ent, p3p2, origin_codes=None):
+    """
+    Counts (destination ent, origin p3p2) pairs in one pass.
+    Rows with a missing p3p2 (non movers) or an ent outside 1-32 are ignored.
+    Returns an int64 array of shape (32, len(origin_codes)).
+    """
+    origin_codes = origin_codes or load_origin_codes()
+    ent = pd.array(ent, dtype="Int64")
+    p3p2 = pd.array(p3p2, dtype="Int64")
+    keep = ~(np.asarray(ent.isna()) | np.asarray(p3p2.isna()))
+    dest = ent[keep].to_numpy(dtype=np.int64) - 1
+    orig = p3p2[keep].to_numpy(dtype=np.int64)
+
+    valid = (dest >= 0) & (dest < STATES)
+    dest, orig = dest[valid], orig[valid]
+
+    n_origins = len(origin_codes)
+    flat = dest * n_origins + origin_slots(orig, origin_codes)
+    return np.bincount(flat, minlength=STATES * n_origins).reshape(STATES, n_origins)
+
+def flows_from_equal(od, mask):
+    """
+    Splits arrivals by the legal status of the origin state.
+    od: (..., 32, n_origins) counts; mask: (..., 32) treatment of the origin states
+    Returns (from_equal, from_non_equal), each of shape (..., 32).
+    """
+    state_to_state = od[..., :STATES]
+    from_equal = np.einsum("...do,...o->...d", state_to_state, mask)
+    from_non_equal = np.einsum("...do,...o->...d", state_to_state, 1 - mask)
+    return from_equal, from_non_equal
+
+def save_tensor(periods, matrices, path=TENSOR_PATH, origin_codes=None):
+    """
+    Stacks the per-quarter OD matrices and saves them with their labels.
+    """
+    origin_codes = origin_codes or load_origin_codes()
+    np.savez_compressed(
+        path,
+        counts=np.stack(matrices),
+        periods=np.array(periods, dtype=np.int64),
+        destinations=DESTINATIONS,
+        origins=np.array(origin_codes, dtype=np.int64),
+    )
+
+def load_tensor(path=TENSOR_PATH):
+    """
+    Returns (counts, periods, destinations, origins) as saved by save_tensor.
+    """
+    with np.load(path) as data:
+        return data["counts"], data["periods"], data["destinations"], data["origins"]
@@ -0,0 +1,163 @@
+# Persistent index of the extracted ENOE questionnaires.
+# Maps (year, quarter, questionnaire) to the CSV under data/ENOE/raw together with
+# the survey variant (enoe/enoen), mtime and size, so lookups are a dict access plus
+# one stat() instead of an rglob over INEGI's nested conjunto_de_datos folders.
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialized
+    fcntl = None
+
+DATA_ROOT = Path("data/ENOE/raw")
+INDEX_FILE = "_index.json"
+LOCK_FILE = "_index.lock"
+
+_QUARTER_DIR = re.compile(r"^(\d{4})t([1-4])$")
+_QUESTIONNAIRE = re.compile(r"coe([12])")
+
+# Loaded index per root, so each process reads the file once
+_cache = {}
+_thread_lock = threading.Lock()
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock on path (created if needed), held across the threads of this
+    process and, where fcntl exists, across processes. For read-modify-write cycles
+    of the JSON files shared by concurrent downloads.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock, open(path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def write_json(data, path):
+    """
+    Writes data aside, under a name unique to this process and thread, and renames
+    it over path, so concurrent writers never share or read a partial file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def index_key(year, quarter, questionnaire_num):
+    return f"{year}t{quarter}/coe{questionnaire_num}"
+
+def _entry(path, year, quarter, questionnaire_num):
+    stat = path.stat()
+    return {
+        "year": year,
+        "quarter": quarter,
+        "questionnaire": f"coe{questionnaire_num}",
+        "variant": "enoen" if "enoen" in path.name.lower() else "enoe",
+        "path": str(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+    }
+
+def scan_quarter(year, quarter, root=DATA_ROOT):
+    """
+    Walks one quarter folder and returns its index entries (coe1 and coe2).
+    """
+    entries = {}
+    quarter_dir = Path(root) / f"{year}t{quarter}"
+    if not quarter_dir.exists():
+        return entries
+    for path in sorted(quarter_dir.rglob("*.csv")):
+        # INEGI sometimes uses COE1 vs coe1
+        match = _QUESTIONNAIRE.search(path.name.lower())
+        if match:
+            key = index_key(year, quarter, int(match.group(1)))
+            entries.setdefault(key, _entry(path, year, quarter, int(match.group(1))))
+    return entries
+
+def load_index(root=DATA_ROOT):
+    root = str(root)
+    if root not in _cache:
+        if (Path(root) / INDEX_FILE).exists():
+            _cache[root] = _read_index(root)
+        else:
+            _cache[root] = build_index(root)
+    return _cache[root]
+
+def _read_index(root):
+    path = Path(root) / INDEX_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_index(index, root=DATA_ROOT):
+    write_json(index, Path(root) / INDEX_FILE)
+    _cache[str(root)] = index
+
+def build_index(root=DATA_ROOT):
+    """
+    Scans every {year}t{quarter} folder once and writes the index.
+    """
+    index = {}
+    if Path(root).exists():
+        for quarter_dir in sorted(Path(root).iterdir()):
+            match = _QUARTER_DIR.match(quarter_dir.name)
+            if match:
+                index.update(scan_quarter(int(match.group(1)), int(match.group(2)), root))
+    with file_lock(Path(root) / LOCK_FILE):
+        save_index(index, root)
+    return index
+
+def update_quarter(year, quarter, root=DATA_ROOT):
+    """
+    Rescans one quarter (e.g. right after it was downloaded) and saves the index.
+    The index on disk is reread under the lock, so quarters indexed meanwhile by
+    other threads or processes are kept.
+    """
+    entries = scan_quarter(year, quarter, root)
+    with file_lock(Path(root) / LOCK_FILE):
+        index = _read_index(root)
+        for n in (1, 2):
+            index.pop(index_key(year, quarter, n), None)
+        index.update(entries)
+        save_index(index, root)
+    return index
+
+def is_current(entry):
+    """
+    Cheap validation: the file still exists with the recorded size and mtime.
+    """
+    try:
+        stat = Path(entry["path"]).stat()
+    except OSError:
+        return False
+    return stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]
+
+def lookup(year, quarter, questionnaire_num, root=DATA_ROOT):
+    """
+    Returns the path of a coe1/coe2 CSV, or None if the quarter is not on disk.
+    A stale or missing entry triggers a rescan of that quarter only.
+    """
+    entry = load_index(root).get(index_key(year, quarter, questionnaire_num))
+    if entry and is_current(entry):
+        return Path(entry["path"])
+    if not (Path(root) / f"{year}t{quarter}").exists():
+        return None
+    entry = update_quarter(year, quarter, root).get(index_key(year, quarter, questionnaire_num))
+    return Path(entry["path"]) if entry else None
+
+if __name__ == '__main__':
+    index = build_index()
+    print(f"Indexed {len(index)} questionnaires under {DATA_ROOT}")
@@ -0,0 +1,143 @@
+# Registry of the state-level indicators built from the ENOE microdata.
+# Each entry says how one ENOE variable becomes a value per respondent and how
+# those values are aggregated by state:
+#   source    ENOE variable (lower case, as in auxiliary/columns.csv)
+#   recode    function of the values (float, NaN for blanks) giving the value per
+#             respondent, e.g. 2 - x for 1 = yes / 2 = no answers; None keeps them
+#   missing   answer codes treated as blanks (e.g. "does not know")
+#   blank     value given to blanks after the recode; None leaves them out of the
+#             numerator and the denominator
+#   universe  variable that must be answered for a respondent to count (None: all
+#             respondents aged 15+)
+#   weight    expansion factor of the weighted estimates, None for unweighted only
+#   agg       'mean' (state mean) or 'sum' (state total)
+# enoe_aggregate.py computes every selected indicator in one grouped pass, so a new
+# indicator is an entry here and a name passed to --indicators.
+# Grouped sums of the measures are kept in fixed point (fixed_point), as int64 whole
+# parts and 2^-FRACTION_BITS fractions. Integer sums do not depend on the order of
+# the rows, so a quarter read in blocks (enoe_chunked.py) gives the same bits as one
+# read whole; from_fixed_point turns them back into floats once everything is summed.
+import numpy as np
+import pandas as pd
+
+def yes_no(x):
+    # 1 = yes, 2 = no -> 1/0
+    return 2 - x
+
+def marked(x):
+    # Checkbox answers: any code -> 1 (blanks stay blank)
+    return np.where(np.isnan(x), np.nan, 1.0)
+
+INDICATORS = {
+    # Moved to get or keep the job
+    "migr": {"source": "p3o", "recode": yes_no, "weight": "fac", "agg": "mean"},
+    # Worked at least one hour last week
+    "p1": {"source": "p1", "recode": yes_no, "weight": "fac", "agg": "mean"},
+    # Monthly income in pesos; 999998 / 999999 are "not known" / "not answered"
+    "p6b2": {"source": "p6b2", "missing": [999998, 999999], "weight": "fac", "agg": "mean"},
+    # Job benefits: share of those asked about their job (p3o answered) who marked each one
+    **{f"p3m{i}": {"source": f"p3m{i}", "recode": marked, "blank": 0, "universe": "p3o",
+                   "weight": "fac", "agg": "mean"}
+       for i in range(1, 10)},
+}
+
+# Indicators in lgbt_migration.csv unless others are selected
+DEFAULT_INDICATORS = ("migr", "p1", "p6b2")
+
+# Resolution of the fractional part of the fixed-point sums
+FRACTION_BITS = 32
+FRACTION = "_frac"
+
+def fixed_point(table):
+    """
+    The float columns of a measures table as exact int64 columns for summing: the
+    whole part under the column's name and, except for the counts (rows, *_count),
+    the fractional part in units of 2^-FRACTION_BITS under {name}_frac.
+    """
+    out = {}
+    for name in table:
+        values = table[name].to_numpy(dtype=float)
+        whole = np.floor(values)
+        out[name] = whole.astype(np.int64)
+        if name != "rows" and not name.endswith("_count"):
+            out[name + FRACTION] = np.rint((values - whole) * 2.0 ** FRACTION_BITS).astype(np.int64)
+    return pd.DataFrame(out, index=table.index, copy=False)
+
+def from_fixed_point(table):
+    """
+    Inverse of fixed_point for summed tables: one float column per measure.
+    """
+    out = {}
+    for name in table:
+        if name.endswith(FRACTION):
+            continue
+        values = table[name].to_numpy(dtype=float)
+        if name + FRACTION in table:
+            values = values + table[name + FRACTION].to_numpy(dtype=float) * 2.0 ** -FRACTION_BITS
+        out[name] = values
+    return pd.DataFrame(out, index=table.index)
+
+def select(names=None):
+    """
+    Validated list of indicator names, DEFAULT_INDICATORS if names is None.
+    """
+    names = list(DEFAULT_INDICATORS if names is None else names)
+    unknown = [name for name in names if name not in INDICATORS]
+    if unknown:
+        raise ValueError(f"Unknown indicators {unknown}; registered: {list(INDICATORS)}")
+    return names
+
+def column_values(df, column):
+    """
+    A column as a float array with NaN for blanks, all NaN if the file lacks it.
+    """
+    if column not in df:
+        return np.full(len(df), np.nan)
+    return df[column].astype("Float64").to_numpy(dtype=float, na_value=np.nan)
+
+def indicator_values(df, name):
+    """
+    Value of an indicator for every row of df, NaN where the respondent does not count.
+    """
+    spec = INDICATORS[name]
+    x = column_values(df, spec["source"])
+    if spec.get("missing"):
+        x = np.where(np.isin(x, spec["missing"]), np.nan, x)
+    if spec.get("recode"):
+        x = np.asarray(spec["recode"](x), dtype=float)
+    if spec.get("blank") is not None:
+        x = np.where(np.isnan(x), spec["blank"], x)
+    if spec.get("universe"):
+        x = np.where(np.isnan(column_values(df, spec["universe"])), np.nan, x)
+    return x
+
+def measures(df, names, keep):
+    """
+    Additive measures of the rows of df where keep is True, one column each: rows (1
+    per row) and, for each indicator, {name}_sum and {name}_count of its values and,
+    if weighted, {name}_wy and {name}_w, the weighted sum and the sum of weights over
+    the rows where it is not blank. Summed by any grouping they give its means and totals.
+    """
+    weighted = [name for name in names if INDICATORS[name].get("weight")]
+    columns = ["rows"] + [f"{name}_{part}" for name in names for part in ("sum", "count")]
+    columns += [f"{name}_{part}" for name in weighted for part in ("wy", "w")]
+
+    # All measures side by side in one float matrix, so a grouped sum is a single
+    # pass with no copy into a new frame; counts stay exact in float64
+    values = np.empty((int(keep.sum()), len(columns)))
+    values[:, 0] = 1
+    weights = {}
+    for name in names:
+        y = indicator_values(df, name)[keep]
+        valid = ~np.isnan(y)
+        i = columns.index(f"{name}_sum")
+        values[:, i] = np.where(valid, y, 0.0)
+        values[:, i + 1] = valid
+        if name in weighted:
+            weight = INDICATORS[name]["weight"]
+            if weight not in weights:
+                weights[weight] = np.nan_to_num(column_values(df, weight)[keep])
+            i = columns.index(f"{name}_wy")
+            values[:, i] = np.where(valid, weights[weight] * y, 0.0)
+            values[:, i + 1] = np.where(valid, weights[weight], 0.0)
+    return pd.DataFrame(values, columns=columns, copy=False)
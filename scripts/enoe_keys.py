@@ -0,0 +1,70 @@
+# ENOE person keys packed into one int64, and the coe1/coe2 join built on them
+import numpy as np
+import pandas as pd
+
+# Declared ENOE person key and the bits each component gets in the packed key,
+# from the most to the least significant. 59 bits in total.
+PERSON_KEY = ["cd_a", "ent", "con", "v_sel", "n_hog", "h_mud", "n_ren"]
+KEY_BITS = {"cd_a": 8, "ent": 6, "con": 24, "v_sel": 6, "n_hog": 4, "h_mud": 4, "n_ren": 7}
+
+def pack_key(df, key=PERSON_KEY, bits=KEY_BITS):
+    """
+    Packs the key columns of df into a single int64 surrogate.
+    Raises ValueError if a component is missing, negative or too large for its bits.
+    """
+    packed = np.zeros(len(df), dtype=np.int64)
+    for name in key:
+        col = df[name]
+        if col.isna().any():
+            raise ValueError(f"Key column '{name}' has missing values")
+        values = col.to_numpy(dtype=np.int64)
+        if len(values) and (values.min() < 0 or values.max() >= 1 << bits[name]):
+            raise ValueError(f"Key column '{name}' does not fit in {bits[name]} bits")
+        packed = (packed << bits[name]) | values
+    return packed
+
+def unpack_key(packed, key=PERSON_KEY, bits=KEY_BITS):
+    """
+    Inverse of pack_key. Returns a DataFrame with one column per key component.
+    """
+    packed = np.asarray(packed, dtype=np.int64)
+    columns = {}
+    for name in reversed(key):
+        columns[name] = packed & ((1 << bits[name]) - 1)
+        packed = packed >> bits[name]
+    return pd.DataFrame({name: columns[name] for name in key})
+
+def join_questionnaires(df1, df2, key=PERSON_KEY):
+    """
+    Left join of coe1 (df1) and coe2 (df2) on the packed person key.
+    coe1 is authoritative for the variables both files carry (fac, eda, upm...);
+    only the coe2-only variables are brought over. The join is a hash lookup of the
+    coe1 keys in an index of the coe2 keys, so no other column takes part in it.
+    Returns (df, diagnostics) with the counts of duplicated and unmatched keys.
+    """
+    key1 = pack_key(df1, key)
+    key2 = pack_key(df2, key)
+
+    duplicated1 = pd.Index(key1).duplicated()
+    duplicated2 = pd.Index(key2).duplicated()
+    # A duplicated coe2 key would multiply coe1 rows; keep its first occurrence
+    if duplicated2.any():
+        df2 = df2[~duplicated2]
+        key2 = key2[~duplicated2]
+
+    indexer = pd.Index(key2).get_indexer(key1)
+    matched = indexer >= 0
+
+    extra = [c for c in df2.columns if c not in df1.columns]
+    right = df2[extra].reset_index(drop=True).reindex(indexer).reset_index(drop=True)
+    df = pd.concat([df1.reset_index(drop=True), right], axis=1)
+
+    diagnostics = {
+        "rows_coe1": len(df1),
+        "rows_coe2": len(df2) + int(duplicated2.sum()),
+        "duplicated_coe1": int(duplicated1.sum()),
+        "duplicated_coe2": int(duplicated2.sum()),
+        "unmatched_coe1": int((~matched).sum()),
+        "unmatched_coe2": int(len(key2) - len(np.unique(indexer[matched]))),
+    }
+    return df, diagnostics
@@ -0,0 +1,203 @@
+# Cross-quarter linkage of the ENOE rotating panel.
+# Each dwelling stays in the sample for five quarters (visits n_ent 1-5). The index
+# keeps, for every coe1 person of every quarter, the packed person key of enoe_keys.py,
+# the visit number and the quarter; linking a quarter to the previous one is a hash
+# lookup of int64 keys, one vectorized join per quarter. Two kinds of events come out:
+#   - person links: the same key seen at visit k and at visit k+1 one quarter later,
+#     which gives every respondent a panel_id across visits;
+#   - household moves: a dwelling's household (cd_a, ent, con, v_sel, n_hog) whose
+#     h_mud changed between visits, i.e. the household interviewed before moved out.
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enoe_keys import PERSON_KEY, KEY_BITS, pack_key, unpack_key
+from enoe_store import load_questionnaire, quarter_path
+from enoe_download import find_questionnaire_csv
+from policy_calendar import period_code, period_of
+
+PANEL_PATH = Path("data/ENOE/final/panel_index.npz")
+MOVES_PATH = Path("data/ENOE/final/household_moves.csv")
+YEARS = range(2017, 2023)
+QUARTERS = range(1, 5)
+VISITS = 5
+
+# Bits below h_mud in the packed key: shifting them out leaves the household key,
+# shifting h_mud out too leaves the household slot (dwelling + n_hog)
+_REN_BITS = sum(KEY_BITS[name] for name in PERSON_KEY[PERSON_KEY.index("h_mud") + 1:])
+_MUD_BITS = KEY_BITS["h_mud"]
+
+def local_path(year, quarter, questionnaire_num=1):
+    """
+    coe1 of a quarter from the Parquet store or the extracted CSVs; never downloads.
+    """
+    return quarter_path(year, quarter, questionnaire_num) or find_questionnaire_csv(year, quarter, questionnaire_num)
+
+def quarter_keys(path):
+    """
+    Packed person keys and visit numbers of one coe1 file.
+    Rows with an incomplete key cannot be linked and are dropped.
+    """
+    df = load_questionnaire(path, PERSON_KEY + ["n_ent"]).dropna(subset=PERSON_KEY)
+    visit = df["n_ent"].fillna(0).to_numpy(dtype=np.int8)
+    return pack_key(df), visit
+
+def build_index(periods):
+    """
+    Reads the person keys of every (year, quarter) in periods that is on disk.
+    Returns a dict of aligned arrays: period (period_code), key, visit, sorted by period.
+    """
+    codes, keys, visits = [], [], []
+    for year, quarter in sorted(periods):
+        path = local_path(year, quarter)
+        if path is None:
+            print(f"Skipping {year} Q{quarter}: coe1 is not on disk")
+            continue
+        key, visit = quarter_keys(path)
+        codes.append(np.full(len(key), period_code(year, quarter), dtype=np.int32))
+        keys.append(key)
+        visits.append(visit)
+        print(f"Indexed {year} Q{quarter}: {len(key)} people")
+    if not keys:
+        return {"period": np.array([], np.int32), "key": np.array([], np.int64), "visit": np.array([], np.int8)}
+    return {"period": np.concatenate(codes), "key": np.concatenate(keys), "visit": np.concatenate(visits)}
+
+def _previous(index, code):
+    """
+    Row numbers of one quarter, and of the quarter before it.
+    """
+    bounds = np.searchsorted(index["period"], [code - 1, code, code + 1])
+    return np.arange(bounds[1], bounds[2]), np.arange(bounds[0], bounds[1])
+
+def _lookup(keys_prev, keys_cur):
+    """
+    Position in keys_prev of each key in keys_cur (-1 if absent). A key repeated
+    in keys_prev is looked up at its first occurrence.
+    """
+    first = ~pd.Index(keys_prev).duplicated()
+    positions = np.flatnonzero(first)
+    found = pd.Index(keys_prev[first]).get_indexer(keys_cur)
+    return np.where(found >= 0, positions[found], -1)
+
+def link_visits(index):
+    """
+    Panel id of every row: rows of the same person in consecutive quarters and
+    consecutive visits share it. Returns an int64 array aligned with the index.
+    """
+    panel_id = np.full(len(index["key"]), -1, dtype=np.int64)
+    next_id = 0
+    for code in np.unique(index["period"]):
+        cur, prev = _previous(index, code)
+        match = np.full(len(cur), -1)
+        if len(prev):
+            match = _lookup(index["key"][prev], index["key"][cur])
+            hit = match >= 0
+            # Same person only if this is the next visit of the same rotation group
+            hit[hit] = index["visit"][cur[hit]] == index["visit"][prev[match[hit]]] + 1
+            match = np.where(hit, match, -1)
+
+        linked = match >= 0
+        panel_id[cur[linked]] = panel_id[prev[match[linked]]]
+        panel_id[cur[~linked]] = next_id + np.arange((~linked).sum())
+        next_id += int((~linked).sum())
+    return panel_id
+
+def household_moves(index):
+    """
+    Households whose h_mud changed between consecutive visits of their dwelling.
+    Returns one row per event with the quarter it was observed in, the household
+    slot (cd_a, ent, con, v_sel, n_hog) and h_mud before and after.
+    """
+    household = index["key"] >> _REN_BITS
+    events = []
+    for code in np.unique(index["period"]):
+        cur, prev = _previous(index, code)
+        if not len(prev):
+            continue
+        hh_prev = np.unique(household[prev])
+        hh_cur = np.unique(household[cur])
+        # Households that were not there last quarter, looked up by slot
+        new = hh_cur[~np.isin(hh_cur, hh_prev)]
+        before = _lookup(hh_prev >> _MUD_BITS, new >> _MUD_BITS)
+        found = before >= 0
+        events.append(pd.DataFrame({
+            "period": code,
+            "household": new[found],
+            "h_mud_before": hh_prev[before[found]] & ((1 << _MUD_BITS) - 1),
+        }))
+    if not events:
+        return pd.DataFrame(columns=["year", "quarter"] + PERSON_KEY[:-2] + ["h_mud_before", "h_mud_after"])
+
+    moves = pd.concat(events, ignore_index=True)
+    keys = unpack_key(moves["household"].to_numpy() << _REN_BITS)
+    year, quarter = period_of(moves["period"].to_numpy())
+    out = pd.DataFrame({"year": year, "quarter": quarter})
+    for name in PERSON_KEY[:-2]:
+        out[name] = keys[name].to_numpy()
+    out["h_mud_before"] = moves["h_mud_before"].to_numpy()
+    out["h_mud_after"] = keys["h_mud"].to_numpy()
+    return out
+
+def follow(index, panel_id, ids):
+    """
+    Every quarter and visit in which the given panel ids were observed, with their keys.
+    """
+    rows = np.flatnonzero(np.isin(panel_id, ids))
+    year, quarter = period_of(index["period"][rows])
+    out = pd.DataFrame({"panel_id": panel_id[rows], "year": year, "quarter": quarter,
+                        "n_ent": index["visit"][rows]})
+    out = pd.concat([out, unpack_key(index["key"][rows])], axis=1)
+    return out.sort_values(["panel_id", "year", "quarter"], ignore_index=True)
+
+def link_summary(index, panel_id):
+    """
+    Per quarter: people, people linked to the previous quarter and expected links
+    (people at visits 2-5).
+    """
+    df = pd.DataFrame({"period": index["period"], "visit": index["visit"], "panel_id": panel_id})
+    # A row is linked if its panel id was already used by an earlier row
+    df["linked"] = pd.Index(panel_id).duplicated()
+    df["expected"] = (df["visit"] > 1) & (df["visit"] <= VISITS)
+    summary = df.groupby("period").agg(people=("visit", "size"), linked=("linked", "sum"),
+                                       expected=("expected", "sum"))
+    summary["year"], summary["quarter"] = period_of(summary.index.to_numpy())
+    return summary.reset_index(drop=True)[["year", "quarter", "people", "linked", "expected"]]
+
+def save_index(index, panel_id, path=PANEL_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, panel_id=panel_id, **index)
+
+def load_index(path=PANEL_PATH):
+    """
+    Returns (index, panel_id) as written by save_index.
+    """
+    with np.load(path) as data:
+        index = {name: data[name] for name in ("period", "key", "visit")}
+        return index, data["panel_id"]
+
+def run(years=YEARS, quarters=QUARTERS, panel_path=PANEL_PATH, moves_path=MOVES_PATH):
+    periods = [(year, quarter) for year in years for quarter in quarters]
+    index = build_index(periods)
+    panel_id = link_visits(index)
+    save_index(index, panel_id, panel_path)
+    print(link_summary(index, panel_id).to_string(index=False))
+    print(f"Wrote {len(panel_id)} rows, {len(np.unique(panel_id))} people to {panel_path}")
+
+    moves = household_moves(index)
+    Path(moves_path).parent.mkdir(parents=True, exist_ok=True)
+    moves.to_csv(moves_path, index=False)
+    print(f"Wrote {len(moves)} household moves to {moves_path}")
+    return index, panel_id, moves
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Link ENOE respondents across the quarters of the rotating panel")
+    parser.add_argument("--years", type=int, nargs="+", default=list(YEARS))
+    parser.add_argument("--quarters", type=int, nargs="+", default=list(QUARTERS))
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    run(args.years, args.quarters)
@@ -0,0 +1,58 @@
+# Two-stage scheduler for the dataset build: fetch (download and extract, I/O
+# bound) on threads, compute (parse and aggregate, CPU bound) on processes.
+# Each stage has its own concurrency limit and a bounded buffer sits between
+# them: once `buffer` quarters are fetched or being fetched ahead of the compute
+# stage, fetching waits, so a fast network never fills the disk with extracted
+# quarters and a slow one never leaves the workers without work for long. A cold
+# build then takes about max(download time, compute time) instead of their sum.
+# Quarters start computing in (year, quarter) order among those already fetched,
+# and results are keyed by period, so the output does not depend on timing.
+from bisect import insort
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+def run_pipeline(periods, fetch, compute, fetch_workers=2, compute_workers=1, buffer=4):
+    """
+    Runs fetch(year, quarter) and then compute(year, quarter) for every period.
+    fetch runs on fetch_workers threads; compute must be picklable and runs on
+    compute_workers processes. At most buffer quarters are fetched or being fetched
+    without having started to compute.
+    Returns (results, failures), both dicts keyed by (year, quarter): the results of
+    compute, and the exception of the stage that failed.
+    """
+    buffer = max(buffer, 1)
+    pending = list(periods)
+    fetching = {}
+    ready = []
+    computing = {}
+    results = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+         ProcessPoolExecutor(max_workers=compute_workers) as compute_pool:
+        while pending or fetching or ready or computing:
+            # Backpressure: fetch ahead only while the buffer has room
+            while pending and len(fetching) < fetch_workers and len(fetching) + len(ready) < buffer:
+                period = pending.pop(0)
+                fetching[fetch_pool.submit(fetch, *period)] = period
+            while ready and len(computing) < compute_workers:
+                period = ready.pop(0)
+                computing[compute_pool.submit(compute, *period)] = period
+
+            done, _ = wait(list(fetching) + list(computing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    period = fetching.pop(future)
+                    try:
+                        future.result()
+                        insort(ready, period)
+                    except Exception as e:
+                        failures[period] = e
+                else:
+                    period = computing.pop(future)
+                    try:
+                        results[period] = future.result()
+                        print(f"Success: {period[0]} Q{period[1]}")
+                    except Exception as e:
+                        failures[period] = e
+
+    return results, failures
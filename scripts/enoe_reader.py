@@ -0,0 +1,121 @@
+# Column-projected, typed reader for the ENOE questionnaire files (coe1, coe2)
+import csv
+import io
+import zipfile
+import pandas as pd
+
+COLUMNS_PATH = "auxiliary/columns.csv"
+ENCODING = "latin-1"
+
+# INEGI codes missing answers as a single blank
+NA_VALUES = [" "]
+
+# Other physical names of a variable in some INEGI releases, tried after its own name.
+# ENOE^N publishes the quarterly expansion factor as FAC_TRI (with FAC_MES, monthly).
+ALIASES = {"fac": ["fac_tri"]}
+# Byte order mark that starts the header of some releases, as read as UTF-8 and as latin-1
+BOMS = ("\ufeff", "\u00ef\u00bb\u00bf")
+
+# Compact dtypes for the variables we aggregate on. Nullable ints because
+# blanks become NA at parse time. Every other column keeps pandas' default.
+DTYPES = {
+    "ent": "Int8",
+    "eda": "Int16",
+    "p1": "Int8",
+    "p3o": "Int8",
+    "p3p2": "Int16",
+    "fac": "float32",
+    "p6b2": "float32",
+}
+
+def load_columns(path=COLUMNS_PATH):
+    """
+    Returns the lower-case list of ENOE variables listed in auxiliary/columns.csv
+    """
+    return [x.strip().lower() for x in pd.read_csv(path).clave.to_list()]
+
+def open_binary(path):
+    """
+    Opens a CSV on disk or a member of a zip archive given as zipfile.Path.
+    """
+    if isinstance(path, zipfile.Path):
+        return path.open("rb")
+    return open(path, "rb")
+
+def read_header(path, encoding=ENCODING):
+    """
+    Reads only the first line of a CSV and returns its column names as written in the file.
+    path can also be a zipfile.Path, in which case only the start of the member is decompressed.
+    """
+    with io.TextIOWrapper(open_binary(path), encoding=encoding, newline="") as f:
+        return next(csv.reader(f))
+
+def logical_name(name):
+    """
+    A physical column name as the lower-case variable it holds, without padding or BOM.
+    """
+    name = name.strip()
+    for bom in BOMS:
+        if name.startswith(bom):
+            name = name[len(bom):]
+    return name.lower()
+
+def resolve_columns(header, wanted, aliases=ALIASES):
+    """
+    Maps the lower-case variables in wanted to the physical names in header.
+    INEGI switches between FAC and fac across releases, so matching is case insensitive,
+    and a variable published under another name in some releases is found through aliases.
+    Variables missing from the file are left out.
+    """
+    physical = {}
+    for name in header:
+        physical.setdefault(logical_name(name), name)
+    mapping = {}
+    for name in wanted:
+        for candidate in [name] + aliases.get(name, []):
+            if candidate in physical:
+                mapping[name] = physical[candidate]
+                break
+    return mapping
+
+def _read_options(path, columns, encoding, dtypes=DTYPES):
+    header = read_header(path, encoding)
+    mapping = resolve_columns(header, columns)
+    dtype = {mapping[name]: dtypes[name] for name in mapping if name in dtypes}
+    # In file order, which is the order the C parser returns and pyarrow follows usecols
+    usecols = [name for name in header if name in set(mapping.values())]
+    options = dict(usecols=usecols, dtype=dtype, na_values=NA_VALUES, encoding=encoding)
+    return options, {physical: name for name, physical in mapping.items()}
+
+def read_questionnaire(path, columns, engine="c", encoding=ENCODING, dtypes=DTYPES):
+    """
+    Reads only the requested variables of a coe1/coe2 file.
+    path: CSV on disk or zipfile.Path to a CSV inside an INEGI archive
+    columns: lower-case variable names (see load_columns)
+    engine: 'c' or 'pyarrow', passed to pd.read_csv
+    dtypes: {lower-case name: dtype}, DTYPES for the ENOE variables
+    Returns a DataFrame with lower-case column names and those dtypes.
+    """
+    options, names = _read_options(path, columns, encoding, dtypes)
+    options["engine"] = engine
+    if engine == "c":
+        options["low_memory"] = False
+    # pyarrow cannot apply the nullable int dtypes to columns with blanks at parse
+    # time: it reads with its own types and the declared ones are cast afterwards
+    dtype = options.pop("dtype") if engine == "pyarrow" else {}
+    with open_binary(path) as f:
+        df = pd.read_csv(f, **options)
+    if dtype:
+        df = df.astype(dtype)
+
+    return df.rename(columns=names)
+
+def iter_questionnaire(path, columns, chunksize, encoding=ENCODING):
+    """
+    Like read_questionnaire, but yields blocks of at most chunksize rows
+    so the whole file is never in memory. Always uses the C parser.
+    """
+    options, names = _read_options(path, columns, encoding)
+    with open_binary(path) as f:
+        for chunk in pd.read_csv(f, chunksize=chunksize, **options):
+            yield chunk.rename(columns=names)
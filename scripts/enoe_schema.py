@@ -0,0 +1,231 @@
+# Registry of the physical layout of every ENOE questionnaire on disk.
+# INEGI changed the files over the years: upper- or lower-case names, a byte order
+# mark on some headers, extra ENOE^N columns, variables renamed (FAC_TRI) or not
+# asked at all in some eras. For each quarter and questionnaire the registry keeps
+# the header as written and, from a small sample of the first rows, the kind of
+# each column (int, float, str) and whether it codes blanks as " ". Only the first
+# SAMPLE_BYTES of a file are read, also inside a downloaded zip, and the map is
+# cached in data/ENOE/schema.json until the file's size or mtime changes.
+# enoe_reader.resolve_columns maps a variable (p3p2, p6b2, fac...) to its physical
+# column in any of these layouts; coverage() tells the builder which quarters
+# have the variables it needs before any of them is parsed.
+#
+#   python scripts/enoe_schema.py --years 2005 2022
+import argparse
+import csv
+import json
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from enoe_reader import ENCODING, NA_VALUES, load_columns, logical_name, open_binary, resolve_columns
+from enoe_keys import PERSON_KEY
+from enoe_download import ZIP_ROOT, find_questionnaire_csv, zip_member_path
+import enoe_store
+
+SCHEMA_PATH = Path("data/ENOE/schema.json")
+SAMPLE_BYTES = 1 << 16
+# Without these a quarter cannot be built: the key joins coe1 and coe2 (so it is
+# needed in both), age selects respondents and p3p2 gives the flows
+KEY_VARIABLES = PERSON_KEY
+REQUIRED = ["eda", "p3p2"]
+
+def _kind(values):
+    kinds = set()
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            int(value)
+            kinds.add("int")
+        except ValueError:
+            try:
+                float(value)
+                kinds.add("float")
+            except ValueError:
+                return "str"
+    if not kinds:
+        return "empty"
+    return "float" if "float" in kinds else "int"
+
+def sniff(path, sample_bytes=SAMPLE_BYTES):
+    """
+    Layout of one coe1/coe2 file from its first sample_bytes: the header as written,
+    whether the names are upper case and start with a byte order mark, the kind of
+    each column in the sampled rows and the columns with blank (" ") answers.
+    path: CSV on disk, zipfile.Path inside an archive, or Parquet store file
+    """
+    if str(path).endswith(".parquet"):
+        schema = pq.read_schema(path)
+        types = {name: "str" if str(kind) in ("string", "large_string")
+                 else "float" if str(kind).startswith(("float", "double")) else "int"
+                 for name, kind in zip(schema.names, schema.types)}
+        return {"columns": schema.names, "upper": False, "bom": False, "types": types,
+                "blanks": [], "sample_rows": 0}
+
+    with open_binary(path) as f:
+        raw = f.read(sample_bytes)
+    lines = raw.decode(ENCODING).splitlines()
+    if len(raw) == sample_bytes:
+        # The last line is probably cut
+        lines = lines[:-1]
+    rows = list(csv.reader(lines))
+    header, sample = rows[0], rows[1:]
+    names = [logical_name(name) for name in header]
+    columns = [[row[i] for row in sample if i < len(row)] for i in range(len(header))]
+    return {
+        "columns": header,
+        "upper": all(name.strip() == name.strip().upper() for name in header if name.strip().isalpha()),
+        "bom": names[0] != header[0].strip().lower() if header else False,
+        "types": {name: _kind(values) for name, values in zip(names, columns)},
+        "blanks": [name for name, values in zip(names, columns) if any(v in NA_VALUES for v in values)],
+        "sample_rows": len(sample),
+    }
+
+def locate(year, quarter, questionnaire_num):
+    """
+    The file of a questionnaire already on disk, without downloading: the extracted
+    CSV, else the CSV inside the downloaded archive, else the Parquet store file.
+    Returns (kind, path) or (None, None).
+    """
+    found = find_questionnaire_csv(year, quarter, questionnaire_num)
+    if found:
+        return "csv", found
+    zip_path = ZIP_ROOT / f"{year}t{quarter}.zip"
+    if zip_path.exists():
+        member = zip_member_path(zip_path, questionnaire_num)
+        if member:
+            return "zip", member
+    stored = enoe_store.quarter_path(year, quarter, questionnaire_num)
+    if stored:
+        return "store", stored
+    return None, None
+
+def _stamp(path):
+    # A member of an archive changes with the archive
+    disk = Path(path.root.filename) if isinstance(path, zipfile.Path) else Path(path)
+    stat = disk.stat()
+    return {"path": str(disk), "member": path.at if isinstance(path, zipfile.Path) else None,
+            "size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_schema(path=SCHEMA_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_schema(schema, path=SCHEMA_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(schema, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+
+def scan(periods, path=SCHEMA_PATH):
+    """
+    Brings the registry up to date for every (year, quarter) in periods: files that
+    are new or changed since they were recorded are sniffed again, quarters that are
+    not on disk are dropped. Returns the registry, {"{year}t{quarter}/coe{n}": entry}.
+    """
+    schema = load_schema(path)
+    changed = False
+    for year, quarter in periods:
+        for n in (1, 2):
+            key = f"{year}t{quarter}/coe{n}"
+            kind, found = locate(year, quarter, n)
+            if found is None:
+                changed |= schema.pop(key, None) is not None
+                continue
+            stamp = _stamp(found)
+            entry = schema.get(key)
+            if entry and all(entry.get(name) == value for name, value in stamp.items()):
+                continue
+            schema[key] = {"year": year, "quarter": quarter, "questionnaire": f"coe{n}",
+                           "source": kind, **stamp, **sniff(found)}
+            changed = True
+    if changed:
+        save_schema(schema, path)
+    return schema
+
+def resolve(schema, year, quarter, questionnaire_num, columns):
+    """
+    {variable: physical column} of the requested variables in one recorded file,
+    None if the file is not in the registry.
+    """
+    entry = schema.get(f"{year}t{quarter}/coe{questionnaire_num}")
+    return None if entry is None else resolve_columns(entry["columns"], columns)
+
+def coverage(schema, periods, columns):
+    """
+    One row per (year, quarter, questionnaire) in the registry and one column per
+    variable, holding its physical name in that file or NaN if the file lacks it.
+    """
+    rows = {}
+    for year, quarter in periods:
+        for n in (1, 2):
+            mapping = resolve(schema, year, quarter, n, columns)
+            if mapping is not None:
+                rows[(year, quarter, f"coe{n}")] = mapping
+    table = pd.DataFrame.from_dict(rows, orient="index", columns=list(columns))
+    table.index = pd.MultiIndex.from_tuples(table.index, names=["year", "quarter", "questionnaire"])
+    return table.sort_index()
+
+def unbuildable(table, required=REQUIRED, key=KEY_VARIABLES):
+    """
+    {(year, quarter): missing variables} for the quarters of a coverage table that
+    lack the person key in either questionnaire or a required variable in both.
+    Required variables are only checked once both questionnaires are on disk.
+    """
+    out = {}
+    for (year, quarter), files in table.groupby(level=["year", "quarter"]):
+        present = files.notna()
+        missing = [name for name in key if not present[name].all()]
+        if len(files) == 2:
+            missing += [name for name in required if not present[name].any()]
+        if missing:
+            out[(year, quarter)] = sorted(set(missing))
+    return out
+
+def eras(table):
+    """
+    Consecutive quarters with the same set of variables, as rows of
+    (first, last, questionnaire, missing variables).
+    """
+    rows = []
+    for questionnaire, files in table.groupby(level="questionnaire"):
+        current = None
+        for (year, quarter, _), present in files.notna().iterrows():
+            missing = tuple(name for name, ok in present.items() if not ok)
+            if current and current["missing"] == missing:
+                current["last"] = f"{year} Q{quarter}"
+            else:
+                current = {"first": f"{year} Q{quarter}", "last": f"{year} Q{quarter}",
+                           "questionnaire": questionnaire, "missing": missing}
+                rows.append(current)
+    return pd.DataFrame([{**row, "missing": ", ".join(row["missing"]) or "-"} for row in rows])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record the layout of the ENOE files on disk and their coverage")
+    parser.add_argument("--years", nargs=2, type=int, default=[2005, 2022], metavar=("FIRST", "LAST"))
+    parser.add_argument("--path", default=str(SCHEMA_PATH), help="where the registry is cached")
+    parser.add_argument("--output", default=None, help="write the full coverage table to this CSV")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    periods = [(year, quarter) for year in range(args.years[0], args.years[1] + 1) for quarter in range(1, 5)]
+    schema = scan(periods, args.path)
+    table = coverage(schema, periods, load_columns())
+    print(f"{len(table)} questionnaire files on disk for {len(periods)} quarters, registry in {args.path}")
+    if len(table):
+        print(eras(table).to_string(index=False))
+        for (year, quarter), missing in sorted(unbuildable(table).items()):
+            print(f"  {year} Q{quarter} cannot be built, missing: {', '.join(missing)}")
+    if args.output:
+        table.to_csv(args.output)
+        print(f"Wrote coverage to {args.output}")
@@ -0,0 +1,170 @@
+# SQL over the ENOE questionnaires with an embedded DuckDB engine.
+# Every quarter in the Parquet store (data/ENOE/parquet, see enoe_store.py) and every
+# quarter only extracted as CSV under data/ENOE/raw (found through enoe_index.py) is
+# exposed as one virtual table per questionnaire, with year and quarter columns:
+#   coe1, coe2   the questionnaires, lower-case ENOE names (auxiliary/columns.csv)
+#   enoe         coe1 left-joined with coe2 on the person key, as in the dataset build:
+#                only the first coe2 row of a duplicated key is joined
+# A quarter in the store is read from the store. Nothing is loaded up front: a filter
+# on year/quarter only opens the files of those partitions, a filter on ent skips the
+# row groups of the other states (the store is sorted by ent) and only the columns a
+# query uses are read. CSV quarters are parsed by DuckDB when a query reaches them.
+#
+#   python scripts/enoe_sql.py "SELECT ent, avg(CASE WHEN p3o = 1 THEN 1 ELSE 0 END) AS movers
+#                               FROM enoe WHERE year = 2019 AND quarter = 3 AND ent = 9
+#                               GROUP BY ent" --output movers.csv
+import argparse
+import sys
+from pathlib import Path
+
+import duckdb
+
+import enoe_index
+from enoe_index import DATA_ROOT
+from enoe_keys import PERSON_KEY
+from enoe_reader import ALIASES, ENCODING, NA_VALUES, logical_name, read_header
+from enoe_store import STORE_ROOT, quarter_path
+
+TABLES = ("coe1", "coe2", "enoe")
+FORMATS = {".csv": "csv", ".parquet": "parquet"}
+# Position of a row in its file, to keep the first of a duplicated coe2 key
+ROW = "_row"
+
+def _quote(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+def _files(root, questionnaire):
+    return (Path(root) / "year=*" / "quarter=*" / f"questionnaire={questionnaire}" / "*.parquet").as_posix()
+
+def _scan(root, questionnaire):
+    # union_by_name: quarters of different layouts (ENOE / ENOEN) have different columns
+    return (f"SELECT * EXCLUDE (questionnaire, file_row_number), file_row_number AS {ROW} "
+            f"FROM read_parquet({_quote(_files(root, questionnaire))}, hive_partitioning = true, "
+            f"union_by_name = true, file_row_number = true, "
+            f"hive_types = {{'year': INTEGER, 'quarter': INTEGER}})")
+
+def csv_names(header):
+    """
+    Lower-case names of the columns of a CSV header, a variable published under an
+    alias (FAC_TRI) named as the variable itself (fac) unless the file also has it.
+    """
+    names = [logical_name(name) for name in header]
+    for name, aliases in ALIASES.items():
+        found = [alias for alias in aliases if alias in names]
+        if name not in names and found:
+            names[names.index(found[0])] = name
+    return names
+
+def _scan_csv(path, year, quarter):
+    names = ", ".join(_quote(name) for name in csv_names(read_header(path)))
+    return (f"SELECT *, {year}::INTEGER AS year, {quarter}::INTEGER AS quarter, "
+            f"row_number() OVER () - 1 AS {ROW} "
+            f"FROM read_csv({_quote(Path(path).as_posix())}, header = true, names = [{names}], "
+            f"nullstr = {_quote(NA_VALUES[0])}, encoding = {_quote(ENCODING)})")
+
+def csv_quarters(questionnaire_num, root=STORE_ROOT, raw_root=DATA_ROOT):
+    """
+    {(year, quarter): CSV path} of the quarters of a questionnaire that are extracted
+    under raw_root but not in the store.
+    """
+    out = {}
+    if not Path(raw_root).exists():
+        return out
+    for entry in list(enoe_index.load_index(raw_root).values()):
+        year, quarter = entry["year"], entry["quarter"]
+        if entry["questionnaire"] != f"coe{questionnaire_num}" or quarter_path(year, quarter, questionnaire_num, root):
+            continue
+        path = enoe_index.lookup(year, quarter, questionnaire_num, raw_root)
+        if path:
+            out[(year, quarter)] = path
+    return dict(sorted(out.items()))
+
+def connect(root=STORE_ROOT, database=":memory:", raw_root=DATA_ROOT):
+    """
+    DuckDB connection with the coe1, coe2 and enoe views over the store and the
+    extracted CSVs of the quarters the store lacks.
+    Raises FileNotFoundError if there is no quarter of a questionnaire at all.
+    """
+    con = duckdb.connect(database)
+    columns = {}
+    for n in (1, 2):
+        questionnaire = f"coe{n}"
+        sources = [_scan_csv(path, year, quarter) for (year, quarter), path in csv_quarters(n, root, raw_root).items()]
+        if any(Path(root).glob(f"year=*/quarter=*/questionnaire={questionnaire}/*.parquet")):
+            sources.insert(0, _scan(root, questionnaire))
+        if not sources:
+            raise FileNotFoundError(f"No {questionnaire} files under {root} or {raw_root}; "
+                                    f"download quarters with 01_download_ENOE.py")
+        union = " UNION ALL BY NAME ".join(f"({source})" for source in sources)
+        con.execute(f"CREATE VIEW _{questionnaire} AS {union}")
+        con.execute(f"CREATE VIEW {questionnaire} AS SELECT * EXCLUDE ({ROW}) FROM _{questionnaire}")
+        columns[questionnaire] = [row[0] for row in con.execute(f"DESCRIBE {questionnaire}").fetchall()]
+
+    # coe2 contributes the variables coe1 does not have; the key and period come from coe1.
+    # As in enoe_keys.join_questionnaires, a duplicated coe2 key keeps its first row,
+    # so it cannot multiply coe1 rows
+    keys = ["year", "quarter"] + PERSON_KEY
+    extra = [name for name in columns["coe2"] if name not in columns["coe1"]]
+    on = " AND ".join(f"c1.{name} = c2.{name}" for name in keys)
+    select = ", ".join(["c1.*"] + [f"c2.{name}" for name in extra])
+    first = (f"SELECT * FROM _coe2 QUALIFY row_number() OVER (PARTITION BY {', '.join(keys)} "
+             f"ORDER BY {ROW}) = 1")
+    con.execute(f"CREATE VIEW enoe AS SELECT {select} FROM coe1 c1 LEFT JOIN ({first}) c2 ON {on}")
+    return con
+
+def query(sql, root=STORE_ROOT, raw_root=DATA_ROOT):
+    """
+    Runs a query over the questionnaires and returns the result as a DataFrame.
+    """
+    with connect(root, raw_root=raw_root) as con:
+        return con.execute(sql).df()
+
+def export(sql, path, root=STORE_ROOT, fmt=None, raw_root=DATA_ROOT):
+    """
+    Writes the result of a query to path (CSV or Parquet, from fmt or the suffix)
+    without going through pandas. Returns the number of rows written.
+    """
+    path = Path(path)
+    fmt = fmt or FORMATS.get(path.suffix.lower())
+    if fmt not in FORMATS.values():
+        raise ValueError(f"Cannot tell the format of {path}; use a .csv or .parquet name or --format")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with connect(root, raw_root=raw_root) as con:
+        con.execute(f"COPY ({sql}) TO '{path.as_posix()}' (FORMAT {fmt})")
+        return con.execute(f"SELECT count(*) FROM read_{fmt}('{path.as_posix()}')").fetchone()[0]
+
+def describe(root=STORE_ROOT, raw_root=DATA_ROOT):
+    """
+    Columns and types of the virtual tables.
+    """
+    with connect(root, raw_root=raw_root) as con:
+        for table in TABLES:
+            rows = con.execute(f"DESCRIBE {table}").fetchall()
+            print(f"{table}: " + ", ".join(f"{name} {kind}" for name, kind, *_ in rows))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query the ENOE questionnaires with SQL (tables: coe1, coe2, enoe)")
+    parser.add_argument("sql", nargs="?", help="query; read from stdin if omitted")
+    parser.add_argument("--output", default=None, help="write the result to this .csv or .parquet file")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default=None,
+                        help="output format when the file name has no known suffix")
+    parser.add_argument("--root", default=str(STORE_ROOT), help="root of the Parquet store")
+    parser.add_argument("--raw-root", default=str(DATA_ROOT),
+                        help="extracted CSVs, read for the quarters the store lacks")
+    parser.add_argument("--describe", action="store_true", help="list the columns of the tables and exit")
+    parser.add_argument("--explain", action="store_true", help="print the query plan instead of running it")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.describe:
+        describe(args.root, args.raw_root)
+        sys.exit(0)
+    sql = args.sql or sys.stdin.read()
+    if args.explain:
+        print(query(f"EXPLAIN {sql}", args.root, args.raw_root)["explain_value"].iloc[0])
+    elif args.output:
+        rows = export(sql, args.output, args.root, args.format, args.raw_root)
+        print(f"Wrote {rows} rows to {args.output}")
+    else:
+        print(query(sql, args.root, args.raw_root).to_string(index=False))
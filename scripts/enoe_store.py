@@ -0,0 +1,182 @@
+# Columnar store for the extracted ENOE questionnaires.
+# Converts each quarter's coe1/coe2 CSV once into Parquet, partitioned as
+#   data/ENOE/parquet/year=2017/quarter=1/questionnaire=coe1/part-0.parquet
+# so later builds skip the latin-1 CSV parsing entirely.
+# Rows are sorted by state and written in small row groups, so readers that filter
+# on ent (enoe_sql.py) skip the row groups of the other states using their statistics.
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from enoe_reader import (DTYPES, NA_VALUES, ENCODING, read_header, resolve_columns, logical_name,
+                         read_questionnaire, iter_questionnaire)
+
+STORE_ROOT = Path("data/ENOE/parquet")
+METADATA_FILE = "_metadata.json"
+ROW_GROUP_ROWS = 32_768
+
+def partition_dir(year, quarter, questionnaire_num, root=STORE_ROOT):
+    return Path(root) / f"year={year}" / f"quarter={quarter}" / f"questionnaire=coe{questionnaire_num}"
+
+def quarter_path(year, quarter, questionnaire_num, root=STORE_ROOT):
+    """
+    Returns the Parquet file of one questionnaire, or None if it has not been converted.
+    """
+    path = partition_dir(year, quarter, questionnaire_num, root) / "part-0.parquet"
+    return path if path.exists() else None
+
+def load_metadata(root=STORE_ROOT):
+    path = Path(root) / METADATA_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_metadata(metadata, root=STORE_ROOT):
+    path = Path(root) / METADATA_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _smallest_int(series, nullable):
+    low, high = series.min(), series.max()
+    for bits in (8, 16, 32, 64):
+        info = np.iinfo(f"int{bits}")
+        if info.min <= low and high <= info.max:
+            return f"Int{bits}" if nullable else f"int{bits}"
+
+def compact_dtypes(df):
+    """
+    Shrinks the numeric columns of a freshly parsed questionnaire:
+    whole-number floats (ints with blanks) become nullable ints and
+    ints are downcast to the smallest width that holds them.
+    Columns declared in DTYPES are left as parsed.
+    """
+    for name in df.columns:
+        if name in DTYPES:
+            continue
+        col = df[name]
+        if pd.api.types.is_float_dtype(col):
+            values = col.dropna()
+            if len(values) and (values == np.floor(values)).all():
+                df[name] = col.astype(_smallest_int(values, nullable=True))
+        elif pd.api.types.is_integer_dtype(col) and len(col):
+            df[name] = col.astype(_smallest_int(col, nullable=False))
+    return df
+
+def convert_questionnaire(year, quarter, questionnaire_num, source_path, root=STORE_ROOT):
+    """
+    Parses one coe1/coe2 CSV in full and writes it to the store with lower-case names.
+    Returns the metadata entry (rows, columns, source path, size and checksum).
+    """
+    header = read_header(source_path)
+    mapping = resolve_columns(header, [logical_name(name) for name in header], aliases={})
+    dtype = {mapping[name]: DTYPES[name] for name in mapping if name in DTYPES}
+
+    df = pd.read_csv(source_path, dtype=dtype, na_values=NA_VALUES, encoding=ENCODING, low_memory=False)
+    df.columns = [logical_name(name) for name in df.columns]
+    df = compact_dtypes(df)
+    if "ent" in df:
+        df = df.sort_values("ent", kind="stable", ignore_index=True)
+
+    target = partition_dir(year, quarter, questionnaire_num, root)
+    target.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(target / "part-0.parquet", index=False, row_group_size=ROW_GROUP_ROWS)
+
+    return {
+        "year": year,
+        "quarter": quarter,
+        "questionnaire": f"coe{questionnaire_num}",
+        "rows": len(df),
+        "columns": len(df.columns),
+        "source": str(source_path),
+        "source_size": Path(source_path).stat().st_size,
+        "source_sha256": file_sha256(source_path),
+    }
+
+def read_store(path, columns):
+    """
+    Reads only the requested variables (lower case) that exist in a store file,
+    under their own names if the file has them under an alias (see enoe_reader.ALIASES).
+    """
+    mapping = resolve_columns(pq.read_schema(path).names, columns)
+    df = pd.read_parquet(path, columns=list(mapping.values()))
+    return df.rename(columns={physical: name for name, physical in mapping.items()})
+
+def iter_store(path, columns, chunksize):
+    """
+    Yields the requested variables of a store file in blocks of at most chunksize rows.
+    """
+    parquet = pq.ParquetFile(path)
+    mapping = resolve_columns(parquet.schema_arrow.names, columns)
+    names = {physical: name for name, physical in mapping.items()}
+    for batch in parquet.iter_batches(batch_size=chunksize, columns=list(mapping.values())):
+        chunk = batch.to_pandas().rename(columns=names)
+        yield chunk.astype({name: DTYPES[name] for name in chunk.columns if name in DTYPES})
+
+def questionnaire_columns(path, columns):
+    """
+    The requested variables (lower case) that a store file or CSV actually has, without reading any rows.
+    """
+    if str(path).endswith(".parquet"):
+        return list(resolve_columns(pq.read_schema(path).names, columns))
+    return list(resolve_columns(read_header(path), columns))
+
+def load_questionnaire(path, columns, engine="c"):
+    """
+    Reads a questionnaire from the store if path is a Parquet file, from the CSV otherwise
+    (on disk or, as a zipfile.Path, inside the downloaded archive).
+    """
+    if str(path).endswith(".parquet"):
+        return read_store(path, columns)
+    return read_questionnaire(path, columns, engine=engine)
+
+def stream_questionnaire(path, columns, chunksize):
+    """
+    Chunked counterpart of load_questionnaire.
+    """
+    if str(path).endswith(".parquet"):
+        return iter_store(path, columns, chunksize)
+    return iter_questionnaire(path, columns, chunksize)
+
+def run(years, quarters, force=False, root=STORE_ROOT):
+    # Imported here so the store can be read without the download dependencies
+    from enoe_download import find_questionnaire_csv
+
+    metadata = load_metadata(root)
+    for year in years:
+        for quarter in quarters:
+            for questionnaire_num in (1, 2):
+                key = f"{year}t{quarter}/coe{questionnaire_num}"
+                if quarter_path(year, quarter, questionnaire_num, root) and key in metadata and not force:
+                    print(f"{key} is already in the store")
+                    continue
+                source = find_questionnaire_csv(year, quarter, questionnaire_num)
+                if source is None:
+                    print(f"No CSV found for {key}, skipping")
+                    continue
+                print(f"Converting {source}")
+                metadata[key] = convert_questionnaire(year, quarter, questionnaire_num, source, root)
+                save_metadata(metadata, root)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert extracted ENOE CSVs into the Parquet store")
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2017, 2023)))
+    parser.add_argument("--quarters", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--force", action="store_true", help="convert again even if already in the store")
+    args = parser.parse_args()
+    run(args.years, args.quarters, force=args.force)
@@ -0,0 +1,97 @@
+# Survey-weighted state estimates for ENOE with replicate standard errors.
+# Weights are the expansion factors (FAC); replicates resample or delete primary
+# sampling units (UPM) within each state, which acts as the stratum.
+import numpy as np
+import pandas as pd
+
+STATES = 32
+
+def merge_psu_sums(a, b):
+    """
+    Adds two tables of per-PSU sums (e.g. from two chunks of the same quarter).
+    """
+    return pd.concat([a, b]).groupby(level=["state", "upm"]).sum()
+
+def _jackknife_se(Y, W, Sy, Sw, psu_state):
+    """
+    Delete-one-PSU jackknife within states, in closed form: deleting PSU i of state h
+    only changes state h, to (Y_h - y_i) / (W_h - w_i) for the mean and
+    n_h/(n_h-1) * (Y_h - y_i) for the total.
+    """
+    n = np.bincount(psu_state, minlength=STATES)[psu_state].astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_i = (Y[psu_state] - Sy) / (W[psu_state] - Sw)
+        total_i = n / (n - 1) * (Y[psu_state] - Sy)
+        factor = np.where(n > 1, (n - 1) / n, 0.0)
+        dev_mean = np.nan_to_num(mean_i - (Y / W)[psu_state])
+        dev_total = np.nan_to_num(total_i - Y[psu_state])
+    var_mean = np.bincount(psu_state, factor * dev_mean ** 2, minlength=STATES)
+    var_total = np.bincount(psu_state, factor * dev_total ** 2, minlength=STATES)
+    return np.sqrt(var_mean), np.sqrt(var_total)
+
+def bootstrap_multipliers(psu_state, replicates, rng):
+    """
+    Rao-Wu rescaling bootstrap: in each state with n_h PSUs, draw n_h - 1 PSUs with
+    replacement and scale their weights by n_h / (n_h - 1) times the times drawn.
+    Returns a (replicates x PSU) matrix of weight multipliers.
+    """
+    multipliers = np.ones((replicates, len(psu_state)))
+    for h in range(STATES):
+        members = np.flatnonzero(psu_state == h)
+        n = len(members)
+        if n < 2:
+            continue
+        draws = rng.multinomial(n - 1, np.full(n, 1 / n), size=replicates)
+        multipliers[:, members] = draws * n / (n - 1)
+    return multipliers
+
+def _bootstrap_se(Sy, Sw, psu_state, multipliers):
+    """
+    Replicate state sums for all replicates at once: (replicates x PSU) @ (PSU x state).
+    """
+    assign = np.zeros((len(psu_state), STATES))
+    assign[np.arange(len(psu_state)), psu_state] = 1
+    Y_b = multipliers @ (assign * Sy[:, None])
+    W_b = multipliers @ (assign * Sw[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_b = Y_b / W_b
+    return np.nanstd(mean_b, axis=0, ddof=1), np.std(Y_b, axis=0, ddof=1)
+
+def estimates_from_psu_sums(psu, names, variance="jackknife", replicates=200, seed=None):
+    """
+    State means and totals, with replicate standard errors, from weighted sums per
+    primary sampling unit (enoe_aggregate.indicator_sums): a table indexed by
+    (state, upm), state being ent - 1, with the weighted sum {name}_wy and the sum of
+    weights {name}_w over the rows where each indicator is not blank.
+    variance: 'jackknife' (delete one UPM), 'bootstrap' (Rao-Wu over UPMs) or None
+    replicates: number of bootstrap replicates
+    seed: anything np.random.default_rng accepts, e.g. (year, quarter)
+    Returns one row per state (ent 1-32) with {name}_w, {name}_w_se,
+    {name}_total and {name}_total_se for each name.
+    """
+    psu_state = psu.index.get_level_values("state").to_numpy(dtype=np.int64)
+    multipliers = None
+    if variance == "bootstrap":
+        multipliers = bootstrap_multipliers(psu_state, replicates, np.random.default_rng(seed))
+
+    out = pd.DataFrame({"ent": np.arange(1, STATES + 1)})
+    for name in names:
+        Sy = psu[f"{name}_wy"].to_numpy(dtype=float)
+        Sw = psu[f"{name}_w"].to_numpy(dtype=float)
+        Y = np.bincount(psu_state, Sy, minlength=STATES)
+        W = np.bincount(psu_state, Sw, minlength=STATES)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[f"{name}_w"] = Y / W
+        out[f"{name}_total"] = Y
+
+        if variance == "jackknife":
+            se_mean, se_total = _jackknife_se(Y, W, Sy, Sw, psu_state)
+        elif variance == "bootstrap":
+            se_mean, se_total = _bootstrap_se(Sy, Sw, psu_state, multipliers)
+        else:
+            continue
+        out[f"{name}_w_se"] = se_mean
+        out[f"{name}_total_se"] = se_total
+
+    return out
@@ -0,0 +1,192 @@
+# Seeded synthetic ENOE quarters for offline benchmarks and checks.
+# Writes coe1/coe2 CSVs laid out like INEGI's extracted files, with the variables of
+# auxiliary/columns.csv, " " for missing answers (so p3o, p3p2 and p6b2 mix numbers
+# and blanks, as in the real files) and the header conventions of either survey:
+# 'enoe' (upper-case names, up to 2020 Q1) or 'enoen' (lower-case names and the
+# extra ENOE^N columns, from 2020 Q2). Same seed and rows give the same files.
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enoe_reader import load_columns, ENCODING
+from enoe_flows import load_origin_codes, UNLISTED_CODE
+from enoe_download import survey_variant
+
+SYNTHETIC_ROOT = Path("data/ENOE/synthetic")
+# Rows generated and written at a time, so 5M-row quarters never sit in memory whole
+BLOCK_ROWS = 250_000
+
+# Variables that only coe2 carries; everything else in columns.csv goes to coe1.
+# The person key, age, weight and UPM are in both, as in INEGI's files.
+COE2_ONLY = ["p6b2", "p6c"]
+SHARED = ["r_def", "cd_a", "ent", "con", "upm", "v_sel", "n_hog", "h_mud", "n_ent", "per",
+          "n_ren", "n_inf", "n_pro_viv", "eda", "fac"]
+
+# Header conventions per survey: case of the names and columns that come first
+LAYOUTS = {
+    "enoe": {"upper": True, "leading": ["loc", "mun", "est", "t_loc"]},
+    "enoen": {"upper": False, "leading": ["tipo", "mes_cal", "loc", "mun", "est", "t_loc"]},
+}
+
+# Share of missing answers in the questions that are not skipped by design
+BLANK_RATE = 0.02
+# Share of coe1 people without a coe2 record
+UNMATCHED_RATE = 0.01
+
+def quarter_files(year, quarter, root=SYNTHETIC_ROOT, layout=None):
+    """
+    Paths of the coe1 and coe2 CSVs of a synthetic quarter, named as INEGI's.
+    """
+    layout = layout or survey_variant(year, quarter)
+    quarter_dir = Path(root) / f"{year}t{quarter}"
+    return [quarter_dir / f"conjunto_de_datos_coe{n}_{layout}_{year}_{quarter}t.csv" for n in (1, 2)]
+
+def _answers(values, asked):
+    """
+    Nullable integer column that is missing wherever the question was not asked.
+    """
+    return pd.arrays.IntegerArray(np.asarray(values, dtype=np.int64), ~np.asarray(asked))
+
+def _with_blanks(values, rng, rate=BLANK_RATE):
+    return _answers(values, rng.random(len(values)) >= rate)
+
+def _dwellings(rng, n_dwellings, first_con):
+    """
+    Dwelling level variables: state, city, control number, selected dwelling, UPM.
+    Dwellings are sorted by state and grouped into UPMs of five.
+    """
+    con = first_con + np.arange(n_dwellings)
+    return pd.DataFrame({
+        "ent": np.sort(rng.integers(1, 33, n_dwellings)),
+        "cd_a": rng.integers(1, 100, n_dwellings),
+        "con": con,
+        "v_sel": rng.integers(1, 6, n_dwellings),
+        "n_hog": 1 + (rng.random(n_dwellings) < 0.05),
+        "h_mud": (rng.random(n_dwellings) < 0.03).astype(int),
+        "upm": (con - 1) // 5 + 1,
+        "n_pro_viv": rng.integers(1, 30, n_dwellings),
+        "fac": rng.integers(50, 2_000, n_dwellings),
+    })
+
+def _people(rng, dwellings, size, year, quarter, origin_codes):
+    """
+    One row per person 12 and older (size of them per dwelling), with the answers
+    of both questionnaires.
+    """
+    df = dwellings.loc[dwellings.index.repeat(size)].reset_index(drop=True)
+    n = len(df)
+    df["n_ren"] = df.groupby("con").cumcount() + 1
+    df["r_def"] = 0
+    df["n_ent"] = rng.integers(1, 6, n)
+    df["per"] = quarter * 100 + year % 100
+    df["n_inf"] = df["n_ren"]
+    df["eda"] = rng.integers(12, 98, n)
+
+    # Worked last week (1 yes, 2 no); the work questions are only asked to workers
+    p1 = rng.choice([1, 2], n, p=[0.6, 0.4])
+    works = p1 == 1
+    df["p1"] = _with_blanks(p1, rng)
+    for name in ["p1a1", "p1a2", "p1a3", "p1b", "p1c"]:
+        df[name] = _answers(rng.integers(1, 5, n), ~works)
+    for name in ["p2_1", "p2_2", "p2_3"]:
+        df[name] = _with_blanks(rng.integers(1, 3, n), rng)
+    df["p2a_mes"] = _answers(rng.integers(1, 13, n), ~works)
+    df["p2a_anio"] = _answers(rng.integers(2000, year + 1, n), ~works)
+    for i in range(1, 10):
+        df[f"p3m{i}"] = _answers(rng.integers(1, 3, n), works)
+
+    # Moved to keep this job (1 yes, 2 no) and, for movers, where from
+    moved = works & (rng.random(n) < 0.05)
+    df["p3o"] = _answers(np.where(moved, 1, 2), works)
+    states = np.arange(1, 33)
+    others = [c for c in origin_codes if c > 32 and c != UNLISTED_CODE]
+    origin = np.where(rng.random(n) < 0.9, rng.choice(states, n), rng.choice(others, n))
+    df["p3p1"] = _answers(np.where(origin <= 32, 1, 2), moved)
+    df["p3p2"] = _answers(origin, moved)
+    df["p3q"] = _answers(rng.integers(1, 13, n), works)
+    df["p3r"] = _answers(rng.integers(1, 8, n), works)
+    df["p4a"] = _answers(rng.integers(1100, 9400, n), works)
+    df["p4b"] = _answers(rng.integers(1, 4, n), works)
+
+    # Monthly income in pesos; 999998/999999 are INEGI's "not known"/"not answered" codes
+    income = np.round(rng.lognormal(8.8, 0.7, n)).astype(np.int64)
+    income = np.where(rng.random(n) < 0.03, rng.choice([999998, 999999], n), income)
+    df["p6b2"] = _answers(income, works & (rng.random(n) >= 0.1))
+    df["p6c"] = _answers(rng.integers(1, 8, n), works)
+    return df
+
+def _layout_frames(df, columns, layout, rng):
+    """
+    Splits the people into coe1 and coe2 tables with the header of the layout.
+    """
+    spec = LAYOUTS[layout]
+    n = len(df)
+    leading = pd.DataFrame({"loc": rng.integers(1, 5, n), "mun": rng.integers(1, 120, n),
+                            "est": rng.integers(10, 60, n), "t_loc": rng.integers(1, 5, n)})
+    if layout == "enoen":
+        leading.insert(0, "mes_cal", 3 * (df["per"].to_numpy() // 100 - 1) + rng.integers(1, 4, n))
+        leading.insert(0, "tipo", 1)
+    leading = leading[spec["leading"]]
+
+    coe1_columns = [c for c in columns if c not in COE2_ONLY]
+    coe2_columns = SHARED + [c for c in columns if c in COE2_ONLY]
+    unmatched = rng.random(n) < UNMATCHED_RATE
+    frames = [pd.concat([leading, df[coe1_columns]], axis=1),
+              pd.concat([leading, df[coe2_columns]], axis=1)[~unmatched]]
+    for frame in frames:
+        frame.columns = [c.upper() if spec["upper"] else c for c in frame.columns]
+    return frames
+
+def generate_quarter(year, quarter, rows, seed=0, root=SYNTHETIC_ROOT, layout=None,
+                     block_rows=BLOCK_ROWS):
+    """
+    Writes a synthetic coe1/coe2 pair for one quarter with about `rows` people.
+    layout: 'enoe' or 'enoen'; by default the one INEGI used for that quarter
+    Returns the (coe1, coe2) paths.
+    """
+    layout = layout or survey_variant(year, quarter)
+    columns = load_columns()
+    origin_codes = load_origin_codes()
+    paths = quarter_files(year, quarter, root, layout)
+    paths[0].parent.mkdir(parents=True, exist_ok=True)
+
+    # One child seed per block, so a block's content does not depend on the others
+    n_blocks = max(1, -(-rows // block_rows))
+    seeds = np.random.SeedSequence([seed, year, quarter]).spawn(n_blocks)
+    written = 0
+    first_con = 1
+    for i, block_seed in enumerate(seeds):
+        rng = np.random.default_rng(block_seed)
+        target = min(block_rows, rows - written)
+        # About 3.5 people per dwelling: just enough dwellings to reach the target,
+        # only the last one is cut short
+        size = rng.poisson(2.5, target // 2 + 1) + 1
+        size = size[:np.searchsorted(np.cumsum(size), target) + 1]
+        dwellings = _dwellings(rng, len(size), first_con)
+        first_con += len(dwellings)
+        people = _people(rng, dwellings, size, year, quarter, origin_codes).iloc[:target]
+        for path, frame in zip(paths, _layout_frames(people, columns, layout, rng)):
+            frame.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False,
+                         na_rep=" ", encoding=ENCODING)
+        written += len(people)
+    return paths
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write seeded synthetic ENOE coe1/coe2 quarters")
+    parser.add_argument("--rows", type=int, default=100_000, help="people per quarter")
+    parser.add_argument("--years", type=int, nargs="+", default=[2019])
+    parser.add_argument("--quarters", type=int, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default=None,
+                        help="force a header layout instead of the one of each quarter")
+    parser.add_argument("--root", default=str(SYNTHETIC_ROOT))
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    for year in args.years:
+        for quarter in args.quarters:
+            paths = generate_quarter(year, quarter, args.rows, args.seed, args.root, args.layout)
+            print(f"{year} Q{quarter}: {', '.join(str(p) for p in paths)}")
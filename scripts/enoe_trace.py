@@ -0,0 +1,185 @@
+# Lightweight spans for the dataset build.
+# A span measures one stage (wall and CPU time, peak RSS growth, bytes read, rows in
+# and out) and appends one JSON line to the trace file. Tracing is off unless
+# configure() is called; a disabled span() returns a shared no-op object, so the
+# instrumented code pays one attribute check per stage.
+# The trace file is named in an environment variable, so worker processes started
+# by 02_create_dataset.py append to the same file as their parent.
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import psutil
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_ENV = "ENOE_TRACE"
+
+_path = os.environ.get(TRACE_ENV) or None
+_lock = threading.Lock()
+_local = threading.local()
+
+def configure(path):
+    """
+    Starts writing spans to path (JSON lines), truncating it. None turns tracing off.
+    """
+    global _path
+    if path is None:
+        _path = None
+        os.environ.pop(TRACE_ENV, None)
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("")
+    _path = str(path)
+    os.environ[TRACE_ENV] = _path
+
+def enabled():
+    return _path is not None
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _peak_rss():
+    """
+    Highest RSS of this process so far, in bytes (None where unavailable).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if psutil.MACOS else peak * 1024
+
+def _bytes_read(process):
+    try:
+        counters = process.io_counters()
+    except (AttributeError, psutil.Error):
+        return None
+    # read_chars counts every read() (page cache included); read_bytes only disk I/O
+    return getattr(counters, "read_chars", counters.read_bytes)
+
+class Span:
+    """
+    One traced stage. Keyword arguments (e.g. year, quarter) are recorded and
+    inherited by the spans opened inside it; set() adds fields to this span only,
+    e.g. rows_in, rows_out, or bytes_read to override the measured value.
+    """
+    def __init__(self, name, context):
+        self.name = name
+        self.context = context
+        self.fields = {}
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        if self.parent:
+            self.context = {**self.parent.context, **self.context}
+        stack.append(self)
+
+        self.process = psutil.Process()
+        self.rss_start = self.process.memory_info().rss
+        self.peak_start = _peak_rss()
+        self.read_start = _bytes_read(self.process)
+        self.start = time.time()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        rss_end = self.process.memory_info().rss
+        peak_end = _peak_rss()
+        read_end = _bytes_read(self.process)
+        _stack().pop()
+
+        # Exact when the span set a new process peak, otherwise a lower bound
+        peak = max(rss_end, peak_end if peak_end and peak_end > self.peak_start else 0)
+        record = {
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "start": self.start,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rss_peak_delta_mb": round((peak - self.rss_start) / 1024**2, 3),
+            "bytes_read": None if read_end is None else read_end - self.read_start,
+        }
+        record.update(self.context)
+        record.update(self.fields)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _write(record)
+        return False
+
+def span(name, **context):
+    """
+    Context manager timing one stage; a no-op when tracing is off.
+    """
+    if _path is None:
+        return _NULL_SPAN
+    return Span(name, context)
+
+def _write(record):
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        # Append mode: lines from several processes do not overwrite each other
+        with open(_path, "a") as f:
+            f.write(line)
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_chrome_trace(records, path):
+    """
+    Converts span records into a Chrome trace (chrome://tracing, Perfetto).
+    """
+    events = []
+    for r in records:
+        args = {k: v for k, v in r.items() if k not in ("name", "pid", "tid", "start", "wall_s")}
+        events.append({"name": r["name"], "ph": "X", "ts": r["start"] * 1e6, "dur": r["wall_s"] * 1e6,
+                       "pid": r["pid"], "tid": r["tid"], "args": args})
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def summarize(records):
+    """
+    Prints the total wall and CPU time and the largest peak RSS growth per stage.
+    """
+    totals = defaultdict(lambda: {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "rss_peak_delta_mb": 0.0})
+    for r in records:
+        t = totals[r["name"]]
+        t["count"] += 1
+        t["wall_s"] += r["wall_s"]
+        t["cpu_s"] += r["cpu_s"]
+        t["rss_peak_delta_mb"] = max(t["rss_peak_delta_mb"], r["rss_peak_delta_mb"])
+    print(f"{'stage':<22}{'spans':>6}{'wall s':>10}{'cpu s':>10}{'peak MB':>10}")
+    for name, t in sorted(totals.items(), key=lambda item: -item[1]["wall_s"]):
+        print(f"{name:<22}{t['count']:>6}{t['wall_s']:>10.2f}{t['cpu_s']:>10.2f}{t['rss_peak_delta_mb']:>10.1f}")
@@ -0,0 +1,122 @@
+# Animated per-quarter choropleth of the state-quarter panel (legal status or
+# migration rate), from the offline polygons of state_geometry.py.
+# The states are drawn once as a single PatchCollection; a frame only sets the
+# collection's values (face colors) and the title, so no polygon is rebuilt per
+# quarter. Frames are split into contiguous chunks rendered by worker processes,
+# each with its own copy of the figure, and assembled into a GIF in quarter order.
+#
+#   python scripts/map_animation.py --variable migr --processes 4
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from state_geometry import GEOMETRY_PATH, load_geometry, state_paths
+
+PANEL_PATH = Path("data/ENOE/final/lgbt_migration.csv")
+# Column of the panel: legend label, colormap and fixed color limits (None: data range)
+VARIABLES = {
+    "equal_marriage": {"label": "Equal marriage (1 = legal)", "cmap": "RdYlGn", "limits": (0, 1)},
+    "migr": {"label": "Share of recent migrants", "cmap": "viridis", "limits": None},
+    "from_equal": {"label": "Arrivals from equal marriage states", "cmap": "viridis", "limits": None},
+    "from_non_equal": {"label": "Arrivals from other states", "cmap": "viridis", "limits": None},
+}
+FPS = 4
+FIGSIZE = (10, 7)
+
+def load_frames(variable, panel_path=PANEL_PATH):
+    """
+    The variable as a (quarter x 32) array, states in cve order (NaN if missing),
+    and the list of (year, quarter) of its rows.
+    """
+    df = pd.read_csv(panel_path)
+    wide = df.pivot_table(index=["year", "quarter"], columns="ent", values=variable, aggfunc="first")
+    wide = wide.reindex(columns=range(1, 33))
+    return wide.to_numpy(dtype=float), list(wide.index)
+
+# Per-process figure, built once by _init_worker and reused for every frame
+_figure = None
+
+def _init_worker(variable, limits, detail, geometry_path, dpi):
+    global _figure
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import PathPatch
+
+    gdf = load_geometry(detail, geometry_path)
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+    cmap = plt.get_cmap(VARIABLES[variable]["cmap"]).copy()
+    cmap.set_bad("lightgrey")
+    states = PatchCollection([PathPatch(path) for path in state_paths(gdf)], cmap=cmap,
+                             edgecolor="black", linewidth=0.4)
+    states.set_clim(*limits)
+    ax.add_collection(states)
+    xmin, ymin, xmax, ymax = gdf.total_bounds
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    ax.set_aspect("equal")
+    ax.set_axis_off()
+    fig.colorbar(states, ax=ax, orientation="horizontal", fraction=0.04, pad=0.02,
+                 label=VARIABLES[variable]["label"])
+    title = ax.set_title("", fontsize=14)
+    _figure = {"fig": fig, "states": states, "title": title, "cve": gdf["cve"].to_numpy(), "dpi": dpi}
+
+def _render_frames(frames):
+    """
+    Saves (path, (year, quarter), values by cve) frames with the worker's figure.
+    """
+    for path, (year, quarter), values in frames:
+        _figure["states"].set_array(np.ma.masked_invalid(values[_figure["cve"] - 1]))
+        _figure["title"].set_text(f"{year} Q{quarter}")
+        _figure["fig"].savefig(path, dpi=_figure["dpi"])
+    return [path for path, _, _ in frames]
+
+def animate(variable="equal_marriage", output=None, detail="low", processes=1, fps=FPS, dpi=100,
+            panel_path=PANEL_PATH, geometry_path=GEOMETRY_PATH):
+    """
+    Renders one frame per quarter of the panel and writes them as a GIF to output
+    (default img/map_{variable}.gif).
+    """
+    from PIL import Image
+
+    output = Path(output or f"img/map_{variable}.gif")
+    values, periods = load_frames(variable, panel_path)
+    limits = VARIABLES[variable]["limits"] or (np.nanmin(values), np.nanmax(values))
+    init_args = (variable, limits, detail, geometry_path, dpi)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        frames = [(str(Path(tmp) / f"frame_{i:04d}.png"), period, values[i]) for i, period in enumerate(periods)]
+        if processes <= 1:
+            _init_worker(*init_args)
+            paths = _render_frames(frames)
+        else:
+            chunks = [list(chunk) for chunk in np.array_split(np.arange(len(frames)), processes) if len(chunk)]
+            with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker, initargs=init_args) as pool:
+                paths = [p for chunk in pool.map(_render_frames, [[frames[i] for i in c] for c in chunks])
+                         for p in chunk]
+
+        images = [Image.open(path) for path in paths]
+        output.parent.mkdir(parents=True, exist_ok=True)
+        images[0].save(output, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0)
+    print(f"Wrote {len(paths)} frames to {output}")
+    return output
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Animated per-quarter state map of the migration panel")
+    parser.add_argument("--variable", choices=sorted(VARIABLES), default="equal_marriage")
+    parser.add_argument("--detail", choices=["full", "medium", "low"], default="low",
+                        help="level of detail of the cached polygons")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes rendering frames")
+    parser.add_argument("--fps", type=float, default=FPS)
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--output", default=None, help="GIF path (default img/map_{variable}.gif)")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    animate(args.variable, args.output, args.detail, args.processes, args.fps, args.dpi)
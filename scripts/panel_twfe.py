@@ -0,0 +1,227 @@
+# Two-way fixed effects and event-study regressions on the state-quarter panel
+# (data/ENOE/final/lgbt_migration.csv), without the round trip through R/lfe.
+# State and time fixed effects are absorbed by alternating projections: every
+# variable is demeaned by state, then by quarter, until it stops changing. Demeaned
+# columns are cached in a DemeanedPanel, so a batch of specifications demeans each
+# outcome, control and event-time dummy once and every fit is a small least squares
+# problem. Standard errors are clustered by state.
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from policy_calendar import load_calendar, period_code
+
+PANEL_PATH = Path("data/ENOE/final/lgbt_migration.csv")
+RESULTS_PATH = Path("tables/twfe_results.csv")
+
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 1_000
+# Event-time window in quarters; the ends bin everything further out
+WINDOW = (-8, 8)
+REFERENCE = -1
+
+def load_panel(path=PANEL_PATH, calendar=None):
+    """
+    The state-quarter panel with the columns the models need: period, total
+    migration (arrivals from any state), adoption quarter and cohort, event time
+    (quarters since adoption, NaN if never treated) and the post-adoption dummy.
+    calendar: policy_calendar.PolicyCalendar (default: load_calendar())
+    """
+    calendar = calendar or load_calendar()
+    df = pd.read_csv(path)
+    df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
+    df["period"] = period_code(df["year"], df["quarter"])
+    df["total_migration"] = df["from_equal"] + df["from_non_equal"]
+    df["adoption"] = calendar.adoption_period(df["ent"])
+    df["cohort"] = calendar.cohort[df["ent"].to_numpy() - 1]
+    df["event_time"] = calendar.event_time(df["ent"], df["year"], df["quarter"])
+    df["post"] = (df["event_time"] >= 0).astype(float)
+    return df.sort_values(["ent", "period"], ignore_index=True)
+
+def _codes(values):
+    codes, levels = pd.factorize(values, sort=True)
+    return codes, len(levels)
+
+def demean(X, fixed_effects, tol=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Projects the columns of X off the fixed effects by alternating projections.
+    fixed_effects: list of (codes, n_levels), one per fixed effect
+    With a balanced panel one sweep is exact; unbalanced panels take a few more.
+    """
+    X = np.array(X, dtype=float)
+    for _ in range(max_iterations):
+        change = 0.0
+        for codes, n_levels in fixed_effects:
+            counts = np.bincount(codes, minlength=n_levels)
+            means = np.column_stack([np.bincount(codes, X[:, j], minlength=n_levels) for j in range(X.shape[1])])
+            means /= counts[:, None]
+            X -= means[codes]
+            change = max(change, np.abs(means).max(initial=0.0))
+        if change < tol:
+            return X
+    print(f"Warning: demeaning did not converge in {max_iterations} iterations (last change {change:.2e})")
+    return X
+
+def event_dummies(event_time, window=WINDOW, reference=REFERENCE):
+    """
+    One 0/1 column per event time in the window except the reference; times beyond
+    the window go to its end points. Never treated rows (NaN) are zero everywhere.
+    """
+    lo, hi = window
+    binned = np.clip(event_time, lo, hi)
+    columns = {}
+    for k in range(lo, hi + 1):
+        if k != reference:
+            columns[f"event_{k}"] = (binned == k).astype(float)
+    return pd.DataFrame(columns, index=event_time.index)
+
+class DemeanedPanel:
+    """
+    A panel with its fixed effects and a cache of demeaned columns.
+    fixed_effects: columns absorbed as fixed effects (default state and quarter)
+    cluster: column whose values define the clusters of the standard errors
+    """
+    def __init__(self, df, fixed_effects=("ent", "period"), cluster="ent"):
+        self.df = df.reset_index(drop=True)
+        self.fixed_effect_names = list(fixed_effects)
+        self.cluster_name = cluster
+        self.fixed_effects = [_codes(self.df[name]) for name in fixed_effects]
+        self.cluster, self.n_clusters = _codes(self.df[cluster])
+        self.n_absorbed = self._absorbed_dof()
+        self._cache = {}
+
+    def _absorbed_dof(self):
+        # Parameters absorbed by the fixed effects, one level of each but the first
+        # being redundant; as in fixest, effects nested in the clusters are not counted
+        dof = 1 - len(self.fixed_effects)
+        for name, (_, n_levels) in zip(self.fixed_effect_names, self.fixed_effects):
+            if self.df.groupby(name)[self.cluster_name].nunique().max() > 1:
+                dof += n_levels
+        return max(dof, 0)
+
+    def add(self, columns):
+        """
+        Adds extra columns (e.g. event-time dummies) so they can be used in fits.
+        """
+        for name, values in columns.items():
+            if name not in self.df:
+                self.df[name] = np.asarray(values, dtype=float)
+
+    def demeaned(self, names):
+        """
+        Demeaned columns as a (rows x len(names)) array; only uncached ones are computed.
+        """
+        missing = [name for name in names if name not in self._cache]
+        if missing:
+            X = demean(self.df[missing].to_numpy(dtype=float), self.fixed_effects)
+            for j, name in enumerate(missing):
+                self._cache[name] = X[:, j]
+        return np.column_stack([self._cache[name] for name in names])
+
+    def design(self, outcome, regressors):
+        """
+        Demeaned outcome and regressors on the rows where none of them is missing.
+        Returns (y, X, panel), panel being self or, if rows were dropped, a new
+        DemeanedPanel on the complete rows (its clusters and absorbed parameters
+        are the ones that apply to y and X).
+        """
+        names = [outcome] + list(regressors)
+        Z = self.demeaned(names)
+        keep = ~np.isnan(Z).any(axis=1)
+        if not keep.all():
+            # Missing values change the sample, so demean again on the complete rows
+            sub = DemeanedPanel(self.df[keep], self.fixed_effect_names, self.cluster_name)
+            return sub.design(outcome, regressors)
+        return Z[:, 0], Z[:, 1:], self
+
+    def small_sample_factor(self, n, k):
+        """
+        CR1 factor G/(G-1) (N-1)/(N-K), K counting the regressors and the absorbed parameters.
+        """
+        G = self.n_clusters
+        return G / (G - 1) * (n - 1) / (n - k - self.n_absorbed)
+
+    def fit(self, outcome, regressors):
+        """
+        OLS of the demeaned outcome on the demeaned regressors, standard errors
+        clustered with the CR1 small-sample factor (see small_sample_factor).
+        Rows with a missing value in any of the columns are dropped.
+        Returns a DataFrame indexed by regressor with coef, se, t and the 95% interval.
+        """
+        y, X, panel = self.design(outcome, regressors)
+        beta, *_ = np.linalg.lstsq(X, y, rcond=None)
+        resid = y - X @ beta
+
+        n, k = X.shape
+        bread = np.linalg.pinv(X.T @ X)
+        scores = np.zeros((panel.n_clusters, k))
+        np.add.at(scores, panel.cluster, X * resid[:, None])
+        vcov = panel.small_sample_factor(n, k) * bread @ (scores.T @ scores) @ bread
+        se = np.sqrt(np.diag(vcov))
+
+        out = pd.DataFrame({"coef": beta, "se": se}, index=list(regressors))
+        out["t"] = out["coef"] / out["se"]
+        out["ci_low"] = out["coef"] - 1.96 * out["se"]
+        out["ci_high"] = out["coef"] + 1.96 * out["se"]
+        out.attrs["nobs"] = n
+        return out
+
+def twfe(panel, outcome, treatment="post", controls=()):
+    """
+    Static two-way fixed effects DiD: outcome on the treatment dummy (and controls).
+    """
+    return panel.fit(outcome, [treatment] + list(controls))
+
+def event_study(panel, outcome, window=WINDOW, reference=REFERENCE, controls=()):
+    """
+    Leads and lags of equal marriage adoption relative to the quarter before it.
+    Returns one row per event time with coef, se and interval (the reference is 0).
+    """
+    dummies = event_dummies(panel.df["event_time"], window, reference)
+    panel.add(dummies)
+    result = panel.fit(outcome, list(dummies.columns) + list(controls))
+    result = result.loc[dummies.columns]
+    result.index = [int(name.split("_")[1]) for name in dummies.columns]
+    result.loc[reference] = 0.0
+    result.index.name = "event_time"
+    return result.sort_index()
+
+def run_batch(panel, outcomes, windows=(WINDOW,), controls=()):
+    """
+    Fits the static DiD and the event study of every outcome and window.
+    Returns one long table with a spec column.
+    """
+    tables = []
+    for outcome in outcomes:
+        start = time.perf_counter()
+        static = twfe(panel, outcome, controls=controls).rename_axis("term").reset_index()
+        static["spec"] = f"{outcome} ~ post"
+        tables.append(static)
+        for window in windows:
+            dynamic = event_study(panel, outcome, window, controls=controls).reset_index()
+            dynamic["term"] = "event_" + dynamic.pop("event_time").astype(str)
+            dynamic["spec"] = f"{outcome} ~ event[{window[0]},{window[1]}]"
+            tables.append(dynamic)
+        print(f"{outcome}: {1000 * (time.perf_counter() - start):.1f} ms for {1 + len(windows)} models")
+    return pd.concat(tables, ignore_index=True)[["spec", "term", "coef", "se", "t", "ci_low", "ci_high"]]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TWFE and event-study models on the state-quarter migration panel")
+    parser.add_argument("--outcomes", nargs="+", default=["total_migration", "from_equal", "from_non_equal", "migr"])
+    parser.add_argument("--controls", nargs="*", default=[])
+    parser.add_argument("--window", type=int, nargs=2, default=list(WINDOW), metavar=("LEAD", "LAG"),
+                        help="first and last event quarter (the ends are binned)")
+    parser.add_argument("--output", default=str(RESULTS_PATH))
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    panel = DemeanedPanel(load_panel())
+    results = run_batch(panel, args.outcomes, [tuple(args.window)], args.controls)
+    print(results[results["term"] == "post"].to_string(index=False))
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"Wrote {len(results)} coefficients to {args.output}")
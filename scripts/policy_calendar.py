@@ -0,0 +1,165 @@
+# The policy calendar shared by the dataset build, the plots and the models.
+# auxiliary/equal_marriage.csv (dates and adoption / civil union status) and
+# auxiliary/states.csv (names) are parsed once into dense (state x quarter) 0/1
+# matrices over a fixed quarter range, so "is policy p in force in state s in
+# quarter t" is an array lookup. The arrays are cached in
+# data/ENOE/final/policy_calendar.npz together with a hash of the two CSVs, and are
+# rebuilt when either file changes.
+# Quarters are period codes (year * 4 + quarter - 1). A state is treated from the
+# quarter of its marriage date on; states without a date are never treated. The CSV
+# records adoption and civil union as a status without a date, so their rows are
+# constant over the quarters.
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MARRIAGE_PATH = Path("auxiliary/equal_marriage.csv")
+STATES_PATH = Path("auxiliary/states.csv")
+CALENDAR_PATH = Path("data/ENOE/final/policy_calendar.npz")
+FIRST_YEAR = 2005
+LAST_YEAR = 2030
+STATES = 32
+# Policy: column of equal_marriage.csv
+POLICIES = {"marriage": "matrimonio", "adoption": "adopcion", "civil_union": "union_civil"}
+# Adoption period / cohort of states that never legalized
+NEVER = -1
+
+def period_code(year, quarter):
+    """
+    Consecutive integer per quarter, so adjacent quarters differ by one.
+    """
+    return np.asarray(year) * 4 + np.asarray(quarter) - 1
+
+def period_of(code):
+    """
+    (year, quarter) of a period code.
+    """
+    code = np.asarray(code)
+    return code // 4, code % 4 + 1
+
+def _source_hash(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+def read_policies(marriage_path=MARRIAGE_PATH, states_path=STATES_PATH):
+    """
+    One row per cve (1-32): state name, marriage date (NaT if none), the 0/1 status
+    of each policy and the adoption period (period code of the date, NEVER if none).
+    """
+    marriage = pd.read_csv(marriage_path, skipinitialspace=True).set_index("cve")
+    states = pd.read_csv(states_path, skipinitialspace=True).set_index("cve")
+    table = pd.DataFrame(index=pd.RangeIndex(1, STATES + 1, name="cve"))
+    table["state"] = states["state"].str.strip()
+    table["date"] = pd.to_datetime(marriage[["year", "month", "day"]].dropna().astype(int)).astype("datetime64[ns]")
+    for policy, column in POLICIES.items():
+        table[policy] = pd.to_numeric(marriage[column], errors="coerce").fillna(0).astype(np.int8)
+    dated = table["date"].notna()
+    table["adoption_period"] = NEVER
+    table.loc[dated, "adoption_period"] = period_code(table.loc[dated, "date"].dt.year,
+                                                      table.loc[dated, "date"].dt.quarter)
+    return table
+
+class PolicyCalendar:
+    """
+    Dense policy matrices over the quarters FIRST_YEAR Q1 - LAST_YEAR Q4.
+    Lookups outside the range use its first or last quarter.
+    table: as returned by read_policies
+    """
+    def __init__(self, table, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+        self.table = table
+        self.first = int(period_code(first_year, 1))
+        self.periods = np.arange(self.first, int(period_code(last_year, 4)) + 1)
+        self.adoption = table["adoption_period"].to_numpy(dtype=np.int64)
+
+        treated = self.adoption != NEVER
+        marriage = treated[:, None] & (self.adoption[:, None] <= self.periods[None, :])
+        self.matrices = {"marriage": marriage.astype(np.int8)}
+        for policy in POLICIES:
+            if policy != "marriage":
+                status = table[policy].to_numpy(dtype=np.int8)
+                self.matrices[policy] = np.repeat(status[:, None], len(self.periods), axis=1)
+
+        # Cohort: index of the adoption quarter among the distinct ones, NEVER if untreated
+        self.cohorts = np.unique(self.adoption[treated])
+        self.cohort = np.where(treated, np.searchsorted(self.cohorts, self.adoption), NEVER)
+
+    def _column(self, year, quarter):
+        return np.clip(period_code(year, quarter) - self.first, 0, len(self.periods) - 1)
+
+    def treated(self, cve, year, quarter, policy="marriage"):
+        """
+        0/1 status of policy in each (cve, year, quarter); arguments broadcast.
+        """
+        return self.matrices[policy][np.asarray(cve) - 1, self._column(year, quarter)]
+
+    def mask(self, year, quarter, policy="marriage"):
+        """
+        (32,) status of every state in one quarter, in cve order.
+        """
+        return self.matrices[policy][:, self._column(year, quarter)]
+
+    def matrix(self, periods, policy="marriage"):
+        """
+        (len(periods) x 32) status for a list of (year, quarter).
+        """
+        year, quarter = np.asarray(periods).reshape(-1, 2).T
+        return self.matrices[policy][:, self._column(year, quarter)].T
+
+    def adoption_period(self, cve):
+        """
+        Period code of the quarter each state legalized equal marriage, NaN if never.
+        """
+        adoption = self.adoption[np.asarray(cve) - 1]
+        return np.where(adoption == NEVER, np.nan, adoption.astype(float))
+
+    def event_time(self, cve, year, quarter):
+        """
+        Quarters since adoption (0 in the adoption quarter), NaN for never treated states.
+        """
+        return period_code(year, quarter) - self.adoption_period(cve)
+
+    def save(self, path, source_hash):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, so processes loading the calendar at the same
+        # time never read a partial file
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.npz")
+        np.savez_compressed(
+            tmp,
+            source_hash=source_hash,
+            first_year=period_of(self.first)[0],
+            last_year=period_of(self.periods[-1])[0],
+            state=self.table["state"].to_numpy(dtype=str),
+            date=self.table["date"].to_numpy(dtype="datetime64[D]"),
+            adoption_period=self.adoption,
+            **{policy: self.table[policy].to_numpy() for policy in POLICIES},
+        )
+        os.replace(tmp, path)
+
+def load_calendar(path=CALENDAR_PATH, marriage_path=MARRIAGE_PATH, states_path=STATES_PATH):
+    """
+    The PolicyCalendar of the auxiliary CSVs, from the cache if it is up to date.
+    """
+    source_hash = _source_hash([marriage_path, states_path])
+    if Path(path).exists():
+        with np.load(path) as data:
+            if str(data["source_hash"]) == source_hash:
+                table = pd.DataFrame({"state": data["state"], "date": pd.to_datetime(data["date"]).astype("datetime64[ns]"),
+                                      **{policy: data[policy] for policy in POLICIES},
+                                      "adoption_period": data["adoption_period"]},
+                                     index=pd.RangeIndex(1, STATES + 1, name="cve"))
+                return PolicyCalendar(table, int(data["first_year"]), int(data["last_year"]))
+    calendar = PolicyCalendar(read_policies(marriage_path, states_path))
+    calendar.save(path, source_hash)
+    return calendar
+
+if __name__ == '__main__':
+    calendar = load_calendar()
+    table = calendar.table.assign(cohort=calendar.cohort)
+    print(table.to_string())
+    print(f"{len(calendar.cohorts)} adoption cohorts over {len(calendar.periods)} quarters, cached in {CALENDAR_PATH}")
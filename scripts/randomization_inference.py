@@ -0,0 +1,182 @@
+# Randomization inference for the equal marriage DiD: the placebo distribution of the
+# coefficient comes from reassigning the adoption quarters of the policy calendar
+# (policy_calendar.py) across the 32 states and re-estimating.
+# Nothing goes back through create_dataset. A permuted calendar changes only the
+# treatment mask, and the columns that depend on it are linear in the quarterly OD
+# counts of od_flows.npz (written by 02_create_dataset.py):
+#   equal_marriage[p, t, d] = adoption[perm_p[d]] <= quarter t
+#   from_equal[p, t, d]     = sum_o od[t, d, o] * equal_marriage[p, t, o]
+# so a batch of permutations is one einsum over the (quarter x destination x origin)
+# tensor. The tensor is balanced (every state every quarter), so the state and quarter
+# effects are removed exactly by subtracting row and column means, and the DiD
+# coefficient of each permutation is a ratio of sums.
+# migr (the share of respondents who moved for their job) is not in the tensor: its
+# denominator, the respondents asked p3o, is only in the panel. It does not depend on
+# the calendar either, so it is read once from lgbt_migration.csv as a fixed
+# (quarter x state) outcome and only its regressor is permuted.
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enoe_flows import STATES, TENSOR_PATH, load_tensor, flows_from_equal
+from policy_calendar import load_calendar, period_code
+
+PANEL_PATH = Path("data/ENOE/final/lgbt_migration.csv")
+RESULTS_PATH = Path("tables/randomization_inference.csv")
+# Outcomes computed from the OD tensor under each calendar, and outcomes of the
+# panel that no calendar changes
+TENSOR_OUTCOMES = ["from_equal", "from_non_equal", "total_migration"]
+PANEL_OUTCOMES = ["migr"]
+OUTCOMES = TENSOR_OUTCOMES + PANEL_OUTCOMES
+PERMUTATIONS = 10_000
+BATCH = 500
+
+def permuted_adoption(adoption, permutations, rng):
+    """
+    (permutations x 32) adoption quarters, each row a shuffle of adoption across states.
+    """
+    order = rng.random((permutations, len(adoption))).argsort(axis=1)
+    return adoption[order]
+
+def calendars(adoption, periods):
+    """
+    (permutations x quarter x state) 0/1 treatment masks of a (permutations x 32)
+    matrix of adoption period codes (NaN: never treated).
+    """
+    current = period_code(*np.asarray(periods).reshape(-1, 2).T)
+    with np.errstate(invalid="ignore"):
+        return (adoption[:, None, :] <= current[None, :, None]).astype(np.int64)
+
+def panel_outcomes(panel, periods, names=PANEL_OUTCOMES):
+    """
+    {outcome: (quarter x 32)} matrices of panel columns, in the order of periods.
+    panel: DataFrame with ent, year, quarter and the columns in names
+    """
+    index = pd.MultiIndex.from_tuples([tuple(p) for p in periods], names=["year", "quarter"])
+    out = {}
+    for name in names:
+        table = panel.pivot_table(index=["year", "quarter"], columns="ent", values=name, aggfunc="first")
+        table = table.reindex(index=index, columns=np.arange(1, STATES + 1))
+        if table.isna().any().any():
+            raise ValueError(f"{name} is missing for some state-quarters of the tensor; the panel must be balanced")
+        out[name] = table.to_numpy(dtype=float)
+    return out
+
+def outcomes(counts, mask, fixed=None):
+    """
+    The migration columns of lgbt_migration.csv under each treatment mask.
+    counts: (quarter x 32 x origins) OD tensor; mask: (permutations x quarter x 32)
+    fixed: {outcome: (quarter x 32)} outcomes that do not depend on the mask
+    Returns {outcome: (permutations x quarter x 32)}.
+    """
+    from_equal, from_non_equal = flows_from_equal(counts[None], mask)
+    fixed = {name: np.broadcast_to(values, mask.shape) for name, values in (fixed or {}).items()}
+    return {"from_equal": from_equal, "from_non_equal": from_non_equal,
+            "total_migration": from_equal + from_non_equal, **fixed}
+
+def _within(Z):
+    """
+    Two-way (quarter and state) demeaning of a balanced (..., quarter, state) array.
+    """
+    Z = Z.astype(float)
+    return (Z - Z.mean(axis=-1, keepdims=True) - Z.mean(axis=-2, keepdims=True)
+            + Z.mean(axis=(-2, -1), keepdims=True))
+
+def did_coefficients(counts, mask, names=TENSOR_OUTCOMES, fixed=None):
+    """
+    TWFE coefficient of equal_marriage for every outcome and permutation.
+    Returns {outcome: (permutations,)}; NaN for calendars without variation.
+    """
+    x = _within(mask)
+    sxx = (x ** 2).sum(axis=(-2, -1))
+    ys = outcomes(counts, mask, fixed)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {name: (x * _within(ys[name])).sum(axis=(-2, -1)) / sxx for name in names}
+
+def _run_batch(args):
+    counts, periods, adoption, permutations, seed, names, fixed = args
+    rng = np.random.default_rng(seed)
+    return did_coefficients(counts, calendars(permuted_adoption(adoption, permutations, rng), periods),
+                            names, fixed)
+
+def permutation_distribution(counts, periods, adoption, permutations=PERMUTATIONS, names=TENSOR_OUTCOMES,
+                             batch=BATCH, processes=1, seed=0, fixed=None):
+    """
+    Placebo coefficients of permutations random calendars, computed in batches of
+    `batch` permutations (in a process pool if processes > 1). Every batch has its
+    own seed, so the draws do not depend on processes.
+    Returns {outcome: (permutations,)}.
+    """
+    sizes = [min(batch, permutations - start) for start in range(0, permutations, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(counts, periods, adoption, size, s, names, fixed) for size, s in zip(sizes, seeds)]
+    if processes <= 1:
+        results = [_run_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_run_batch, tasks))
+    return {name: np.concatenate([r[name] for r in results]) for name in names}
+
+def randomization_inference(counts, periods, calendar, permutations=PERMUTATIONS, names=TENSOR_OUTCOMES,
+                            batch=BATCH, processes=1, seed=0, fixed=None):
+    """
+    Observed DiD coefficients and their randomization p-values.
+    calendar: policy_calendar.PolicyCalendar
+    fixed: panel_outcomes of the PANEL_OUTCOMES in names
+    Returns (table, distribution): one row per outcome with coef, p_value (two-sided,
+    the observed calendar counted among the permutations) and the placebo quantiles;
+    distribution is {outcome: placebo coefficients}.
+    """
+    adoption = calendar.adoption_period(np.arange(1, STATES + 1))
+    observed = did_coefficients(counts, calendar.matrix(periods)[None].astype(np.int64), names, fixed)
+    distribution = permutation_distribution(counts, periods, adoption, permutations, names, batch, processes,
+                                            seed, fixed)
+
+    rows = []
+    for name in names:
+        coef, placebo = observed[name][0], distribution[name]
+        placebo = placebo[~np.isnan(placebo)]
+        rows.append({
+            "outcome": name,
+            "coef": coef,
+            "p_value": (1 + np.sum(np.abs(placebo) >= abs(coef))) / (1 + len(placebo)),
+            "placebo_q025": np.quantile(placebo, 0.025),
+            "placebo_q975": np.quantile(placebo, 0.975),
+            "permutations": len(placebo),
+        })
+    return pd.DataFrame(rows), distribution
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Randomization inference permuting equal marriage adoption dates")
+    parser.add_argument("--tensor", default=TENSOR_PATH, help="OD tensor written by 02_create_dataset.py")
+    parser.add_argument("--panel", default=str(PANEL_PATH), help=f"panel with {', '.join(PANEL_OUTCOMES)}")
+    parser.add_argument("--outcomes", nargs="+", choices=OUTCOMES, default=OUTCOMES)
+    parser.add_argument("--permutations", type=int, default=PERMUTATIONS)
+    parser.add_argument("--batch", type=int, default=BATCH, help="permutations per vectorized batch")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes, one batch each")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=str(RESULTS_PATH))
+    parser.add_argument("--distribution", default=None,
+                        help="optional .npz to save the placebo coefficients in")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    counts, periods, destinations, _ = load_tensor(args.tensor)
+    if len(destinations) != STATES:
+        raise ValueError(f"{args.tensor} has {len(destinations)} destinations, expected {STATES}")
+    periods = [tuple(p) for p in periods]
+    fixed = panel_outcomes(pd.read_csv(args.panel), periods,
+                           [name for name in args.outcomes if name in PANEL_OUTCOMES])
+    table, distribution = randomization_inference(counts, periods, load_calendar(), args.permutations,
+                                                  args.outcomes, args.batch, args.processes, args.seed, fixed)
+    print(table.to_string(index=False))
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(args.output, index=False)
+    print(f"Wrote {len(table)} outcomes to {args.output}")
+    if args.distribution:
+        np.savez_compressed(args.distribution, **distribution)
+        print(f"Wrote the placebo coefficients to {args.distribution}")
@@ -0,0 +1,133 @@
+# Offline cache of the Mexican state polygons, keyed by cve (auxiliary/states.csv).
+# The GeoJSON used by the maps is downloaded once (or read from a local copy),
+# matched to cve by accent- and case-insensitive name, and stored with a few
+# pre-simplified levels of detail in data/geo/mexico_states.parquet. The maps read
+# the cache; only the first of them, on a checkout without it, builds it.
+# Simplification is per polygon, so shared borders can show hairline gaps at the
+# coarser levels; that is not visible at the figure sizes used here.
+import argparse
+import os
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enoe_index import file_lock
+
+GEOJSON_URL = "https://raw.githubusercontent.com/angelnmara/geojson/master/mexicoHigh.json"
+GEOMETRY_PATH = Path("data/geo/mexico_states.parquet")
+STATES_PATH = Path("auxiliary/states.csv")
+# Level of detail: simplification tolerance in degrees (0 keeps the source polygons)
+DETAIL = {"full": 0.0, "medium": 0.005, "low": 0.02}
+
+# Normalized names that differ from auxiliary/states.csv
+ALIASES = {
+    "distrito federal": 9,
+    "estado de mexico": 15,
+    "coahuila de zaragoza": 5,
+    "michoacan de ocampo": 16,
+    "morelos": 17,
+    "queretaro de arteaga": 22,
+    "veracruz de ignacio de la llave": 30,
+}
+
+def normalize_name(name):
+    """
+    Lower case, without accents or surrounding spaces: 'Querétaro ' -> 'queretaro'.
+    """
+    text = unicodedata.normalize("NFKD", str(name))
+    return "".join(c for c in text if not unicodedata.combining(c)).strip().lower()
+
+def state_codes(names, states_path=STATES_PATH):
+    """
+    cve of each state name (NaN if it cannot be matched).
+    """
+    states = pd.read_csv(states_path, skipinitialspace=True)
+    lookup = {normalize_name(name): cve for cve, name in zip(states["cve"], states["state"])}
+    lookup.update(ALIASES)
+    return pd.Series([lookup.get(normalize_name(name), np.nan) for name in names], dtype="Int64")
+
+def build_cache(source=GEOJSON_URL, path=GEOMETRY_PATH, name_column="name"):
+    """
+    Reads the state polygons from source (URL or file), keys them by cve and writes
+    one row per state and level of detail to path (GeoParquet).
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(source)
+    gdf["cve"] = state_codes(gdf[name_column])
+    unmatched = gdf.loc[gdf["cve"].isna(), name_column].tolist()
+    if unmatched:
+        raise ValueError(f"Cannot match these states to a cve: {unmatched}")
+    missing = sorted(set(range(1, 33)) - set(gdf["cve"]))
+    if missing:
+        raise ValueError(f"{source} has no polygon for cve {missing}")
+    # One (multi)polygon per state
+    gdf = gdf[["cve", "geometry"]].dissolve(by="cve").reset_index()
+    gdf["cve"] = gdf["cve"].astype(int)
+
+    levels = []
+    for detail, tolerance in DETAIL.items():
+        level = gdf.copy()
+        if tolerance:
+            level["geometry"] = level.geometry.simplify(tolerance, preserve_topology=True)
+        level["detail"] = detail
+        levels.append(level)
+    out = gpd.GeoDataFrame(pd.concat(levels, ignore_index=True), crs=gdf.crs)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    out[["cve", "detail", "geometry"]].to_parquet(tmp)
+    os.replace(tmp, path)
+    vertices = out.groupby("detail").geometry.apply(lambda g: int(g.count_coordinates().sum()))
+    print(f"Wrote {len(gdf)} states to {path} (vertices: {vertices.to_dict()})")
+    return out
+
+def load_geometry(detail="medium", path=GEOMETRY_PATH):
+    """
+    State polygons at one level of detail, one row per cve sorted by cve.
+    Builds the cache from GEOJSON_URL first if path does not exist.
+    """
+    import geopandas as gpd
+
+    if detail not in DETAIL:
+        raise ValueError(f"Unknown detail '{detail}', use one of {list(DETAIL)}")
+    if not Path(path).exists():
+        # The maps render in parallel; the first to get here builds it for all
+        with file_lock(Path(path).with_suffix(".lock")):
+            if not Path(path).exists():
+                print(f"{path} not found; building it from {GEOJSON_URL}")
+                build_cache(path=path)
+    gdf = gpd.read_parquet(path)
+    gdf = gdf[gdf["detail"] == detail].drop(columns="detail")
+    return gdf.sort_values("cve", ignore_index=True)
+
+def state_paths(gdf):
+    """
+    One matplotlib Path per row (holes included), for drawing the states as a
+    single collection.
+    """
+    from matplotlib.path import Path as MplPath
+
+    paths = []
+    for geometry in gdf.geometry:
+        polygons = getattr(geometry, "geoms", [geometry])
+        rings = [ring for polygon in polygons for ring in [polygon.exterior, *polygon.interiors]]
+        vertices = np.concatenate([np.asarray(ring.coords)[:, :2] for ring in rings])
+        codes = np.concatenate([[MplPath.MOVETO] + [MplPath.LINETO] * (len(ring.coords) - 2) + [MplPath.CLOSEPOLY]
+                                for ring in rings])
+        paths.append(MplPath(vertices, codes))
+    return paths
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cache the state polygons by cve with simplified levels of detail")
+    parser.add_argument("--source", default=GEOJSON_URL, help="GeoJSON URL or local file")
+    parser.add_argument("--name-column", default="name", help="column with the state names")
+    parser.add_argument("--output", default=str(GEOMETRY_PATH))
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    build_cache(args.source, args.output, args.name_column)
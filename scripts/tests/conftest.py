@@ -0,0 +1,29 @@
+# The scripts import each other as top-level modules and read auxiliary/ and data/
+# relative to the repository root, as when run with python scripts/<name>.py.
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPTS = Path(__file__).resolve().parents[1]
+ROOT = SCRIPTS.parent
+sys.path.insert(0, str(SCRIPTS))
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+@pytest.fixture(scope="session")
+def synthetic_quarter(tmp_path_factory):
+    """
+    (coe1, coe2) CSVs of a small seeded synthetic 2019 Q1 (ENOE layout, with blanks).
+    """
+    from enoe_synthetic import generate_quarter
+    root = tmp_path_factory.mktemp("synthetic")
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        return generate_quarter(2019, 1, 5_000, seed=1, root=root, layout="enoe")
+    finally:
+        os.chdir(cwd)
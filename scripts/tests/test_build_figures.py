@@ -0,0 +1,13 @@
+from build_figures import FIGURES, local_modules
+
+def test_helper_modules_are_hashed():
+    names = {name: [path.name for path in local_modules(figure["module"])] for name, figure in FIGURES.items()}
+    assert {"05_time_map.py", "policy_calendar.py", "state_geometry.py"} <= set(names["marriage_map"])
+    assert {"map_animation.py", "state_geometry.py"} <= set(names["marriage_animation"])
+    assert "policy_calendar.py" in names["timeline"]
+
+def test_transitive_imports(tmp_path):
+    (tmp_path / "a.py").write_text("import numpy\nfrom b import f\n")
+    (tmp_path / "b.py").write_text("import c\n")
+    (tmp_path / "c.py").write_text("")
+    assert [path.name for path in local_modules("a", tmp_path)] == ["a.py", "b.py", "c.py"]
@@ -0,0 +1,67 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import enoe_chunked
+from conftest import ROOT
+from enoe_index import DATA_ROOT
+from enoe_reader import ENCODING, read_header, resolve_columns
+from enoe_synthetic import generate_quarter
+from policy_calendar import load_calendar
+
+create = importlib.import_module("02_create_dataset")
+
+PERIODS = [(2019, 1), (2019, 2)]
+
+def fractional_values(path):
+    # Weights and incomes with all the bits of a float32: their products no longer
+    # add up exactly in float64, so a sum that depends on the order of the rows shows
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False, encoding=ENCODING)
+    for name, physical in resolve_columns(read_header(path), ["fac", "p6b2"]).items():
+        values = pd.to_numeric(raw[physical].str.strip(), errors="coerce") * 1.1 + 0.013
+        raw[physical] = values.map(lambda x: " " if np.isnan(x) else repr(x))
+    raw.to_csv(path, index=False, encoding=ENCODING)
+
+@pytest.fixture(scope="module")
+def builds(tmp_path_factory):
+    """
+    The results of build_quarters on two synthetic quarters already on disk, keyed by
+    the way they were built.
+    """
+    tmp = tmp_path_factory.mktemp("build")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ROOT)
+        columns = create.load_columns()
+        calendar = load_calendar(tmp / "policy_calendar.npz")
+        for i, (year, quarter) in enumerate(PERIODS):
+            for path in generate_quarter(year, quarter, 4_000, seed=i, root=tmp / DATA_ROOT, layout="enoe"):
+                fractional_values(path)
+        (tmp / "auxiliary").symlink_to(ROOT / "auxiliary")
+        mp.chdir(tmp)
+        # Several coe2 blocks per quarter in the chunked build
+        mp.setattr(enoe_chunked, "MIN_CHUNK_ROWS", 37)
+
+        def build(**kwargs):
+            options = {"memory_budget_mb": kwargs.pop("memory_budget_mb", None)}
+            results, failures = create.build_quarters(PERIODS, columns, calendar, options=options, **kwargs)
+            assert not failures
+            return results
+
+        return {
+            "serial": build(),
+            "pool": build(workers=2),
+            "pipeline": build(workers=2, fetch_workers=2, fetch_buffer=1),
+            "chunked": build(memory_budget_mb=1),
+        }
+
+@pytest.mark.parametrize("mode", ["pool", "pipeline", "chunked"])
+def test_build_modes_agree(builds, mode):
+    serial, other = builds["serial"], builds[mode]
+    assert sorted(other) == PERIODS
+    for period in PERIODS:
+        df, od, cube = serial[period]
+        pd.testing.assert_frame_equal(other[period][0], df, check_exact=True)
+        np.testing.assert_array_equal(other[period][1], od)
+        pd.testing.assert_frame_equal(other[period][2], cube, check_exact=True)
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from endiseg import join_covariates, state_covariates
+
+def test_state_covariates_weighted_and_unweighted():
+    df = pd.DataFrame({
+        "ent": pd.array([1, 1, 1, 2, 2, 40], dtype="Int8"),
+        "factor": [1.0, 3.0, 2.0, 1.0, 1.0, 9.0],
+        "p8_1": pd.array([1, 4, None, 5, 2, 1], dtype="Int8"),
+        "p8_5": pd.array([1, 2, 2, 1, None, 1], dtype="Int8"),
+    })
+    out = state_covariates(df)
+    assert out.loc[1, "percentage_lgbt"] == 1 / 4
+    assert out.loc[2, "percentage_lgbt"] == 1 / 2
+    assert (out.loc[1, "si"], out.loc[1, "no"]) == (1, 2)
+    assert out.loc[1, "ratio"] == 1 / 6
+    assert out.loc[1, "ratio_unweighted"] == 1 / 3
+    assert np.isnan(out.loc[3, "ratio"])
+
+    panel = pd.DataFrame({"ent": [2, 1, 3, 2]})
+    joined = join_covariates(panel, out)
+    assert joined["percentage_lgbt"].tolist()[:2] == [1 / 2, 1 / 4]
+    assert np.isnan(joined.loc[2, "percentage_lgbt"])
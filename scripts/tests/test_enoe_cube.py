@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from enoe_cube import cube_sums, label, load_cube, merge_cubes, query, rollup, save_cube
+from enoe_indicators import from_fixed_point
+from enoe_keys import PERSON_KEY, join_questionnaires
+from enoe_reader import read_questionnaire
+
+def test_rollup_matches_a_direct_groupby(synthetic_quarter, tmp_path):
+    df1 = read_questionnaire(synthetic_quarter[0], PERSON_KEY + ["eda", "p1", "fac"])
+    df, _ = join_questionnaires(df1, read_questionnaire(synthetic_quarter[1], PERSON_KEY + ["p6b2"]))
+    half = len(df) // 2
+    cube = from_fixed_point(merge_cubes(cube_sums(df.iloc[:half], ["p1", "p6b2"]),
+                                        cube_sums(df.iloc[half:], ["p1", "p6b2"])))
+    path = tmp_path / "enoe_cube.parquet"
+    save_cube([(2019, 1)], [cube], path)
+    table = rollup(load_cube(path), ["ent", "age_band"], {"employed": 1, "ent": [9, 15]})
+
+    # The same numbers straight from the microdata
+    d = df[df["ent"].between(1, 32)].copy()
+    d["age_band"] = pd.cut(d["eda"].astype(float), [15, 20, 25, 30, 45, 65, np.inf], right=False, labels=False)
+    d["age_band"] = d["age_band"].fillna(-1)
+    d = d[(d["p1"] == 1) & d["ent"].isin([9, 15])]
+    d["y"] = d["p6b2"].where(~d["p6b2"].isin([999998, 999999])).astype(float)
+    d["fac"] = d["fac"].astype(float)
+    d["wy"] = d["y"] * d["fac"]
+    d["w"] = d["fac"].where(d["y"].notna())
+    groups = d.groupby(["ent", "age_band"])
+    expected = pd.DataFrame({
+        "rows": groups.size(),
+        "fac": groups["fac"].sum(),
+        "p1": 1.0,
+        "p6b2": groups["y"].mean(),
+        "p6b2_w": groups["wy"].sum() / groups["w"].sum(),
+        "p6b2_total": groups["wy"].sum(),
+    })
+    assert len(table) == len(expected) > 1
+    for column in expected:
+        np.testing.assert_allclose(table[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-9, err_msg=column)
+    np.testing.assert_array_equal(table.index.to_frame().to_numpy(), expected.index.to_frame().to_numpy())
+
+    # Cached drill-down: the same table, computed once
+    assert query(["ent", "age_band"], {"employed": 1, "ent": [9, 15]}, path) is query(
+        ["ent", "age_band"], {"ent": [9, 15], "employed": [1]}, path)
+    pd.testing.assert_frame_equal(query(["ent", "age_band"], {"employed": 1, "ent": [9, 15]}, path), table)
+    assert label(table)["age_band"].isin(["unknown", "15-19", "20-24", "25-29", "30-44", "45-64", "65+"]).all()
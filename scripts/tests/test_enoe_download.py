@@ -0,0 +1,173 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+import requests
+
+import enoe_download
+from enoe_download import (ZIP_ROOT, download_and_get_path, download_quarter_paths, download_quarters,
+                           fetch_archive, load_manifest, part_path, record_archive, resolve_quarter,
+                           stream_download)
+
+@pytest.fixture
+def archive_server(synthetic_quarter, tmp_path, monkeypatch):
+    """
+    Runs in an empty data/ tree with fetch_archive replaced by one that zips the
+    synthetic quarter; returns the list of quarters fetched.
+    """
+    monkeypatch.chdir(tmp_path)
+    fetched = []
+    def fetch_archive(year, quarter, session=None, **kwargs):
+        fetched.append((year, quarter))
+        zip_path = ZIP_ROOT / f"{year}t{quarter}.zip"
+        zip_path.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(zip_path, "w") as z:
+            for path in synthetic_quarter:
+                z.write(path, f"conjunto_de_datos/{path.name}")
+            z.writestr("diccionario_de_datos/viv.csv", "x\n")
+        return {"quarter_key": f"{year}t{quarter}", "size": zip_path.stat().st_size}
+    monkeypatch.setattr(enoe_download, "fetch_archive", fetch_archive)
+    return fetched
+
+@pytest.mark.parametrize("extract", [True, False])
+def test_missing_quarter_is_fetched_once(archive_server, extract):
+    paths = download_quarter_paths(2019, 1, extract=extract)
+    assert archive_server == [(2019, 1)]
+    assert [p.name for p in paths] == [p.name for p in download_quarter_paths(2019, 1, extract=extract)]
+    assert "coe1" in paths[0].name and "coe2" in paths[1].name
+    assert download_and_get_path(2019, 1, 2, extract=extract).name == paths[1].name
+    assert archive_server == [(2019, 1)]
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+class FakeSession:
+    """
+    Answers each URL with its queued responses in turn (the last one repeats)
+    and records (url, headers) of every request.
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url, stream=False, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        queue = self.responses[url]
+        response = queue.pop(0) if len(queue) > 1 else queue[0]
+        if callable(response):
+            response = response(headers)
+        return response
+
+def zip_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("conjunto_de_datos/conjunto_de_datos_coe1_enoe_2019_1t.csv", "ent\n9\n")
+    return buffer.getvalue()
+
+@pytest.fixture
+def sleeps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sleeps = []
+    monkeypatch.setattr(enoe_download.time, "sleep", sleeps.append)
+    return sleeps
+
+def test_errors_are_retried_with_backoff(sleeps):
+    first, second = resolve_quarter(2019, 1)[1]
+    body = zip_bytes()
+    session = FakeSession({first: [FakeResponse(503), FakeResponse(503), FakeResponse(200, body)]})
+    entry = fetch_archive(2019, 1, session=session, retries=3, backoff=2)
+    assert sleeps == [2, 4]
+    assert [url for url, _ in session.requests] == [first] * 3
+    assert entry["url"] == first and entry["size"] == len(body)
+    assert entry["sha256"] == hashlib.sha256(body).hexdigest()
+    assert (ZIP_ROOT / "2019t1.zip").read_bytes() == body
+
+    session = FakeSession({first: [FakeResponse(503)]})
+    with pytest.raises(RuntimeError, match="2019 Q1"):
+        fetch_archive(2019, 1, session=session, retries=2, backoff=1)
+    assert sleeps[2:] == [1, 2]
+
+def test_404_falls_through_to_the_next_url(sleeps):
+    first, second = resolve_quarter(2019, 1)[1]
+    body = zip_bytes()
+    # A partial download left by another URL must not be resumed
+    part = part_path(ZIP_ROOT / "2019t1.zip")
+    part.parent.mkdir(parents=True)
+    part.write_bytes(b"stale")
+    session = FakeSession({first: [FakeResponse(404)], second: [FakeResponse(200, body)]})
+    entry = fetch_archive(2019, 1, session=session)
+    assert entry["url"] == second
+    assert session.requests == [(first, {"Range": "bytes=5-"}), (second, {})]
+    assert sleeps == []
+    assert (ZIP_ROOT / "2019t1.zip").read_bytes() == body and not part.exists()
+
+    session = FakeSession({first: [FakeResponse(404)], second: [FakeResponse(404)]})
+    with pytest.raises(RuntimeError, match="404"):
+        fetch_archive(2019, 1, session=session)
+    assert sleeps == []
+
+def test_resume_and_range_not_satisfiable(sleeps):
+    url = resolve_quarter(2019, 1)[1][0]
+    body = zip_bytes()
+    target = ZIP_ROOT / "2019t1.zip"
+    part = part_path(target)
+    part.parent.mkdir(parents=True)
+
+    part.write_bytes(body[:10])
+    stream_download(url, target, session=FakeSession({url: [FakeResponse(206, body[10:])]}))
+    assert target.read_bytes() == body
+
+    # The part file is the whole archive
+    part.write_bytes(body)
+    answer = FakeResponse(416, headers={"Content-Range": f"bytes */{len(body)}"})
+    stream_download(url, target, session=FakeSession({url: [answer]}))
+    assert target.read_bytes() == body and not part.exists()
+
+    # Longer than the archive, or the right size but not a zip: restart from zero
+    for stale in (body + b"x", b"x" * len(body)):
+        part.write_bytes(stale)
+        total = {"Content-Range": f"bytes */{len(body)}"}
+        session = FakeSession({url: [lambda headers: FakeResponse(416, headers=total) if headers
+                                     else FakeResponse(200, body)]})
+        stream_download(url, target, session=session)
+        assert session.requests == [(url, {"Range": f"bytes={len(stale)}-"}), (url, {})]
+        assert target.read_bytes() == body and not part.exists()
+
+def test_archives_in_the_manifest_are_skipped(sleeps, monkeypatch):
+    body = zip_bytes()
+    zip_path = ZIP_ROOT / "2019t1.zip"
+    zip_path.parent.mkdir(parents=True)
+    zip_path.write_bytes(body)
+    stat = zip_path.stat()
+    record_archive({"quarter_key": "2019t1", "size": stat.st_size, "mtime": stat.st_mtime})
+
+    session = FakeSession({url: [FakeResponse(200, body)] for url in resolve_quarter(2019, 2)[1]})
+    monkeypatch.setattr(enoe_download, "make_session", lambda workers: session)
+    assert download_quarters([(2019, 1), (2019, 2)], workers=2, extract=False) == {}
+    assert [url for url, _ in session.requests] == [resolve_quarter(2019, 2)[1][0]]
+    assert sorted(load_manifest()) == ["2019t1", "2019t2"]
+
+    # A changed archive no longer matches its entry and is downloaded again
+    zip_path.write_bytes(body + b"\0")
+    session.responses.update({url: [FakeResponse(200, body)] for url in resolve_quarter(2019, 1)[1]})
+    assert download_quarters([(2019, 1), (2019, 2)], workers=2, extract=False) == {}
+    assert [url for url, _ in session.requests][1:] == [resolve_quarter(2019, 1)[1][0]]
+    assert zip_path.read_bytes() == body
@@ -0,0 +1,65 @@
+import json
+import os
+
+import enoe_index
+from enoe_index import INDEX_FILE, build_index, index_key, is_current, lookup
+
+def extracted_quarter(root, year, quarter):
+    """
+    Empty coe1/coe2 CSVs nested the way INEGI's archives extract.
+    """
+    folder = root / f"{year}t{quarter}" / "conjunto_de_datos_coe1" / "conjunto_de_datos"
+    folder.mkdir(parents=True)
+    (folder / f"conjunto_de_datos_coe1_enoe_{year}_{quarter}t.csv").write_text("ent\n9\n")
+    folder = root / f"{year}t{quarter}" / "conjunto_de_datos_coe2" / "conjunto_de_datos"
+    folder.mkdir(parents=True)
+    (folder / f"CONJUNTO_DE_DATOS_COE2_ENOEN_{year}_{quarter}T.csv").write_text("ent\n9\n")
+
+def test_build_and_lookup(tmp_path):
+    extracted_quarter(tmp_path, 2019, 1)
+    extracted_quarter(tmp_path, 2021, 3)
+    (tmp_path / "notes").mkdir()
+
+    index = build_index(tmp_path)
+    assert sorted(index) == [index_key(2019, 1, 1), index_key(2019, 1, 2),
+                             index_key(2021, 3, 1), index_key(2021, 3, 2)]
+    assert index[index_key(2021, 3, 2)]["variant"] == "enoen"
+    with open(tmp_path / INDEX_FILE) as f:
+        assert json.load(f) == index
+
+    path = lookup(2019, 1, 2, root=tmp_path)
+    assert path.name == "CONJUNTO_DE_DATOS_COE2_ENOEN_2019_1T.csv"
+    assert lookup(2020, 2, 1, root=tmp_path) is None
+
+def test_changed_file_is_rescanned(tmp_path, monkeypatch):
+    extracted_quarter(tmp_path, 2019, 1)
+    build_index(tmp_path)
+    path = lookup(2019, 1, 1, root=tmp_path)
+    key = index_key(2019, 1, 1)
+
+    rescans = []
+    scan_quarter = enoe_index.scan_quarter
+    monkeypatch.setattr(enoe_index, "scan_quarter", lambda *args: rescans.append(args) or scan_quarter(*args))
+
+    # A current entry is a dict access and a stat()
+    assert lookup(2019, 1, 1, root=tmp_path) == path
+    assert rescans == []
+
+    path.write_text("ent\n9\n15\n")
+    assert not is_current(enoe_index.load_index(tmp_path)[key])
+    assert lookup(2019, 1, 1, root=tmp_path) == path
+    assert len(rescans) == 1
+    assert enoe_index.load_index(tmp_path)[key]["size"] == path.stat().st_size
+
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+    assert not is_current(enoe_index.load_index(tmp_path)[key])
+    assert lookup(2019, 1, 1, root=tmp_path) == path
+    assert len(rescans) == 2
+    assert is_current(enoe_index.load_index(tmp_path)[key])
+
+    # Moved within the quarter folder: found again by the rescan
+    moved = path.parent.parent / path.name
+    path.rename(moved)
+    assert lookup(2019, 1, 1, root=tmp_path) == moved
+    assert len(rescans) == 3
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from enoe_cube import cube_sums
+from enoe_indicators import fixed_point, from_fixed_point, indicator_values, measures
+
+def test_income_non_response_codes_are_blank():
+    df = pd.DataFrame({"p6b2": pd.array([5000, 999998, None, 999999, 12000], dtype="Int64"),
+                       "fac": [1.0, 2.0, 3.0, 4.0, 1.0]})
+    np.testing.assert_array_equal(indicator_values(df, "p6b2"), [5000, np.nan, np.nan, np.nan, 12000])
+    sums = measures(df, ["p6b2"], np.ones(len(df), dtype=bool)).sum()
+    assert (sums["p6b2_sum"], sums["p6b2_count"]) == (17000, 2)
+    assert (sums["p6b2_wy"], sums["p6b2_w"]) == (17000, 2)
+
+def test_cube_income_has_no_sentinels(synthetic_quarter):
+    from enoe_reader import read_questionnaire
+    df = read_questionnaire(synthetic_quarter[1], ["ent", "cd_a", "eda", "p1", "fac", "p6b2"])
+    assert df["p6b2"].isin([999998, 999999]).any()
+    cube = from_fixed_point(cube_sums(df, ["p6b2"]))
+    assert (cube["p6b2_sum"] / cube["p6b2_count"]).max() < 999998
+    assert cube["p6b2_count"].sum() == (df["p6b2"].notna() & ~df["p6b2"].isin([999998, 999999])
+                                        & df["ent"].between(1, 32)).sum()
+
+def test_fixed_point_sums_do_not_depend_on_blocks():
+    rng = np.random.default_rng(0)
+    values = pd.DataFrame({"rows": np.ones(10_000), "x_wy": rng.lognormal(8, 2, 10_000) * rng.random(10_000),
+                           "x_w": rng.random(10_000) * 1e3})
+    whole = from_fixed_point(fixed_point(values).sum().to_frame().T)
+    order = rng.permutation(len(values))
+    blocks = [fixed_point(values.iloc[order[i:i + 777]]).sum() for i in range(0, len(values), 777)]
+    blocked = from_fixed_point(sum(blocks).to_frame().T)
+    pd.testing.assert_frame_equal(blocked, whole, check_exact=True)
+    np.testing.assert_allclose(whole.iloc[0], values.sum(), rtol=1e-12)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from enoe_keys import KEY_BITS, PERSON_KEY, join_questionnaires, pack_key, unpack_key
+
+def random_keys(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({name: rng.integers(0, 1 << bits, n) for name, bits in KEY_BITS.items()})[PERSON_KEY]
+
+def test_pack_key_round_trip():
+    df = random_keys(10_000)
+    # The largest value of every component, next to the smallest
+    df.loc[0] = [(1 << KEY_BITS[name]) - 1 for name in PERSON_KEY]
+    df.loc[1] = 0
+    packed = pack_key(df)
+    assert packed.dtype == np.int64 and (packed >= 0).all()
+    pd.testing.assert_frame_equal(unpack_key(packed), df.astype(np.int64))
+
+def test_pack_key_is_injective_and_ordered():
+    df = random_keys(10_000).drop_duplicates(ignore_index=True)
+    packed = pack_key(df)
+    assert len(np.unique(packed)) == len(df)
+    # Sorting by the packed key sorts by the components, most significant first
+    order = np.argsort(packed, kind="stable")
+    pd.testing.assert_frame_equal(df.iloc[order].reset_index(drop=True),
+                                  df.sort_values(PERSON_KEY, kind="stable", ignore_index=True))
+
+@pytest.mark.parametrize("value", [-1, 1 << KEY_BITS["ent"], None])
+def test_pack_key_rejects_values_out_of_range(value):
+    df = random_keys(3).astype("Int64")
+    df.loc[1, "ent"] = value
+    with pytest.raises(ValueError):
+        pack_key(df)
+
+def test_join_questionnaires_on_packed_key():
+    keys = random_keys(1_000).drop_duplicates(ignore_index=True)
+    df1 = keys.assign(eda=np.arange(len(keys)))
+    df2 = keys.sample(frac=1, random_state=0).iloc[10:].assign(p3p2=lambda d: d["n_ren"] * 10)
+    df, diagnostics = join_questionnaires(df1, df2)
+    expected = df1.merge(df2, on=PERSON_KEY, how="left")
+    pd.testing.assert_series_equal(df["p3p2"], expected["p3p2"], check_dtype=False)
+    assert diagnostics["unmatched_coe1"] == 10
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from enoe_keys import PERSON_KEY, pack_key
+from enoe_panel import household_moves, link_visits
+from policy_calendar import period_code
+
+def person(con, n_ent, h_mud=0, n_ren=1):
+    return {"cd_a": 1, "ent": 9, "con": con, "v_sel": 1, "n_hog": 1, "h_mud": h_mud, "n_ren": n_ren, "n_ent": n_ent}
+
+def panel_index(quarters):
+    """
+    Index of link_visits from {(year, quarter): list of person rows}.
+    """
+    codes, keys, visits = [], [], []
+    for (year, quarter), rows in sorted(quarters.items()):
+        df = pd.DataFrame(rows)
+        codes.append(np.full(len(df), period_code(year, quarter), dtype=np.int32))
+        keys.append(pack_key(df[PERSON_KEY]))
+        visits.append(df["n_ent"].to_numpy(dtype=np.int8))
+    return {"period": np.concatenate(codes), "key": np.concatenate(keys), "visit": np.concatenate(visits)}
+
+def test_links_and_household_moves():
+    index = panel_index({
+        (2019, 4): [person(1, 2), person(2, 1), person(3, 3), person(3, 3, n_ren=2)],
+        (2020, 1): [
+            person(1, 3),                                     # next visit: linked
+            person(2, 3),                                     # same key, skipped a visit: not linked
+            person(3, 4, h_mud=1), person(3, 4, h_mud=1, n_ren=2),  # another household in dwelling 3
+            person(4, 1),
+        ],
+    })
+    panel_id = link_visits(index)
+    assert len(np.unique(panel_id[:4])) == 4
+    assert panel_id[4] == panel_id[0]
+    assert not np.isin(panel_id[5:], panel_id[:4]).any()
+    assert len(np.unique(panel_id)) == 8
+
+    moves = household_moves(index)
+    assert len(moves) == 1
+    move = moves.iloc[0]
+    assert (move["year"], move["quarter"], move["con"]) == (2020, 1, 3)
+    assert (move["h_mud_before"], move["h_mud_after"]) == (0, 1)
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from enoe_reader import load_columns, read_questionnaire, iter_questionnaire
+
+def test_engines_give_the_same_frames(synthetic_quarter):
+    columns = load_columns()
+    for path in synthetic_quarter:
+        c = read_questionnaire(path, columns, engine="c")
+        arrow = read_questionnaire(path, columns, engine="pyarrow")
+        # The synthetic files have blanks in integer columns (e.g. p1a1, p6b2)
+        assert c.isna().any().any()
+        pd.testing.assert_frame_equal(c, arrow)
+
+def test_chunks_add_up_to_the_whole_file(synthetic_quarter):
+    columns = load_columns()
+    path = synthetic_quarter[0]
+    chunks = pd.concat(iter_questionnaire(path, columns, 1_000), ignore_index=True)
+    pd.testing.assert_frame_equal(chunks, read_questionnaire(path, columns))
+
+def test_aliases_and_byte_order_mark(tmp_path):
+    path = tmp_path / "coe1.csv"
+    path.write_bytes(b"\xef\xbb\xbfENT,FAC_TRI,EDA\n9,120,30\n9,80, \n")
+    df = read_questionnaire(path, ["ent", "fac", "eda"])
+    assert list(df.columns) == ["ent", "fac", "eda"]
+    assert df["fac"].tolist() == [120, 80]
+    assert df["eda"].isna().tolist() == [False, True]
@@ -0,0 +1,56 @@
+from enoe_schema import KEY_VARIABLES, coverage, resolve, sniff, unbuildable
+
+def variant(path, target, bom=False, lower=False, rename=None):
+    """
+    Copy of a synthetic questionnaire with its header rewritten.
+    """
+    header, rest = path.read_bytes().split(b"\n", 1)
+    header = header.decode("latin-1")
+    for old, new in (rename or {}).items():
+        header = header.replace(f",{old},", f",{new},")
+    if lower:
+        header = header.lower()
+    target.write_bytes((b"\xef\xbb\xbf" if bom else b"") + header.encode("latin-1") + b"\n" + rest)
+    return target
+
+def test_sniff_upper_case_and_byte_order_mark(synthetic_quarter, tmp_path):
+    coe1 = synthetic_quarter[0]
+    plain = sniff(coe1)
+    assert plain["upper"] and not plain["bom"]
+    assert "ENT" in plain["columns"] and "P3P2" in plain["columns"]
+
+    marked = sniff(variant(coe1, tmp_path / "bom.csv", bom=True, rename={"FAC": "FAC_TRI"}))
+    assert marked["upper"] and marked["bom"]
+    # Types and blanks are keyed by the logical, lower-case names
+    assert list(marked["types"]) == [name.lower() if name != "FAC" else "fac_tri" for name in plain["columns"]]
+    assert marked["columns"][0] == "\xef\xbb\xbfLOC"
+    assert marked["types"]["fac_tri"] == "int" and marked["types"]["ent"] == "int"
+    assert "p3p2" in marked["blanks"] and "ent" not in marked["blanks"]
+    assert marked["sample_rows"] > 0
+
+    lower = sniff(variant(coe1, tmp_path / "lower.csv", lower=True))
+    assert not lower["upper"] and not lower["bom"]
+    assert lower["types"] == plain["types"]
+
+    schema = {"2019t1/coe1": marked}
+    # The physical names as written, BOM and alias included
+    assert resolve(schema, 2019, 1, 1, ["loc", "fac", "eda"]) == {"loc": "\xef\xbb\xbfLOC", "fac": "FAC_TRI", "eda": "EDA"}
+    assert resolve(schema, 2019, 2, 1, ["ent"]) is None
+
+def test_unbuildable_quarters(synthetic_quarter, tmp_path):
+    coe1, coe2 = synthetic_quarter
+    schema = {
+        # Complete
+        "2019t1/coe1": sniff(coe1), "2019t1/coe2": sniff(coe2),
+        # p3p2 in neither questionnaire
+        "2019t2/coe1": sniff(variant(coe1, tmp_path / "q2.csv", rename={"P3P2": "P3P2X"})), "2019t2/coe2": sniff(coe2),
+        # Only coe1 on disk: only the key is checked
+        "2019t3/coe1": sniff(variant(coe1, tmp_path / "q3.csv", rename={"P3P2": "P3P2X"})),
+        # Part of the key missing from coe2
+        "2019t4/coe1": sniff(coe1), "2019t4/coe2": sniff(variant(coe2, tmp_path / "q4.csv", rename={"N_REN": "NREN"})),
+    }
+    periods = [(2019, quarter) for quarter in range(1, 5)]
+    table = coverage(schema, periods, KEY_VARIABLES + ["eda", "p3p2", "fac"])
+    assert len(table) == 7
+    assert table.loc[(2019, 2, "coe1"), "p3p2"] != table.loc[(2019, 2, "coe1"), "p3p2"]
+    assert unbuildable(table) == {(2019, 2): ["p3p2"], (2019, 4): ["n_ren"]}
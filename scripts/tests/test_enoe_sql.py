@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from enoe_keys import PERSON_KEY, join_questionnaires
+from enoe_reader import ENCODING, read_header, read_questionnaire, resolve_columns
+from enoe_store import convert_questionnaire
+from enoe_synthetic import generate_quarter
+from enoe_sql import export, query
+
+COLUMNS = PERSON_KEY + ["fac", "eda", "p6b2"]
+SQL = ("SELECT year, quarter, ent, count(*) AS n, sum(fac) AS fac, sum(p6b2) AS p6b2 FROM enoe "
+       "WHERE ent IN (9, 15) AND eda >= 15 GROUP BY ALL ORDER BY ALL")
+
+def duplicate_keys(path, rows=50):
+    # The first rows again at the end, with another income: only the first must count
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False, encoding=ENCODING)
+    names = resolve_columns(read_header(path), ["ent", "p6b2"])
+    extra = raw[raw[names["ent"]].str.strip().isin(["9", "15"])].head(rows).assign(**{names["p6b2"]: "123456"})
+    pd.concat([raw, extra]).to_csv(path, index=False, encoding=ENCODING)
+
+@pytest.fixture
+def sources(tmp_path):
+    """
+    2019 Q1 in the store (with duplicated coe2 keys), 2019 Q2 only as extracted CSVs.
+    """
+    raw, store = tmp_path / "raw", tmp_path / "parquet"
+    files = {}
+    for quarter in (1, 2):
+        files[quarter] = generate_quarter(2019, quarter, 3_000, seed=quarter, root=raw, layout="enoe")
+    duplicate_keys(files[1][1])
+    for n, path in enumerate(files[1], start=1):
+        convert_questionnaire(2019, 1, n, path, store)
+        path.unlink()
+    return store, raw, files
+
+def expected(files, quarter, store):
+    if quarter == 1:
+        paths = [store / f"year=2019/quarter=1/questionnaire=coe{n}/part-0.parquet" for n in (1, 2)]
+        frames = [pd.read_parquet(path) for path in paths]
+        frames = [df[[name for name in COLUMNS if name in df]] for df in frames]
+    else:
+        frames = [read_questionnaire(path, COLUMNS) for path in files[quarter]]
+    df, _ = join_questionnaires(*frames)
+    df = df[df["ent"].isin([9, 15]) & (df["eda"] >= 15)]
+    out = df.groupby("ent").agg(n=("fac", "size"), fac=("fac", "sum"), p6b2=("p6b2", "sum")).reset_index()
+    return out.assign(year=2019, quarter=quarter)
+
+def test_query_matches_the_pandas_join(sources):
+    store, raw, files = sources
+    result = query(SQL, store, raw)
+    want = pd.concat([expected(files, quarter, store) for quarter in (1, 2)], ignore_index=True)
+    want = want[["year", "quarter", "ent", "n", "fac", "p6b2"]]
+    pd.testing.assert_frame_equal(result, want, check_dtype=False)
+    assert query("SELECT count(*) AS n FROM coe2 WHERE p6b2 = 123456", store, raw)["n"].iloc[0] >= 50
+
+def test_export(sources, tmp_path):
+    store, raw, _ = sources
+    for name in ("out.csv", "out.parquet"):
+        path = tmp_path / name
+        assert export(SQL, path, store, raw_root=raw) == len(query(SQL, store, raw))
+        written = pd.read_csv(path) if name.endswith(".csv") else pd.read_parquet(path)
+        pd.testing.assert_frame_equal(written, query(SQL, store, raw), check_dtype=False)
@@ -0,0 +1,35 @@
+import hashlib
+
+import pandas as pd
+
+from enoe_reader import DTYPES, load_columns, read_header, read_questionnaire
+from enoe_store import (convert_questionnaire, iter_store, load_metadata, quarter_path, read_store,
+                        save_metadata)
+
+def test_store_round_trip(synthetic_quarter, tmp_path):
+    columns = load_columns()
+    metadata = {}
+    for n, path in enumerate(synthetic_quarter, 1):
+        assert quarter_path(2019, 1, n, tmp_path) is None
+        entry = convert_questionnaire(2019, 1, n, path, tmp_path)
+        metadata[f"2019t1/coe{n}"] = entry
+
+        stored = quarter_path(2019, 1, n, tmp_path)
+        assert stored == tmp_path / "year=2019" / "quarter=1" / f"questionnaire=coe{n}" / "part-0.parquet"
+        # The store is sorted by state; otherwise the same values as the CSV
+        csv = read_questionnaire(path, columns).sort_values("ent", kind="stable", ignore_index=True)
+        df = read_store(stored, columns)
+        pd.testing.assert_frame_equal(df[csv.columns], csv, check_dtype=False)
+        # The declared types are kept; the other integer columns are narrowed
+        assert all(df[name].dtype == csv[name].dtype for name in df if name in DTYPES)
+        chunks = pd.concat(iter_store(stored, columns, 1_000), ignore_index=True)
+        pd.testing.assert_frame_equal(chunks, df, check_dtype=False)
+
+        assert entry["rows"] == len(csv)
+        assert entry["columns"] == len(read_header(path))
+        assert entry["source_size"] == path.stat().st_size
+        assert entry["source_sha256"] == hashlib.sha256(path.read_bytes()).hexdigest()
+
+    save_metadata(metadata, tmp_path)
+    assert load_metadata(tmp_path) == metadata
+    assert load_metadata(tmp_path / "missing") == {}
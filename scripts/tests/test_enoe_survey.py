@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from enoe_survey import STATES, estimates_from_psu_sums
+
+def synthetic_sample(seed=0):
+    """
+    Rows of a few states: several PSUs in state 1, one PSU in state 3 (no variance),
+    blanks in y, and a UPM code shared by states 1 and 2.
+    """
+    rng = np.random.default_rng(seed)
+    ent = np.repeat([1, 1, 1, 1, 2, 2, 2, 3], 25)
+    upm = np.repeat([10, 11, 12, 13, 10, 20, 21, 30], 25)
+    y = rng.normal(5, 2, len(ent))
+    y[rng.random(len(ent)) < 0.1] = np.nan
+    return pd.DataFrame({"ent": ent, "upm": upm, "fac": rng.integers(50, 2000, len(ent)).astype(float), "y": y})
+
+def weighted(df, factor):
+    valid = df["y"].notna()
+    w = df["fac"] * factor
+    total = (w * df["y"])[valid].sum()
+    return total / w[valid].sum(), total
+
+def test_jackknife_matches_deleting_each_psu():
+    df = synthetic_sample()
+    valid = df["y"].notna()
+    psu = pd.DataFrame({
+        "state": df["ent"] - 1,
+        "upm": df["upm"],
+        "y_wy": np.where(valid, df["fac"] * df["y"], 0.0),
+        "y_w": np.where(valid, df["fac"], 0.0),
+    }).groupby(["state", "upm"]).sum()
+    out = estimates_from_psu_sums(psu, ["y"], variance="jackknife").set_index("ent")
+
+    for ent, rows in df.groupby("ent"):
+        mean, total = weighted(rows, 1.0)
+        units = rows["upm"].unique()
+        n = len(units)
+        # Delete one PSU and reweight the rest of the state by n / (n - 1)
+        replicates = [weighted(rows[rows["upm"] != unit], n / (n - 1)) for unit in units] if n > 1 else []
+        se_mean = np.sqrt((n - 1) / n * sum((m - mean) ** 2 for m, _ in replicates))
+        se_total = np.sqrt((n - 1) / n * sum((t - total) ** 2 for _, t in replicates))
+
+        np.testing.assert_allclose(out.loc[ent, ["y_w", "y_total"]], [mean, total], rtol=1e-12)
+        np.testing.assert_allclose(out.loc[ent, ["y_w_se", "y_total_se"]], [se_mean, se_total], rtol=1e-9, atol=1e-9)
+    assert out.loc[3, "y_w_se"] == 0
+
+    # States without rows: no mean, zero total
+    assert len(out) == STATES
+    assert out.loc[4:, "y_w"].isna().all() and (out.loc[4:, "y_total"] == 0).all()
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import enoe_trace
+from enoe_reader import load_columns, read_questionnaire
+
+@pytest.fixture
+def tracing(tmp_path, monkeypatch):
+    """
+    Trace file of one test; tracing is off again afterwards.
+    """
+    monkeypatch.delenv(enoe_trace.TRACE_ENV, raising=False)
+    path = tmp_path / "trace.jsonl"
+    yield path
+    enoe_trace.configure(None)
+
+def test_disabled_spans_are_a_no_op(tracing):
+    enoe_trace.configure(None)
+    assert not enoe_trace.enabled()
+    with enoe_trace.span("read", year=2019) as span:
+        span.set(rows_in=1)
+    assert span is enoe_trace.span("other")
+    assert not tracing.exists()
+
+def test_spans_are_written_and_converted(tracing, synthetic_quarter, tmp_path):
+    enoe_trace.configure(tracing)
+    columns = load_columns()
+    with enoe_trace.span("quarter", year=2019, quarter=1):
+        with enoe_trace.span("read") as span:
+            df = read_questionnaire(synthetic_quarter[0], columns)
+            span.set(rows_out=len(df))
+        with pytest.raises(ValueError):
+            with enoe_trace.span("fails"):
+                raise ValueError
+
+    records = enoe_trace.read_trace(tracing)
+    # Inner spans finish first
+    assert [r["name"] for r in records] == ["read", "fails", "quarter"]
+    read, fails, quarter = records
+    assert read["parent"] == "quarter" and quarter["parent"] is None
+    assert (read["year"], read["quarter"], read["rows_out"]) == (2019, 1, len(df))
+    assert fails["error"] == "ValueError" and "error" not in read
+    assert quarter["wall_s"] >= read["wall_s"] + fails["wall_s"] - 1e-5
+    assert read["wall_s"] >= 0 and read["cpu_s"] >= 0
+
+    chrome = tmp_path / "trace.json"
+    enoe_trace.write_chrome_trace(records, chrome)
+    with open(chrome) as f:
+        events = json.load(f)["traceEvents"]
+    assert [e["name"] for e in events] == ["read", "fails", "quarter"]
+    assert all(e["ph"] == "X" for e in events)
+    assert events[0]["ts"] == read["start"] * 1e6 and events[0]["dur"] == read["wall_s"] * 1e6
+    assert events[0]["args"]["rows_out"] == len(df) and events[0]["args"]["parent"] == "quarter"
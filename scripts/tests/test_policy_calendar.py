@@ -0,0 +1,69 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import policy_calendar
+from enoe_reader import read_questionnaire
+from policy_calendar import MARRIAGE_PATH, NEVER, STATES_PATH, load_calendar, period_code
+
+@pytest.fixture
+def sources(tmp_path):
+    """
+    Copies of the two auxiliary CSVs and the path of their cache.
+    """
+    marriage = shutil.copy(MARRIAGE_PATH, tmp_path / "equal_marriage.csv")
+    states = shutil.copy(STATES_PATH, tmp_path / "states.csv")
+    return tmp_path / "policy_calendar.npz", marriage, states
+
+def test_cache_is_rebuilt_when_a_source_changes(sources, monkeypatch):
+    cache, marriage, states = sources
+    first = load_calendar(*sources)
+    assert cache.exists()
+
+    read_policies = policy_calendar.read_policies
+    reads = []
+    monkeypatch.setattr(policy_calendar, "read_policies", lambda *args: reads.append(args) or read_policies(*args))
+    cached = load_calendar(*sources)
+    assert reads == []
+    pd.testing.assert_frame_equal(cached.table, first.table)
+    np.testing.assert_array_equal(cached.matrices["marriage"], first.matrices["marriage"])
+
+    # Campeche (cve 4) legalized in 2016 Q2; move it to 2018 Q1
+    table = pd.read_csv(marriage)
+    table.loc[table["cve"] == 4, ["year", "month", "day"]] = [2018, 2, 1]
+    table.to_csv(marriage, index=False)
+    moved = load_calendar(*sources)
+    assert len(reads) == 1
+    assert moved.adoption_period([4])[0] == period_code(2018, 1)
+    assert moved.treated(4, 2017, 4) == 0 and first.treated(4, 2017, 4) == 1
+
+    text = open(states).read().replace("Campeche", "Campeche (renamed)")
+    open(states, "w").write(text)
+    assert load_calendar(*sources).table.loc[4, "state"] == "Campeche (renamed)"
+    assert len(reads) == 2
+    assert load_calendar(*sources).table.loc[4, "state"] == "Campeche (renamed)"
+    assert len(reads) == 2
+
+def test_event_time_and_cohorts(sources, synthetic_quarter):
+    calendar = load_calendar(*sources)
+    # Aguascalientes: 2019-08-16, i.e. 2019 Q3; Oaxaca (20): 2019-10-05; Guerrero (12): never
+    assert calendar.event_time(1, 2019, 1) == -2
+    assert calendar.event_time(1, 2019, 3) == 0
+    assert calendar.event_time(20, 2020, 2) == 2
+    assert np.isnan(calendar.event_time(12, 2019, 1))
+
+    ent = read_questionnaire(synthetic_quarter[0], ["ent"])["ent"].to_numpy(dtype=int)
+    expected = np.array([period_code(2019, 1) - calendar.table.loc[e, "adoption_period"]
+                         if calendar.table.loc[e, "adoption_period"] != NEVER else np.nan for e in ent])
+    np.testing.assert_array_equal(calendar.event_time(ent, 2019, 1), expected)
+
+    # Cohorts number the distinct adoption quarters in order; states of the same quarter share one
+    adoption = calendar.table["adoption_period"].to_numpy()
+    assert (calendar.cohort[adoption == NEVER] == NEVER).all()
+    treated = adoption != NEVER
+    assert list(calendar.cohort[treated]) == list(pd.factorize(adoption[treated], sort=True)[0])
+    # Hidalgo (13), Nuevo Leon (19) and San Luis Potosi (24) all legalized in 2019 Q2
+    assert calendar.cohort[13 - 1] == calendar.cohort[19 - 1] == calendar.cohort[24 - 1]
+    assert calendar.cohort[1 - 1] > calendar.cohort[19 - 1]
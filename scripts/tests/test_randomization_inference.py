@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from enoe_flows import STATES, flows_from_equal
+from panel_twfe import DemeanedPanel, load_panel, twfe
+from policy_calendar import load_calendar
+from randomization_inference import OUTCOMES, panel_outcomes, randomization_inference
+
+PERIODS = [(year, quarter) for year in range(2012, 2020) for quarter in range(1, 5)]
+
+@pytest.fixture
+def data(tmp_path):
+    rng = np.random.default_rng(0)
+    calendar = load_calendar(tmp_path / "policy_calendar.npz")
+    counts = rng.poisson(3, (len(PERIODS), STATES, STATES + 1))
+    from_equal, from_non_equal = flows_from_equal(counts, calendar.matrix(PERIODS).astype(np.int64))
+    year, quarter = np.array(PERIODS).T
+    panel = pd.DataFrame({
+        "ent": np.tile(np.arange(1, STATES + 1), len(PERIODS)),
+        "year": np.repeat(year, STATES), "quarter": np.repeat(quarter, STATES),
+        "migr": rng.random(len(PERIODS) * STATES) / 50,
+        "from_equal": from_equal.ravel(), "from_non_equal": from_non_equal.ravel(),
+    })
+    path = tmp_path / "lgbt_migration.csv"
+    panel.to_csv(path, index=False)
+    return counts, calendar, panel, path
+
+def test_observed_coefficient_is_the_twfe_coefficient(data):
+    counts, calendar, panel, path = data
+    fixed = panel_outcomes(panel, PERIODS)
+    table, distribution = randomization_inference(counts, PERIODS, calendar, 50, OUTCOMES, batch=20, fixed=fixed)
+    demeaned = DemeanedPanel(load_panel(path, calendar))
+    for name in OUTCOMES:
+        coef = table.set_index("outcome").loc[name, "coef"]
+        assert coef == pytest.approx(twfe(demeaned, name).loc["post", "coef"], rel=1e-8)
+        assert len(distribution[name]) == 50
+
+def test_panel_outcomes_must_be_balanced(data):
+    _, _, panel, _ = data
+    with pytest.raises(ValueError):
+        panel_outcomes(panel.iloc[1:], PERIODS)
@@ -0,0 +1,19 @@
+import pytest
+
+import state_geometry
+
+def test_load_geometry_builds_a_missing_cache(tmp_path, monkeypatch):
+    gpd = pytest.importorskip("geopandas")
+    from shapely.geometry import box
+
+    calls = []
+    def build_cache(path):
+        calls.append(path)
+        gpd.GeoDataFrame({"cve": [2, 1], "detail": ["medium", "medium"],
+                          "geometry": [box(0, 0, 1, 1), box(1, 0, 2, 1)]}).to_parquet(path)
+    monkeypatch.setattr(state_geometry, "build_cache", build_cache)
+
+    path = tmp_path / "geo" / "states.parquet"
+    assert state_geometry.load_geometry("medium", path)["cve"].tolist() == [1, 2]
+    state_geometry.load_geometry("medium", path)
+    assert calls == [path]
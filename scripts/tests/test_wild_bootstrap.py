@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from wild_bootstrap import ClusterScores, draw_weights
+
+def brute_force_t(y, X, cluster, n_clusters, j, factor, V, r):
+    """
+    The bootstrap t statistics of ClusterScores.bootstrap_t, one regression per draw:
+    y* = fitted + v_g u with the residuals u of the model with beta_j = r imposed.
+    """
+    others = np.delete(X, j, axis=1)
+    gamma = np.linalg.lstsq(others, y - r * X[:, j], rcond=None)[0]
+    u = y - r * X[:, j] - others @ gamma
+    fitted = y - u
+    A = np.linalg.pinv(X.T @ X)
+    out = []
+    for v in V.T:
+        y_star = fitted + v[cluster] * u
+        beta = A @ X.T @ y_star
+        scores = np.zeros((n_clusters, X.shape[1]))
+        np.add.at(scores, cluster, X * (y_star - X @ beta)[:, None])
+        out.append((beta[j] - r) / np.sqrt(factor * ((scores @ A[j]) ** 2).sum()))
+    return np.array(out)
+
+@pytest.mark.parametrize("weights", ["rademacher", "webb"])
+def test_closed_form_matches_brute_force(weights):
+    rng = np.random.default_rng(0)
+    n, k, G = 240, 3, 12
+    cluster = rng.integers(0, G, n)
+    X = rng.normal(size=(n, k))
+    y = X @ np.array([0.3, -1.0, 0.5]) + rng.normal(size=n) + rng.normal(size=G)[cluster]
+    factor = G / (G - 1) * (n - 1) / (n - k)
+    scores = ClusterScores(y, X, cluster, G, 0, factor)
+    V = draw_weights(G, 200, weights, rng)
+    for r in (0.0, 0.25, scores.beta[0]):
+        np.testing.assert_allclose(scores.bootstrap_t(V, r),
+                                   brute_force_t(y, X, cluster, G, 0, factor, V, r), rtol=1e-8)
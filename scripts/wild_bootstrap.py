@@ -0,0 +1,203 @@
+# Wild cluster bootstrap for the state-quarter DiD, where 32 state clusters make the
+# analytic cluster-robust standard errors unreliable.
+# Works on the demeaned design of panel_twfe.DemeanedPanel (state and quarter effects
+# absorbed). For the tested coefficient j everything a bootstrap draw needs reduces to
+# cluster-level quantities computed once: with A = (X'X)^-1, s_g = X_g'u_g and
+# w_g = a_j'X_g'X_g A, a draw v (one weight per cluster) gives
+#   beta*_j - beta_j = c'v                    c_g = a_j's_g
+#   cluster scores   = (diag(c) - W S') v      for the bootstrap standard error,
+# so B draws are two (G x G) @ (G x B) products instead of B regressions.
+# Restricted (WCR, null imposed) and unrestricted (WCU) variants; CIs by test inversion
+# (WCR) or percentile-t (WCU).
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from panel_twfe import DemeanedPanel, load_panel
+
+RESULTS_PATH = Path("tables/wild_bootstrap.csv")
+REPLICATIONS = 9_999
+LEVEL = 0.95
+# The WCR interval is unbounded if the test still accepts 2^MAX_WIDENINGS se away
+MAX_WIDENINGS = 30
+# Webb's six-point weights, for when few clusters make Rademacher draws too coarse
+WEBB = np.array([-np.sqrt(1.5), -1, -np.sqrt(0.5), np.sqrt(0.5), 1, np.sqrt(1.5)])
+
+def draw_weights(n_clusters, replications, kind="rademacher", rng=None):
+    """
+    (clusters x replications) matrix of wild bootstrap weights.
+    """
+    rng = rng or np.random.default_rng()
+    if kind == "rademacher":
+        return rng.choice([-1.0, 1.0], size=(n_clusters, replications))
+    if kind == "webb":
+        return rng.choice(WEBB, size=(n_clusters, replications))
+    raise ValueError(f"Unknown weights '{kind}', use 'rademacher' or 'webb'")
+
+def _cluster_sums(values, cluster, n_clusters):
+    """
+    Sums of the rows of values (n x m) within each cluster: (G x m).
+    """
+    out = np.zeros((n_clusters, values.shape[1]))
+    np.add.at(out, cluster, values)
+    return out
+
+class ClusterScores:
+    """
+    The cluster-level pieces of one regression and one tested coefficient j.
+    factor: small-sample factor of the cluster-robust variance
+    """
+    def __init__(self, y, X, cluster, n_clusters, j, factor):
+        self.X, self.cluster, self.G, self.j, self.factor = X, cluster, n_clusters, j, factor
+        self.A = np.linalg.pinv(X.T @ X)
+        # w_g = a_j' X_g'X_g A for every cluster, from the per-cluster X'X
+        XtX = np.zeros((n_clusters, X.shape[1], X.shape[1]))
+        np.add.at(XtX, cluster, X[:, :, None] * X[:, None, :])
+        self.W = np.einsum("k,gkl,lm->gm", self.A[j], XtX, self.A)
+
+        self.beta = self.A @ X.T @ y
+        c = _cluster_sums(X * (y - X @ self.beta)[:, None], cluster, n_clusters) @ self.A[j]
+        self.se = np.sqrt(factor * (c ** 2).sum())
+
+        # y and x_j net of the other regressors: the residuals with beta_j = r imposed
+        # are u_y - r u_x, and with r = beta_j they are the unrestricted residuals
+        others = np.delete(X, j, axis=1)
+        self.u_y = y - others @ np.linalg.lstsq(others, y, rcond=None)[0]
+        self.u_x = X[:, j] - others @ np.linalg.lstsq(others, X[:, j], rcond=None)[0]
+
+    def t_stat(self, r=0.0):
+        return (self.beta[self.j] - r) / self.se
+
+    def bootstrap_t(self, V, r):
+        """
+        Bootstrap t statistics (beta*_j - r) / se*, one per column of V, for draws
+        built from the residuals with beta_j = r imposed.
+        """
+        u = self.u_y - r * self.u_x
+        S = _cluster_sums(self.X * u[:, None], self.cluster, self.G)   # s_g, (G x k)
+        c = S @ self.A[self.j]                                         # (G,)
+        Q = np.diag(c) - self.W @ S.T                                  # (G x G)
+        numerator = c @ V
+        se = np.sqrt(self.factor * ((Q @ V) ** 2).sum(axis=0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return numerator / se
+
+    def p_value(self, V, r=0.0, restricted=True):
+        """
+        Symmetric bootstrap p-value of H0: beta_j = r.
+        """
+        t_boot = self.bootstrap_t(V, r if restricted else self.beta[self.j])
+        return float(np.mean(np.abs(t_boot) >= abs(self.t_stat(r))))
+
+    def interval(self, V, level=LEVEL, restricted=True, tol=1e-6):
+        """
+        WCR: the r whose test is not rejected at 1 - level, found by bisection on each
+        side of beta_j. WCU: percentile-t interval.
+        """
+        beta, se = self.beta[self.j], self.se
+        alpha = 1 - level
+        if not restricted:
+            q = np.quantile(np.abs(self.bootstrap_t(V, beta)), level)
+            return beta - q * se, beta + q * se
+
+        def bound(direction):
+            inside, outside = beta, beta + direction * se
+            for _ in range(MAX_WIDENINGS):
+                if self.p_value(V, outside) <= alpha:
+                    break
+                # Widen (doubling the distance to beta_j) until the test rejects
+                inside, outside = outside, beta + 2 * (outside - beta)
+            else:
+                return direction * np.inf
+            while abs(outside - inside) > tol * se:
+                middle = (inside + outside) / 2
+                if self.p_value(V, middle) > alpha:
+                    inside = middle
+                else:
+                    outside = middle
+            return (inside + outside) / 2
+
+        return bound(-1), bound(1)
+
+def wild_bootstrap(panel, outcome, treatment, controls=(), replications=REPLICATIONS, weights="rademacher",
+                   restricted=True, level=LEVEL, seed=None):
+    """
+    Wild cluster bootstrap test and interval for the treatment coefficient.
+    Returns a dict with the estimate, analytic SE and t, bootstrap p-value and interval.
+    """
+    regressors = [treatment] + list(controls)
+    y, X, sample = panel.design(outcome, regressors)
+    n, k = X.shape
+    scores = ClusterScores(y, X, sample.cluster, sample.n_clusters, 0, sample.small_sample_factor(n, k))
+    V = draw_weights(sample.n_clusters, replications, weights, np.random.default_rng(seed))
+    ci_low, ci_high = scores.interval(V, level, restricted)
+    return {
+        "outcome": outcome,
+        "treatment": treatment,
+        "controls": " + ".join(controls),
+        "coef": scores.beta[0],
+        "se": scores.se,
+        "t": scores.t_stat(),
+        "p_boot": scores.p_value(V, 0.0, restricted),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "replications": replications,
+        "weights": weights,
+        "method": "WCR" if restricted else "WCU",
+        "nobs": n,
+        "clusters": sample.n_clusters,
+    }
+
+# Worker processes keep one DemeanedPanel, so specifications with the same
+# columns reuse the demeaned design
+_panel = None
+
+def _init_worker(df):
+    global _panel
+    _panel = DemeanedPanel(df)
+
+def _run_spec(spec):
+    return wild_bootstrap(_panel, **spec)
+
+def run_specifications(df, specs, processes=1, seed=0):
+    """
+    Runs wild_bootstrap for every spec (dicts of its keyword arguments) and returns
+    one row per spec. Each spec gets its own seed, so results do not depend on processes.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(specs))
+    specs = [{**spec, "seed": s} for spec, s in zip(specs, seeds)]
+    if processes <= 1:
+        _init_worker(df)
+        rows = [_run_spec(spec) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(df,)) as pool:
+            rows = list(pool.map(_run_spec, specs))
+    return pd.DataFrame(rows)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Wild cluster bootstrap for the equal marriage DiD")
+    parser.add_argument("--outcomes", nargs="+", default=["migr", "total_migration", "from_equal", "from_non_equal"])
+    parser.add_argument("--treatment", default="equal_marriage")
+    parser.add_argument("--controls", nargs="*", default=["p1", "p6b2"])
+    parser.add_argument("--replications", type=int, default=REPLICATIONS)
+    parser.add_argument("--weights", choices=["rademacher", "webb"], default="webb")
+    parser.add_argument("--unrestricted", dest="restricted", action="store_false",
+                        help="bootstrap without imposing the null (WCU)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes, one specification each")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=str(RESULTS_PATH))
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    specs = [{"outcome": outcome, "treatment": args.treatment, "controls": args.controls,
+              "replications": args.replications, "weights": args.weights, "restricted": args.restricted}
+             for outcome in args.outcomes]
+    results = run_specifications(load_panel(), specs, args.processes, args.seed)
+    print(results[["outcome", "coef", "se", "t", "p_boot", "ci_low", "ci_high"]].to_string(index=False))
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"Wrote {len(results)} specifications to {args.output}")